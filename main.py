@@ -4,168 +4,279 @@
 Created on Thu Aug 29 13:49:27 2019
 
 @author: jeremy_lehner
+
+Command-line entry point for the League of Pick Rates pipeline.
+
+    python main.py scrape [--static] [--regions na euw] [--tiers all gold]
+                          [--pool-size N] [--max-pages N] [--no-block]
+                                       scrape today's rates (and static data)
+    python main.py ingest [--db PATH]  load new csv files into the SQLite store
+    python main.py compact [--keep-daily]
+                                       roll closed patches into one file each
+    python main.py build [--region R] [--tier T] [--patches 9.17 9.18]
+                         [--db PATH] [--workers N] [--executor process]
+                                       combine the data into the cache
+    python main.py train [--penalty ridge]
+                                       fit the models and save their artifacts
+    python main.py evaluate [--bootstrap 10000]
+                                       score the models on held out rows
+    python main.py predict [--date]    predict pick rates for one day
+    python main.py whatif [--champions Ahri Zed] [--winrate -0.02 0 0.02]
+                          [--banrate 0.05] [--num-skins 1]
+                          [--patches-since-change -1]
+                                       predict pick rates under shifted inputs
+    python main.py similar Ahri [--k 5] [--patch 9.18]
+                                       champions with the closest rate
+                                       trajectories over a patch
+    python main.py risers [--days 5]   query the biggest recent rate risers
+
+Running main.py without a stage runs build, train and evaluate. Each stage
+reuses the cached outputs of the earlier ones.
 """
 
 # Import required modules and functions
-import os.path
-from os import path
-import sys
-import requests
-import time
-import random
-import datetime
-import pandas as pd
-from bs4 import BeautifulSoup
-from fake_useragent import UserAgent
-from selenium import webdriver
-from selenium.webdriver.common.keys import Keys
-import chromedriver_binary
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import mean_squared_error
-from sklearn import linear_model
-
-# Import custom functions for this project
-#from src.get_league_data import get_champion_names
-#from src.get_league_data import get_champion_release_dates
-#from src.get_league_data import get_number_of_skins
-#from src.get_league_data import get_win_rates
-#from src.get_league_data import get_ban_rates
-#from src.get_league_data import get_pick_rates
-#from src.get_league_data import get_last_patch_change
-#from src.get_league_data import get_scrape_date
-
-# Import data scraping functions
-from src.scrape_league_data import get_scrape_date
-from src.scrape_league_data import scrape_champ_names
-from src.scrape_league_data import scrape_release_dates
-from src.scrape_league_data import scrape_number_of_skins
-from src.scrape_league_data import scrape_win_rates
-from src.scrape_league_data import scrape_ban_rates
-from src.scrape_league_data import scrape_pick_rates
-from src.scrape_league_data import scrape_last_patch_change
-
-# Import data loading functions
-from src.load_league_data import load_champ_names
-from src.load_league_data import load_release_dates
-from src.load_league_data import load_number_of_skins
-from src.load_league_data import load_win_rates
-from src.load_league_data import load_ban_rates
-from src.load_league_data import load_pick_rates
-from src.load_league_data import load_last_patch_change
-
-# Import data processing functions
-from src.process_league_data import get_patches_since_change
-from src.process_league_data import repeat_each_day
-from src.process_league_data import combine_rate_data
-from src.process_league_data import get_champ_age
-
-# Import functions for model analysis
-from src.model_functions import adjusted_r2
-
-
-# Get the champion names and number of champions
-champ_names = load_champ_names()
-num_champs = len(champ_names)
-
-# Scrape data if you don't want to use the data already available
-champ_names = load_champ_names()
-scrape = False
-if scrape:
-    scrape_champ_names()
-    scrape_release_dates()
-    scrape_number_of_skins(champ_names)
-    scrape_win_rates()
-    scrape_ban_rates()
-    scrape_pick_rates()
-    scrape_last_patch_change(champ_names)
-
-# Load the data
-champ_names = load_champ_names()
-release_dates = load_release_dates()
-num_skins = load_number_of_skins()
-win_rates = load_win_rates()
-ban_rates = load_ban_rates()
-pick_rates = load_pick_rates()
-last_patch = load_last_patch_change()
-
-# Get number of days
-num_days = int(win_rates.shape[0]/num_champs)
-
-# Combine dynamic win, ban, and pick rates into one data frame
-dynamic = combine_rate_data(win_rates, ban_rates, pick_rates)
-
-# Determine number of patches since champion was last changed
-patches_since_change = get_patches_since_change(last_patch)
-
-# Construct data frame for static features over patch 9.18
-static_features = [champ_names, release_dates, num_skins, patches_since_change]
-static = pd.concat(static_features, axis=1)
-static.columns = ['champion',
-                  'release_date',
-                  'num_skins',
-                  'patches_since_change']
-
-# Repeat static data for each day data was scraped during patch 9.18
-static = repeat_each_day(static, num_days)
-
-# Combine static data with dynamic data
-league_df = pd.concat([static, dynamic], axis=1)
-
-# Determine the champion age on each day that data was collected
-champ_age = get_champ_age(league_df['release_date'], league_df['date'])
-league_df['champion_age'] = champ_age
-
-# Select only the columns used for modeling (target = pickrate)
-model_data = ['champion_age',
-              'patches_since_change',
-              'num_skins',
-              'winrate',
-              'banrate',
-              'pickrate']
-tidy_data = league_df[model_data]
-
-###############################################################################
-
-# Build first model using only features from tidy_data
-X1 = tidy_data.iloc[:, 0:5]
-y1 = tidy_data['pickrate']
-
-X1_train, X1_test, y1_train, y1_test = train_test_split(X1, y1, test_size=0.3)
-
-model1 = linear_model.LinearRegression()
-model1.fit(X1_train, y1_train)
-
-y1_pred = model1.predict(X1_test)
-resids1 = y1_test - y1_pred
-
-mse1 = mean_squared_error(y1_test, y1_pred)
-r2_adj1 = adjusted_r2(X1_test, y1_test, y1_pred)
-#plt.scatter(X1_test['winrate'], resids1)
-#plt.scatter(y1_pred, resids1)
-#plt.hist(resids1, bins=20, edgecolor='k')
-
-######
-
-# Build second model using engineered features
-X2 = tidy_data.iloc[:, 0:5]
-y2 = tidy_data['pickrate']
-
-X2['patch_age_ratio'] = X2.patches_since_change / X2.champion_age
-X2['patch_by_skin] = X2.patches_since_change * X2.num_skins
-X2['win_age_ratio']= X2.winrate / X2.champion_age
-X2['ban_age_ratio']= X2.winrate / X2.champion_age
-X2['win_ban_ratio'] = X2.winrate / X2.banrate
-
-X2_train, X2_test, y2_train, y2_test = train_test_split(X2, y2, test_size=0.3)
-
-model2 = linear_model.LinearRegression()
-model2.fit(X2_train, y2_train)
-
-y2_pred = model2.predict(X2_test)
-resids2 = y2_test - y2_pred
-
-mse2 = mean_squared_error(y2_test, y2_pred)
-r2_adj2 = adjusted_r2(X2_test, y2_test, y2_pred)
-#plt.scatter(X2_test['winrate'], resids2)
-#plt.scatter(y2_pred, resids2)
-#plt.hist(resids2, bins=20, edgecolor='k')
\ No newline at end of file
+# (the scraping stack and sklearn are only imported by the stages using them)
+import argparse
+
+# Import pipeline stages
+from src.pipeline import report_stage
+from src.pipeline import scrape_data
+from src.pipeline import build_league_data
+from src.pipeline import load_league_df
+from src.pipeline import train_models
+from src.pipeline import evaluate_models
+from src.pipeline import predict_latest
+from src.pipeline import DATA_FOLDER
+from src.pipeline import CACHE_FOLDER
+from src.pipeline import MODEL_FOLDER
+from src.pipeline import MAX_PAGES
+
+# Import the what-if simulator
+from src.what_if import make_scenario_grid
+from src.what_if import simulate_scenarios
+from src.what_if import SCENARIO_INPUTS
+
+# Import the trajectory index
+from src.trajectory_index import update_saved_index
+
+# Import embedded store functions
+from src.league_store import ingest_league_data
+from src.league_store import query_top_risers
+from src.league_store import DB_PATH
+
+# Import the compaction job
+from src.compact_rates import compact_rate_data
+
+
+def l1_ratio(value):
+    """
+    Parses --l1-ratio, which must be in (0, 1]
+    """
+
+    ratio = float(value)
+    if not 0 < ratio <= 1:
+        raise argparse.ArgumentTypeError(f'{value} is not in (0, 1]')
+
+    return ratio
+
+
+def folds(value):
+    """
+    Parses --folds, cross validation needs at least 2
+    """
+
+    n_folds = int(value)
+    if n_folds < 2:
+        raise argparse.ArgumentTypeError(f'{value} is fewer than 2 folds')
+
+    return n_folds
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Scrape League of Legends data and model pick rates')
+    parser.add_argument('--data', default=DATA_FOLDER,
+                        help='folder containing the scraped data')
+    parser.add_argument('--cache', default=CACHE_FOLDER,
+                        help='folder for cached stage outputs')
+    parser.add_argument('--models', default=MODEL_FOLDER,
+                        help='folder for model artifacts')
+    stages = parser.add_subparsers(dest='stage')
+
+    scrape = stages.add_parser('scrape', help="scrape today's data")
+    scrape.add_argument('--static', action='store_true',
+                        help='also scrape names, release dates, skins and '
+                             'last patch change')
+    scrape.add_argument('--regions', nargs='+', default=['na'],
+                        help='op.gg regions to scrape, e.g. na euw kr')
+    scrape.add_argument('--tiers', nargs='+', default=['all'],
+                        help='rank tiers to scrape, e.g. all gold diamond')
+    scrape.add_argument('--pool-size', type=int, default=None,
+                        help='number of browsers, one per region by default')
+    scrape.add_argument('--max-pages', type=int, default=MAX_PAGES,
+                        help='page loads before a browser is relaunched')
+    scrape.add_argument('--no-block', action='store_true',
+                        help='let the browsers load images, ads and '
+                             'trackers, to compare scrape metrics')
+    ingest = stages.add_parser('ingest',
+                               help='load new csv files into the store')
+    ingest.add_argument('--db', default=DB_PATH,
+                        help='SQLite store to ingest into')
+    compact = stages.add_parser('compact',
+                                help='roll closed patches into one file')
+    compact.add_argument('--date', default=None,
+                         help="day patches are closed on as 'YYYY-MM-DD'")
+    compact.add_argument('--keep-daily', action='store_true',
+                         help='keep the daily files after compacting')
+    build = stages.add_parser('build',
+                              help='combine the data into one data frame')
+    build.add_argument('--region', default='na',
+                       help='region whose rates are modeled')
+    build.add_argument('--tier', default='all',
+                       help='rank tier whose rates are modeled')
+    build.add_argument('--patches', nargs='+', default=None,
+                       help='patches whose rates are modeled, all by default')
+    build.add_argument('--db', default=None,
+                       help='SQLite store to query instead of csv files')
+    build.add_argument('--workers', type=int, default=None,
+                       help='loads and features run at the same time')
+    build.add_argument('--executor', default='thread',
+                       choices=['thread', 'process'],
+                       help='pool the independent stages run on')
+    train = stages.add_parser('train', help='fit and save the models')
+    train.add_argument('--penalty', default='ols',
+                       choices=['ols', 'ridge', 'lasso', 'elasticnet'],
+                       help='penalty chosen along its path by day folds')
+    train.add_argument('--l1-ratio', type=l1_ratio, default=None,
+                       help='share of an elastic net penalty on the L1 norm')
+    train.add_argument('--folds', type=folds, default=5,
+                       help='day folds used to choose the penalty')
+    evaluate = stages.add_parser('evaluate',
+                                 help='score the models on held out rows')
+    evaluate.add_argument('--bootstrap', type=int, default=0,
+                          help='resamples for 95%% confidence intervals')
+    evaluate.add_argument('--jobs', type=int, default=1,
+                          help='processes the resamples are split over')
+    predict = stages.add_parser('predict', help='predict pick rates')
+    predict.add_argument('--model', default='model1')
+    predict.add_argument('--date', default=None,
+                         help="day to predict as 'YYYY-MM-DD'")
+    predict.add_argument('--output', default=None,
+                         help='csv file for the predictions')
+    whatif = stages.add_parser('whatif',
+                               help='predict pick rates under shifted inputs')
+    whatif.add_argument('--model', default='model1')
+    whatif.add_argument('--date', default=None,
+                        help="day whose inputs are shifted as 'YYYY-MM-DD'")
+    whatif.add_argument('--champions', nargs='+', default=None,
+                        help='champions to shift, all by default')
+    for column in SCENARIO_INPUTS:
+        whatif.add_argument(f'--{column.replace("_", "-")}', nargs='+',
+                            type=float, default=[0.0],
+                            help=f'shifts of {column} to combine')
+    whatif.add_argument('--output', default=None,
+                        help='csv file for the scenario predictions')
+    similar = stages.add_parser('similar',
+                                help='find champions with similar rates')
+    similar.add_argument('champion')
+    similar.add_argument('--k', type=int, default=5,
+                         help='number of neighbours')
+    similar.add_argument('--patch', default=None,
+                         help='patch compared, the latest by default')
+    risers = stages.add_parser('risers',
+                               help='query the biggest recent rate risers')
+    risers.add_argument('--db', default=DB_PATH)
+    risers.add_argument('--days', type=int, default=5)
+    risers.add_argument('--top', type=int, default=10)
+    risers.add_argument('--metric', default='pick',
+                        choices=['win', 'ban', 'pick'])
+    risers.add_argument('--region', default='na')
+    risers.add_argument('--tier', default='all')
+
+    args = parser.parse_args(argv)
+    if (args.stage == 'train' and args.l1_ratio is not None
+            and args.penalty != 'elasticnet'):
+        parser.error('--l1-ratio only applies to --penalty elasticnet')
+
+    if args.stage == 'scrape':
+        report_stage('scrape', scrape_data, args.static, args.regions,
+                     args.tiers, args.pool_size, args.max_pages,
+                     not args.no_block)
+
+    elif args.stage == 'ingest':
+        num_files = report_stage('ingest', ingest_league_data, args.data,
+                                 args.db)
+        print(f'Ingested {num_files} new or changed files into {args.db}')
+
+    elif args.stage == 'compact':
+        compacted = report_stage('compact', compact_rate_data, args.data,
+                                 args.date, args.keep_daily)
+        print(f'Compacted {len(compacted)} patch folders from '
+              f'{compacted["num_files"].sum()} daily files')
+
+    elif args.stage == 'build':
+        report_stage('build', build_league_data, args.cache,
+                     args.data, args.region, args.tier, args.patches,
+                     args.db, args.workers, args.executor)
+
+    elif args.stage == 'train':
+        league_df = report_stage('load', load_league_df, args.cache,
+                                 args.data)
+        report_stage('train', train_models, league_df, args.models,
+                     args.cache, penalty=args.penalty,
+                     l1_ratio=args.l1_ratio, n_folds=args.folds)
+
+    elif args.stage == 'evaluate':
+        league_df = report_stage('load', load_league_df, args.cache,
+                                 args.data)
+        report_stage('evaluate', evaluate_models, league_df, args.models,
+                     args.cache, args.bootstrap, args.jobs)
+
+    elif args.stage == 'predict':
+        league_df = report_stage('load', load_league_df, args.cache,
+                                 args.data)
+        predictions = report_stage('predict', predict_latest, league_df,
+                                   args.model, args.date, args.models)
+        if args.output:
+            predictions.to_csv(args.output, index=False)
+        else:
+            print(predictions.to_string(index=False))
+
+    elif args.stage == 'whatif':
+        league_df = report_stage('load', load_league_df, args.cache,
+                                 args.data)
+        scenarios = make_scenario_grid(**{column: getattr(args, column)
+                                          for column in SCENARIO_INPUTS})
+        results = report_stage('whatif', simulate_scenarios, league_df,
+                               scenarios, args.champions, args.model,
+                               args.date, args.models)
+        if args.output:
+            results.to_csv(args.output, index=False)
+        else:
+            print(results.to_string(index=False))
+
+    elif args.stage == 'similar':
+        league_df = report_stage('load', load_league_df, args.cache,
+                                 args.data)
+        index = report_stage('index', update_saved_index, league_df,
+                             args.patch, args.cache)
+        for champion, distance in index.query(args.champion, args.k):
+            print(f'{champion:<15} {distance:.3f}')
+
+    elif args.stage == 'risers':
+        risers = report_stage('risers', query_top_risers, args.db,
+                              args.days, args.top, args.metric, args.region,
+                              args.tier)
+        print(risers.to_string(index=False))
+
+    else:
+        league_df = report_stage('build', build_league_data, args.cache,
+                                 args.data)
+        report_stage('train', train_models, league_df, args.models,
+                     args.cache)
+        report_stage('evaluate', evaluate_models, league_df, args.models,
+                     args.cache)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 14 15:22:09 2019
+
+@author: jeremy_lehner
+
+Benchmarks parse_rate_table against pd.read_html on op.gg statistics pages.
+
+    python -m src.benchmark_parser
+    python -m src.benchmark_parser --pages saved_page.html other_page.html
+
+Without --pages, fixture pages shaped like the statistics page (an ad table
+first, then the champion table, then more tables and scripts) are written
+once to ./cache/fixtures/ and reused.
+"""
+
+import glob
+import time
+import argparse
+import tracemalloc
+import numpy as np
+import pandas as pd
+from os import path, makedirs
+
+from src.rate_table_parser import parse_rate_table
+from src.scrape_league_data import RATE_COLUMNS
+
+
+FIXTURE_FOLDER = './cache/fixtures/'
+
+# Fixture pages: champions in the stats table, other tables on the page and
+# numbers in each inline script, the full page is about the size of a saved
+# statistics page (~1 MB)
+FIXTURES = {'opgg_stats_small': {'champs': 145, 'other_tables': 5},
+            'opgg_stats_large': {'champs': 170, 'other_tables': 40},
+            'opgg_stats_full': {'champs': 145, 'other_tables': 40,
+                                'script_items': 250000}}
+
+
+def make_stats_page(champs=145, other_tables=5, script_items=5000, seed=0):
+    """
+    Writes HTML shaped like the op.gg statistics page
+
+    Parameters
+    ----------
+    champs       : integer
+                   Number of champions in the stats table
+    other_tables : integer
+                   Number of ad and ranking tables after the stats table
+    script_items : integer
+                   Number of values in each of the two inline scripts
+    seed         : integer
+                   Seed for the random number generator
+
+    Returns
+    -------
+    page : string
+           HTML of the page
+    """
+
+    rng = np.random.default_rng(seed)
+
+    def other_table(idx):
+        cells = ''.join(f'<tr><td><img src="ad{idx}_{row}.png"></td>'
+                        f'<td>Sponsored {idx}.{row}</td><td>{row}</td></tr>'
+                        for row in range(30))
+        return f'<table class="ad"><tr><th>Ad</th><th>Text</th>' \
+               f'<th>#</th></tr>{cells}</table>'
+
+    header = ''.join(f'<th>{name}</th>' for name in RATE_COLUMNS.values())
+    rows = []
+    for idx in range(champs):
+        rates = ''.join(f'<td class="rate">{value:.2f}%</td>'
+                        for value in rng.uniform(0, 60, len(RATE_COLUMNS)))
+        rows.append(f'<tr><td class="rank">{idx + 1}</td>'
+                    f'<td class="icon"><img src="c{idx}.png"></td>'
+                    f'<td class="name"><a href="/c/{idx}">Champion{idx:04d}'
+                    f'</a></td>{rates}</tr>')
+    stats = (f'<table class="stats"><thead><tr><th>#</th>'
+             f'<th colspan="2">Champion</th>{header}</tr></thead>'
+             f'<tbody>{"".join(rows)}</tbody></table>')
+
+    script = '<script>var ads = [' + ','.join(['1'] * script_items) + '];</script>'
+    page = ('<html><head><title>Champion Statistics</title>' + script
+            + '</head><body>' + other_table(0) + stats
+            + ''.join(other_table(idx) for idx in range(1, other_tables))
+            + script + '</body></html>')
+
+    return page
+
+
+def measure(parse, page, repeat=5):
+    """
+    Times a parse and records its peak traced memory
+
+    Parameters
+    ----------
+    parse  : function
+             Takes the page source and returns the champion and rate columns
+    page   : string
+             HTML of the page
+    repeat : integer
+             Number of timed runs
+
+    Returns
+    -------
+    best    : float
+              Fastest wall time in seconds
+    peak_mb : float
+              Peak memory allocated during one parse in MB
+    table   : pandas data frame
+              Parsed champion and rate columns
+    """
+
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        table = parse(page)
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    parse(page)
+    peak_mb = tracemalloc.get_traced_memory()[1] / 1024**2
+    tracemalloc.stop()
+
+    return best, peak_mb, table
+
+
+def run_benchmark(pages=None, repeat=5):
+    """
+    Compares parse_rate_table with pd.read_html on each page and checks
+      both return the same champion and win rate columns
+
+    Parameters
+    ----------
+    pages  : list
+             Paths of saved statistics pages, fixture pages by default
+    repeat : integer
+             Number of timed runs of each parser
+
+    Returns
+    -------
+    results : dictionary
+              Wall time and peak memory of each parser on each page
+    """
+
+    columns = ['Champion.1', RATE_COLUMNS['win']]
+
+    if not pages:
+        if not path.exists(FIXTURE_FOLDER):
+            makedirs(FIXTURE_FOLDER)
+        for name, spec in FIXTURES.items():
+            fixture_path = path.join(FIXTURE_FOLDER, f'{name}.html')
+            if not path.exists(fixture_path):
+                with open(fixture_path, 'w') as page_file:
+                    page_file.write(make_stats_page(**spec))
+        pages = sorted(glob.glob(path.join(FIXTURE_FOLDER, '*.html')))
+
+    parsers = {'read_html': lambda page: pd.read_html(page)[1][columns],
+               'parse_rate_table': lambda page: parse_rate_table(page,
+                                                                 columns)}
+
+    results = {}
+    for page_path in pages:
+        with open(page_path) as page_file:
+            page = page_file.read()
+        name = path.basename(page_path)
+        results[name] = {}
+        tables = {}
+        for parser, parse in parsers.items():
+            best, peak_mb, tables[parser] = measure(parse, page, repeat)
+            results[name][parser] = {'seconds': best, 'peak_mb': peak_mb}
+            print(f'{name:<24} {parser:<18} {best * 1000:9.2f} ms '
+                  f'{peak_mb:8.2f} MB')
+
+        # Both parsers must agree on the champion names and rate text
+        expected = tables['read_html'].astype(str).reset_index(drop=True)
+        if not expected.equals(tables['parse_rate_table']):
+            print(f'{name}: parsers returned different tables (._.)')
+
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Benchmark parse_rate_table against pd.read_html')
+    parser.add_argument('--pages', nargs='+', default=None)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    run_benchmark(args.pages, args.repeat)
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct  7 14:36:20 2019
+
+@author: jeremy_lehner
+
+Benchmarks each pipeline stage on synthetic data of increasing size and
+checks the timings against a saved baseline.
+
+    python -m src.benchmark_pipeline --save-baseline
+    python -m src.benchmark_pipeline --sizes small medium --max-ratio 1.5
+
+Synthetic data is written once to ./cache/synthetic/<size>/ and reused.
+"""
+
+import io
+import sys
+import glob
+import json
+import time
+import argparse
+import contextlib
+from os import path, makedirs
+
+from src.synthetic_data import make_synthetic_data
+from src.load_league_data import load_champ_names
+from src.load_league_data import load_release_dates
+from src.load_league_data import load_number_of_skins
+from src.load_league_data import load_win_rates
+from src.load_league_data import load_ban_rates
+from src.load_league_data import load_pick_rates
+from src.load_league_data import load_last_patch_change
+from src.load_league_data import load_patch_dates
+from src.process_league_data import get_patches_since_change
+from src.process_league_data import join_static_by_patch
+from src.process_league_data import combine_rate_data
+from src.process_league_data import get_champ_age
+from src.pipeline import assemble_static
+from src.pipeline import concat_static
+from src.pipeline import build_league_data
+from src.pipeline import reset_build_graph
+
+
+# Synthetic data sizes: days, champions, regions, patches
+SIZES = {'small': {'days': 13, 'champs': 145, 'regions': 1, 'patches': 1},
+         'medium': {'days': 90, 'champs': 160, 'regions': 2, 'patches': 6},
+         'large': {'days': 365, 'champs': 170, 'regions': 4, 'patches': 24}}
+
+SYNTHETIC_FOLDER = './cache/synthetic/'
+BASELINE_PATH = './cache/benchmark_baseline.json'
+
+
+def time_stage(stage, *args, repeat=3):
+    """
+    Times a stage several times and keeps the fastest run
+
+    Parameters
+    ----------
+    stage  : function
+             Stage to time
+    *args  : any
+             Passed to the stage
+    repeat : integer
+             Number of runs
+
+    Returns
+    -------
+    best   : float
+             Fastest wall time in seconds
+    output : any
+             Whatever the stage returned on the last run
+    """
+
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        output = stage(*args)
+        best = min(best, time.perf_counter() - start)
+
+    return best, output
+
+
+def benchmark_size(size, repeat=3):
+    """
+    Generates synthetic data for one size if needed and times each stage of
+      the build on every region of it, and the whole build
+
+    Parameters
+    ----------
+    size   : string
+             Key of SIZES
+    repeat : integer
+             Number of runs of each stage
+
+    Returns
+    -------
+    timings : dictionary
+              Total fastest wall time in seconds of each stage over regions
+    """
+
+    from sklearn import linear_model
+
+    spec = SIZES[size]
+    folder = path.join(SYNTHETIC_FOLDER, size)
+    if not path.exists(folder):
+        print(f'Writing {size} synthetic data to {folder}')
+        make_synthetic_data(folder, **spec)
+
+    timings = {}
+
+    def add_timing(name, elapsed):
+        timings[name] = timings.get(name, 0.0) + elapsed
+
+    # Static features of each patch, as the build assembles them
+    patch_dates = load_patch_dates(folder)
+    static_by_patch = {}
+    for patch in patch_dates['patch']:
+        last_patch = load_last_patch_change(folder, patch)
+        patches = get_patches_since_change(last_patch, patch, patch_dates)
+        static_by_patch[patch] = assemble_static(
+            patch, load_champ_names(folder, patch),
+            load_release_dates(folder, patch),
+            load_number_of_skins(folder, patch), patches)
+    static = concat_static(**static_by_patch)
+
+    regions = sorted(path.basename(region) for region in
+                     glob.glob(path.join(folder, 'win', '*')))
+    for region in regions:
+        elapsed, win = time_stage(load_win_rates, folder, [region],
+                                  repeat=repeat)
+        add_timing('load_win_rates', elapsed)
+        ban = load_ban_rates(folder, [region])
+        pick = load_pick_rates(folder, [region])
+
+        elapsed, dynamic = time_stage(combine_rate_data, win, ban, pick,
+                                      repeat=repeat)
+        add_timing('combine_rate_data', elapsed)
+
+        elapsed, league_df = time_stage(join_static_by_patch, static,
+                                        dynamic, repeat=repeat)
+        add_timing('join_static_by_patch', elapsed)
+
+        elapsed, champ_age = time_stage(get_champ_age,
+                                        league_df['release_date'],
+                                        league_df['date'], repeat=repeat)
+        add_timing('get_champ_age', elapsed)
+        league_df['champion_age'] = champ_age
+
+        X = league_df[['champion_age', 'patches_since_change', 'num_skins',
+                       'winrate', 'banrate']]
+        y = league_df['pickrate']
+        model = linear_model.LinearRegression()
+        elapsed, _ = time_stage(model.fit, X, y, repeat=repeat)
+        add_timing('model_fit', elapsed)
+
+        # The whole build, loads and features included, without its report,
+        # from scratch and again with every stage memoized
+        def build(reset):
+            if reset:
+                reset_build_graph()
+            with contextlib.redirect_stdout(io.StringIO()):
+                return build_league_data(path.join(folder, 'build'), folder,
+                                         region)
+
+        elapsed, _ = time_stage(build, True, repeat=repeat)
+        add_timing('build_league_data', elapsed)
+        elapsed, _ = time_stage(build, False, repeat=repeat)
+        add_timing('build_memoized', elapsed)
+
+    return timings
+
+
+def compare_to_baseline(results, baseline, max_ratio=1.5, min_seconds=0.005):
+    """
+    Flags stages that got slower than the baseline by more than max_ratio
+
+    Parameters
+    ----------
+    results     : dictionary
+                  Timings for each size and stage from this run
+    baseline    : dictionary
+                  Timings for each size and stage from the baseline run
+    max_ratio   : float
+                  Largest allowed ratio of new to baseline time
+    min_seconds : float
+                  Stages faster than this are too noisy to flag
+
+    Returns
+    -------
+    regressions : list
+                  Contains (size, stage, ratio) for each regression
+    """
+
+    regressions = []
+    for size, timings in results.items():
+        for stage, elapsed in timings.items():
+            before = baseline.get(size, {}).get(stage)
+            if before is None or elapsed < min_seconds:
+                continue
+            ratio = elapsed / before
+            if ratio > max_ratio:
+                regressions.append((size, stage, ratio))
+
+    return regressions
+
+
+def run_benchmarks(sizes=('small', 'medium', 'large'), repeat=3,
+                   max_ratio=1.5, save_baseline=False,
+                   baseline_path=BASELINE_PATH):
+    """
+    Runs the benchmarks, prints a table of timings, and either saves them as
+      the new baseline or checks them against the saved one
+
+    Parameters
+    ----------
+    sizes         : list
+                    Keys of SIZES to run
+    repeat        : integer
+                    Number of runs of each stage
+    max_ratio     : float
+                    Largest allowed ratio of new to baseline time
+    save_baseline : boolean
+                    Save these timings as the baseline?
+    baseline_path : string
+                    Path of the baseline json file
+
+    Returns
+    -------
+    passed : boolean
+             False if any stage regressed against the baseline
+    """
+
+    results = {}
+    for size in sizes:
+        results[size] = benchmark_size(size, repeat)
+        for stage, elapsed in results[size].items():
+            print(f'{size:<8} {stage:<20} {elapsed * 1000:10.2f} ms')
+
+    if save_baseline:
+        folder = path.dirname(baseline_path)
+        if folder and not path.exists(folder):
+            makedirs(folder)
+        with open(baseline_path, 'w') as baseline_file:
+            json.dump(results, baseline_file, indent=2)
+        print(f'Saved baseline to {baseline_path}')
+        return True
+
+    if not path.exists(baseline_path):
+        print(f'{baseline_path} cannot be found, nothing to compare (._.)')
+        return True
+
+    with open(baseline_path) as baseline_file:
+        baseline = json.load(baseline_file)
+
+    regressions = compare_to_baseline(results, baseline, max_ratio)
+    for size, stage, ratio in regressions:
+        print(f'REGRESSION {size} {stage}: {ratio:.2f}x baseline')
+
+    return len(regressions) == 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Benchmark pipeline stages on synthetic data')
+    parser.add_argument('--sizes', nargs='+', default=list(SIZES),
+                        choices=list(SIZES))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--max-ratio', type=float, default=1.5)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    args = parser.parse_args()
+
+    passed = run_benchmarks(args.sizes, args.repeat, args.max_ratio,
+                            args.save_baseline, args.baseline)
+    sys.exit(0 if passed else 1)
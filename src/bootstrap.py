@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Fri Oct 18 15:27:03 2019
+
+@author: jeremy_lehner
+
+Bootstrap confidence intervals for the OLS coefficients and test scores of
+the pick rate models. Resamples of the training rows are drawn as an index
+matrix, one row per resample, turned into row counts, and all OLS fits of a
+batch are solved together from stacked normal equations
+
+    X' W_b X beta_b = X' W_b y     W_b = diag(counts of resample b)
+
+so B fits cost a few matrix products instead of B calls to fit. Every fit
+is scored on the held out rows like evaluate_models.
+"""
+
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from src.profiling import profile_stage
+from src.model_functions import adjusted_r2
+
+
+# Resamples solved together, bounds the count matrix to batch x rows
+BATCH_SIZE = 500
+
+# Singular values below this share of the largest are treated as zero,
+# model 2 has two identical ratio columns
+RCOND = 1e-10
+
+
+def _design(X, X_mean, X_scale):
+    # Standardized features with an intercept column first
+    X_std = (X - X_mean) / X_scale
+    return np.column_stack([np.ones(len(X_std)), X_std])
+
+
+def _bootstrap_batches(X, y, X_test, y_test, batches):
+    # Fits and scores the resamples of each (size, seed) batch
+    n_obs, n_feat = X.shape
+    X_mean = X.mean(axis=0)
+    X_scale = X.std(axis=0)
+    X_scale[X_scale == 0] = 1.0
+    design = _design(X, X_mean, X_scale)
+    design_test = _design(X_test, X_mean, X_scale)
+
+    # Products of every pair of columns, so X' W X is one matrix product
+    # of the counts
+    pairs = (design[:, :, None] * design[:, None, :]).reshape(n_obs, -1)
+    targets = design * y[:, None]
+
+    samples = []
+    for size, seed in batches:
+        rng = np.random.default_rng(seed)
+        rows = rng.integers(0, n_obs, size=(size, n_obs))
+
+        # Index matrix to counts of each row in each resample
+        offsets = np.arange(size)[:, None] * n_obs
+        counts = np.bincount((rows + offsets).ravel(),
+                             minlength=size * n_obs).reshape(size, n_obs)
+        counts = counts.astype(np.float64)
+
+        gram = (counts @ pairs).reshape(size, n_feat + 1, n_feat + 1)
+        moments = counts @ targets
+        beta = np.einsum('bij,bj->bi', np.linalg.pinv(gram, rcond=RCOND),
+                         moments)
+
+        # Back to the original feature scale
+        coefs = beta[:, 1:] / X_scale
+        intercepts = beta[:, 0] - coefs @ X_mean
+
+        y_pred = design_test @ beta.T
+        mse = np.mean((y_test[:, None] - y_pred)**2, axis=0)
+        r2_adj = adjusted_r2(X_test, y_test, y_pred)
+
+        samples.append(np.column_stack([intercepts, coefs, mse, r2_adj]))
+
+    return np.concatenate(samples)
+
+
+@profile_stage
+def bootstrap_models(X_train, y_train, X_test, y_test, n_boot=10000,
+                     seed=0, n_jobs=1, batch_size=BATCH_SIZE):
+    """
+    Fits OLS on n_boot resamples of the training rows and scores each fit
+      on the test rows
+
+    Parameters
+    ----------
+    X_train    : pandas data frame
+                 Training features
+    y_train    : pandas series
+                 Training pick rates
+    X_test     : pandas data frame
+                 Held out features
+    y_test     : pandas series
+                 Held out pick rates
+    n_boot     : integer
+                 Number of resamples
+    seed       : integer
+                 Seed for the random number generator
+    n_jobs     : integer
+                 Processes the batches are split over, at most one per
+                 batch, 1 to run in this process
+    batch_size : integer
+                 Resamples solved together
+
+    Returns
+    -------
+    samples : pandas data frame
+              Contains intercept, each coefficient, mse and adjusted_r2 of
+              each resample, the same for any n_jobs
+    """
+
+    columns = ['intercept'] + list(X_train.columns) + ['mse', 'adjusted_r2']
+    X = X_train.to_numpy(dtype=np.float64)
+    y = y_train.to_numpy(dtype=np.float64)
+    X_test = X_test.to_numpy(dtype=np.float64)
+    y_test = y_test.to_numpy(dtype=np.float64)
+
+    # Each batch has its own seed, so resamples don't depend on n_jobs
+    sizes = [min(batch_size, n_boot - start)
+             for start in range(0, n_boot, batch_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    batches = list(zip(sizes, seeds))
+
+    # Every process gets at least one batch
+    n_jobs = max(min(n_jobs, len(batches)), 1)
+    if n_jobs == 1:
+        samples = _bootstrap_batches(X, y, X_test, y_test, batches)
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+            futures = [pool.submit(_bootstrap_batches, X, y, X_test, y_test,
+                                   batches[idx::n_jobs])
+                       for idx in range(n_jobs)]
+            parts = [future.result() for future in futures]
+        # Back to batch order
+        samples = np.empty((n_boot, len(columns)))
+        starts = np.cumsum([0] + sizes)
+        for idx, part in enumerate(parts):
+            offset = 0
+            for batch in range(idx, len(sizes), n_jobs):
+                size = sizes[batch]
+                samples[starts[batch]:starts[batch] + size] = \
+                    part[offset:offset + size]
+                offset += size
+
+    samples = pd.DataFrame(samples, columns=columns)
+
+    return samples
+
+
+def get_percentile_intervals(samples, estimates=None, level=0.95):
+    """
+    Gets percentile confidence intervals of each bootstrapped quantity
+
+    Parameters
+    ----------
+    samples   : pandas data frame
+                Output of bootstrap_models
+    estimates : dictionary
+                Point estimate of each quantity, e.g. from the saved model
+    level     : float
+                Confidence level of the intervals
+
+    Returns
+    -------
+    intervals : pandas data frame
+                Contains the estimate, lower and upper bound of each
+                quantity
+    """
+
+    tail = (1 - level) / 2
+    bounds = samples.quantile([tail, 1 - tail]).T
+    bounds.columns = ['lower', 'upper']
+
+    estimates = estimates or {}
+    intervals = bounds.assign(estimate=[estimates.get(name, np.nan)
+                                        for name in bounds.index])
+    intervals = intervals[['estimate', 'lower', 'upper']]
+
+    return intervals
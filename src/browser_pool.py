@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Tue Oct 15 09:41:55 2019
+
+@author: jeremy_lehner
+
+Pool of long-lived headless Chrome drivers shared by the scrapers. Drivers
+are launched when first needed, handed out with
+
+    with get_browser_pool(pool).driver() as driver:
+        driver.get(url)
+
+reset between uses, and relaunched after a number of page loads so a long
+scrape doesn't keep growing the browser's memory. Unless blocking is turned
+off, images are disabled and requests to ad, tracking and media URLs are
+blocked through the DevTools protocol, so op.gg pages load little more than
+the document, its own scripts and the stats requests. Every page load is
+paced by the pool's RequestPacer, which also picks each driver's user agent
+and when its cookies are dropped.
+"""
+
+import queue
+import atexit
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+from src.lazy_imports import lazy_import
+from src.request_pacing import get_request_pacer
+from src.request_pacing import MAX_TRIES
+
+
+webdriver = lazy_import('selenium.webdriver')
+
+DRIVER_PATH = './src/utils/chromedriver'
+
+# Default number of drivers and page loads before a driver is relaunched
+POOL_SIZE = 1
+MAX_PAGES = 200
+
+# URL patterns blocked in every browser: ad networks, trackers, and images,
+# fonts and video the scrapers never read
+BLOCKED_URLS = ['*doubleclick.net*', '*googlesyndication.com*',
+                '*googleadservices.com*', '*google-analytics.com*',
+                '*googletagmanager.com*', '*googletagservices.com*',
+                '*adservice.google.*', '*amazon-adsystem.com*',
+                '*adnxs.com*', '*criteo.*', '*rubiconproject.com*',
+                '*pubmatic.com*', '*openx.net*', '*casalemedia.com*',
+                '*taboola.com*', '*outbrain.com*', '*scorecardresearch.com*',
+                '*quantserve.com*', '*facebook.net*', '*hotjar.com*',
+                '*playwire.com*', '*.png*', '*.jpg*', '*.jpeg*', '*.gif*',
+                '*.webp*', '*.svg*', '*.ico*', '*.woff*', '*.ttf*', '*.mp4*',
+                '*.webm*']
+
+# HTTP status of the open page, 200 when the browser doesn't report it
+RESPONSE_STATUS = ("const page = "
+                   "performance.getEntriesByType('navigation')[0]; "
+                   "return (page && page.responseStatus) || 200;")
+
+# Pool used by scrapers that aren't handed one, created when first needed
+_default_pool = None
+_default_lock = threading.Lock()
+
+
+class PooledDriver:
+    """
+    Wraps a selenium driver, counting the pages it loads, remembering
+      whether it blocks requests, and pacing its page loads
+    """
+
+    def __init__(self, driver, blocked=False, pacer=None):
+        self.driver = driver
+        self.blocked = blocked
+        self.pacer = get_request_pacer(pacer)
+        self.pages = 0
+        self.sessions = {}
+
+    def use_identity(self, url, identity):
+        # A new session of the host starts without cookies and with the
+        # session's user agent
+        host = urlsplit(url).netloc
+        if self.sessions.get(host) == identity['session']:
+            return
+        self.driver.execute_cdp_cmd('Network.clearBrowserCookies', {})
+        self.driver.execute_cdp_cmd('Network.setUserAgentOverride',
+                                    {'userAgent': identity['user_agent']})
+        self.sessions[host] = identity['session']
+
+    def get(self, url):
+        self.pages += 1
+        for _ in range(MAX_TRIES):
+            self.use_identity(url, self.pacer.wait(url))
+            self.driver.get(url)
+            status = self.driver.execute_script(RESPONSE_STATUS)
+            if not self.pacer.record(url, status):
+                return
+        raise ConnectionError(f'{url} was still throttled after {MAX_TRIES} '
+                              'tries (._.)')
+
+    def __getattr__(self, name):
+        return getattr(self.driver, name)
+
+
+class BrowserPool:
+    """
+    Hands out up to size headless drivers, launching each once and
+      relaunching it after max_pages page loads
+
+    Parameters
+    ----------
+    size        : integer
+                  Largest number of drivers running at once
+    max_pages   : integer
+                  Page loads after which a driver is relaunched
+    driver_path : string
+                  Path to the chromedriver executable
+    headless    : boolean
+                  Run Chrome without a window?
+    block       : boolean
+                  Block images and BLOCKED_URLS?
+    pacer       : RequestPacer
+                  Pacer of every page load, the process-wide pacer by
+                  default
+    """
+
+    def __init__(self, size=POOL_SIZE, max_pages=MAX_PAGES,
+                 driver_path=DRIVER_PATH, headless=True, block=True,
+                 pacer=None):
+        self.size = size
+        self.max_pages = max_pages
+        self.driver_path = driver_path
+        self.headless = headless
+        self.block = block
+        self.pacer = get_request_pacer(pacer)
+
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._drivers = []
+        self.metrics = {'launches': 0, 'launch_seconds': 0.0,
+                        'recycles': 0, 'checkouts': 0, 'pages': 0}
+
+    def get_options(self):
+        """
+        Builds the Chrome options of every driver in the pool
+        """
+
+        options = webdriver.ChromeOptions()
+        if self.headless:
+            options.add_argument('--headless')
+            options.add_argument('--window-size=1920,1080')
+        options.add_argument('--disable-gpu')
+        if self.block:
+            # Images are never requested, other media are blocked by URL
+            images = 'profile.managed_default_content_settings.images'
+            options.add_experimental_option('prefs', {images: 2})
+
+        return options
+
+    def block_requests(self, driver):
+        """
+        Blocks requests to BLOCKED_URLS in a newly launched driver
+        """
+
+        driver.execute_cdp_cmd('Network.enable', {})
+        driver.execute_cdp_cmd('Network.setBlockedURLs',
+                               {'urls': BLOCKED_URLS})
+
+    def _launch(self):
+        start = time.perf_counter()
+        driver = PooledDriver(webdriver.Chrome(self.driver_path,
+                                               options=self.get_options()),
+                              self.block, self.pacer)
+        if self.block:
+            self.block_requests(driver)
+        elapsed = time.perf_counter() - start
+
+        with self._lock:
+            self.metrics['launches'] += 1
+            self.metrics['launch_seconds'] += elapsed
+            self._drivers.append(driver)
+
+        return driver
+
+    def _retire(self, driver):
+        with self._lock:
+            if driver in self._drivers:
+                self._drivers.remove(driver)
+        try:
+            driver.driver.quit()
+        except Exception as error:
+            print(f'Closing a browser failed: {error!r} (._.)')
+
+    def _reset(self, driver):
+        # Leave no cookies, extra windows or page behind for the next user
+        handles = driver.window_handles
+        for handle in handles[1:]:
+            driver.switch_to.window(handle)
+            driver.driver.close()
+        driver.switch_to.window(handles[0])
+        driver.delete_all_cookies()
+        driver.driver.get('about:blank')
+
+    @contextmanager
+    def driver(self):
+        """
+        Checks a driver out of the pool for the duration of a with block,
+          waiting if all size drivers are in use
+        """
+
+        self._slots.acquire()
+        try:
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                driver = self._launch()
+            pages_before = driver.pages
+            with self._lock:
+                self.metrics['checkouts'] += 1
+
+            healthy = False
+            try:
+                yield driver
+                healthy = True
+            finally:
+                with self._lock:
+                    self.metrics['pages'] += driver.pages - pages_before
+
+                # Drivers that errored or loaded enough pages are relaunched
+                # by the next checkout
+                if healthy and driver.pages < self.max_pages:
+                    try:
+                        self._reset(driver)
+                        self._idle.put(driver)
+                    except Exception:
+                        self._retire(driver)
+                else:
+                    if healthy:
+                        with self._lock:
+                            self.metrics['recycles'] += 1
+                    self._retire(driver)
+        finally:
+            self._slots.release()
+
+    def stats(self):
+        """
+        Reports launches, page loads, and the launch time saved by reusing
+          drivers instead of starting one per checkout
+
+        Returns
+        -------
+        stats : dictionary
+                Pool metrics, with mean_launch_seconds and
+                launch_seconds_saved added
+        """
+
+        with self._lock:
+            stats = dict(self.metrics)
+        launches = max(stats['launches'], 1)
+        stats['mean_launch_seconds'] = stats['launch_seconds'] / launches
+        stats['launch_seconds_saved'] = (
+            (stats['checkouts'] - stats['launches'])
+            * stats['mean_launch_seconds'])
+
+        return stats
+
+    def close(self):
+        """
+        Quits every driver of the pool
+        """
+
+        while True:
+            try:
+                self._idle.get_nowait()
+            except queue.Empty:
+                break
+        for driver in list(self._drivers):
+            self._retire(driver)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def get_browser_pool(pool=None):
+    """
+    Gets the pool a scraper should use
+
+    Parameters
+    ----------
+    pool : BrowserPool
+           Pool handed to the scraper, the process-wide pool by default
+
+    Returns
+    -------
+    pool : BrowserPool
+           Pool to check drivers out of
+    """
+
+    global _default_pool
+
+    if pool is not None:
+        return pool
+
+    with _default_lock:
+        if _default_pool is None:
+            _default_pool = BrowserPool()
+            atexit.register(_default_pool.close)
+
+    return _default_pool
@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Fri Oct 11 10:48:37 2019
+
+@author: jeremy_lehner
+
+Canonical champion ids and an alias index mapping each source's spelling of
+a champion (wiki, op.gg, gamepedia, Riot) to its id.
+
+    data/champion_ids.csv      champion_id,champion
+    data/champion_aliases.csv  alias,source,champion
+
+Canonical names are the wiki names in champion_names.csv. Ids are assigned
+once, in the order champions first appear, and never change. Spellings that
+only differ in case, accents, spaces or punctuation (Kai'Sa, KaiSa, kaisa)
+match without an alias, other spellings need a row in champion_aliases.csv.
+"""
+
+import re
+import unicodedata
+import pandas as pd
+from os import path
+
+from src.profiling import profile_stage
+from src.load_league_data import get_static_patches
+from src.load_league_data import load_champ_names
+
+
+# Alias indexes that have already been built, keyed by data folder
+_index_cache = {}
+
+
+def normalize_name(name):
+    """
+    Reduces a champion name to lower case letters and digits so spellings
+      that differ in punctuation, spacing or accents compare equal
+
+    Parameters
+    ----------
+    name : string
+           Champion name as spelled by any source
+
+    Returns
+    -------
+    key : string
+          Normalized name, e.g. 'kaisa' for "Kai'Sa"
+    """
+
+    name = unicodedata.normalize('NFKD', str(name).replace('_', ' '))
+    name = name.encode('ascii', 'ignore').decode('ascii')
+    key = re.sub(r'[^a-z0-9]', '', name.lower())
+
+    return key
+
+
+def load_champion_ids(data_folder='./data/'):
+    """
+    Loads the canonical champion id table
+
+    Parameters
+    ----------
+    data_folder : string
+                  Folder containing the scraped data
+
+    Returns
+    -------
+    champion_ids : pandas data frame
+                   Contains champion_id as integers and champion as strings
+    """
+
+    file_path = path.join(data_folder, 'champion_ids.csv')
+    if path.exists(file_path):
+        champion_ids = pd.read_csv(file_path, dtype={'champion': str})
+    else:
+        print('champion_ids.csv cannot be found (._.)')
+        champion_ids = pd.DataFrame({'champion_id': pd.Series(dtype=int),
+                                     'champion': pd.Series(dtype=str)})
+
+    return champion_ids
+
+
+def load_champion_aliases(data_folder='./data/'):
+    """
+    Loads the spellings of champion names used by other sources
+
+    Parameters
+    ----------
+    data_folder : string
+                  Folder containing the scraped data
+
+    Returns
+    -------
+    aliases : pandas data frame
+              Contains alias, source and canonical champion as strings
+    """
+
+    file_path = path.join(data_folder, 'champion_aliases.csv')
+    if path.exists(file_path):
+        aliases = pd.read_csv(file_path, dtype=str)
+    else:
+        aliases = pd.DataFrame(columns=['alias', 'source', 'champion'])
+
+    return aliases
+
+
+@profile_stage
+def update_champion_ids(data_folder='./data/'):
+    """
+    Gives every champion in the static snapshots that has no id yet the
+      next free id and saves the id table
+
+    Parameters
+    ----------
+    data_folder : string
+                  Folder containing the scraped data
+
+    Returns
+    -------
+    champion_ids : pandas data frame
+                   Contains champion_id as integers and champion as strings
+    """
+
+    champion_ids = load_champion_ids(data_folder)
+    index = build_alias_index(data_folder, champion_ids)
+
+    # Oldest snapshot first, so ids follow the order champions appeared
+    new_names = []
+    for patch in get_static_patches(data_folder):
+        for name in load_champ_names(data_folder, patch):
+            key = normalize_name(name)
+            if key not in index:
+                index[key] = None
+                new_names.append(name)
+
+    if new_names:
+        next_id = 1
+        if len(champion_ids):
+            next_id = int(champion_ids['champion_id'].max()) + 1
+        new_ids = pd.DataFrame({'champion_id': range(next_id,
+                                                     next_id + len(new_names)),
+                                'champion': new_names})
+        champion_ids = pd.concat([champion_ids, new_ids], ignore_index=True)
+        champion_ids.to_csv(path.join(data_folder, 'champion_ids.csv'),
+                            index=False)
+        _index_cache.pop(data_folder, None)
+
+    return champion_ids
+
+
+def build_alias_index(data_folder='./data/', champion_ids=None):
+    """
+    Builds the hash index from normalized canonical names and aliases to
+      champion ids
+
+    Parameters
+    ----------
+    data_folder  : string
+                   Folder containing the scraped data
+    champion_ids : pandas data frame
+                   Canonical id table, loaded from data_folder by default
+
+    Returns
+    -------
+    index : dictionary
+            Champion id for each normalized spelling
+    """
+
+    if champion_ids is None:
+        champion_ids = load_champion_ids(data_folder)
+    aliases = load_champion_aliases(data_folder)
+
+    index = {}
+    for champion, champion_id in zip(champion_ids['champion'],
+                                     champion_ids['champion_id']):
+        index[normalize_name(champion)] = int(champion_id)
+
+    by_name = dict(zip(champion_ids['champion'], champion_ids['champion_id']))
+    for alias, champion in zip(aliases['alias'], aliases['champion']):
+        if champion not in by_name:
+            continue
+        key = normalize_name(alias)
+        if key in index and index[key] != by_name[champion]:
+            raise ValueError(f'Alias {alias!r} of {champion} matches another '
+                             'champion')
+        index[key] = int(by_name[champion])
+
+    return index
+
+
+def get_alias_index(data_folder='./data/'):
+    """
+    Gets the alias index, building it only once per process unless the id
+      or alias table has been modified since
+
+    Parameters
+    ----------
+    data_folder : string
+                  Folder containing the scraped data
+
+    Returns
+    -------
+    index : dictionary
+            Champion id for each normalized spelling
+    """
+
+    files = [path.join(data_folder, 'champion_ids.csv'),
+             path.join(data_folder, 'champion_aliases.csv')]
+    mtimes = tuple(path.getmtime(file_path) if path.exists(file_path)
+                   else None for file_path in files)
+    cached = _index_cache.get(data_folder)
+    if cached is not None and cached[0] == mtimes:
+        return cached[1]
+
+    index = build_alias_index(data_folder)
+    _index_cache[data_folder] = (mtimes, index)
+
+    return index
+
+
+def get_champion_ids(names, data_folder='./data/'):
+    """
+    Looks up the canonical id of champion names spelled by any source
+
+    Parameters
+    ----------
+    names       : list
+                  Contains champion names as strings
+    data_folder : string
+                  Folder containing the scraped data
+
+    Returns
+    -------
+    champion_ids : list
+                   Contains the id of each name as integers
+    """
+
+    index = get_alias_index(data_folder)
+    keys = [normalize_name(name) for name in names]
+
+    unknown = [name for name, key in zip(names, keys) if key not in index]
+    if unknown:
+        raise KeyError(f'Unknown champions {unknown}, add them to '
+                       'champion_aliases.csv (._.)')
+
+    champion_ids = [index[key] for key in keys]
+
+    return champion_ids
+
+
+def get_source_names(names, source, data_folder='./data/'):
+    """
+    Gets the spellings a source uses for champions, the alias listed for
+      that source if there is one, otherwise the canonical name
+
+    Parameters
+    ----------
+    names       : list
+                  Contains champion names spelled by any source
+    source      : string
+                  'wiki', 'opgg', 'gamepedia', or 'riot'
+    data_folder : string
+                  Folder containing the scraped data
+
+    Returns
+    -------
+    source_names : list
+                   Contains each name as the source spells it
+    """
+
+    champion_ids = load_champion_ids(data_folder)
+    aliases = load_champion_aliases(data_folder)
+
+    # Spelling of each id, the source's own alias first
+    spellings = dict(zip(champion_ids['champion_id'],
+                         champion_ids['champion']))
+    by_name = dict(zip(champion_ids['champion'],
+                       champion_ids['champion_id']))
+    listed = aliases[aliases['source'] == source]
+    for alias, champion in zip(listed['alias'], listed['champion']):
+        if champion in by_name:
+            spellings[by_name[champion]] = alias
+
+    source_names = [spellings[champion_id] for champion_id
+                    in get_champion_ids(names, data_folder)]
+
+    return source_names
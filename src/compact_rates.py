@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Thu Oct 24 10:17:45 2019
+
+@author: jeremy_lehner
+
+Compaction of the daily rate files of closed patches. A patch is closed
+once the next patch in patch_dates.csv has started. Each closed patch
+folder of data/<metric>/<region>/<tier>/ gets
+
+    <metric>_rates_<patch>.csv.gz    the daily rows of every day, in order
+    <metric>_summary_<patch>.csv     days, mean, min, max and last rate of
+                                     each champion over the patch
+
+and its daily files are removed once the compacted file has been read back.
+load_rate_files reads the compacted file together with any daily files of
+days it doesn't cover, so the files read grow with patches instead of days.
+"""
+
+import glob
+import numpy as np
+import pandas as pd
+from os import path, remove, replace
+from src.profiling import profile_stage
+from src.process_league_data import patch_key
+from src.load_league_data import get_rate_folder
+from src.load_league_data import get_compacted_path
+from src.load_league_data import get_daily_rate_files
+from src.load_league_data import read_patch_rates
+from src.load_league_data import load_patch_dates
+from src.load_league_data import load_champ_names
+
+
+def get_closed_patches(patch_dates, date=None):
+    """
+    Gets the patches that no new daily data can belong to
+
+    Parameters
+    ----------
+    patch_dates : pandas data frame
+                  Contains each patch and its start_date
+    date        : string
+                  Day as 'YYYY-MM-DD', today by default
+
+    Returns
+    -------
+    closed : list
+             Patch versions whose next patch started on or before date
+    """
+
+    date = pd.Timestamp(date) if date is not None else pd.Timestamp.today()
+    patch_dates = patch_dates.sort_values('start_date')
+    next_start = patch_dates['start_date'].shift(-1)
+
+    closed = patch_dates.loc[next_start <= date, 'patch'].astype(str)
+
+    return list(closed)
+
+
+def summarize_patch_rates(rate_df, metric, champ_names):
+    """
+    Aggregates the daily rates of one patch for each champion
+
+    Parameters
+    ----------
+    rate_df     : pandas data frame
+                  Contains the daily rows of the patch in date order, each
+                  day in the order of champ_names
+    metric      : string
+                  'win', 'ban', or 'pick'
+    champ_names : pandas series
+                  Champion names of the patch's static snapshot
+
+    Returns
+    -------
+    summary : pandas data frame
+              Contains champion, days, mean, min, max and last rate
+    """
+
+    column = f'{metric}rate'
+    position = rate_df.groupby('date', sort=False).cumcount().to_numpy()
+    if position.max() >= len(champ_names):
+        raise ValueError(f'{column} days have more rows than the '
+                         f'{len(champ_names)} champions of the patch')
+
+    grouped = rate_df[column].groupby(position)
+    summary = pd.DataFrame({'days': grouped.count(),
+                            'mean': grouped.mean().round(4),
+                            'min': grouped.min(),
+                            'max': grouped.max(),
+                            'last': grouped.last()})
+    summary.insert(0, 'champion',
+                   np.asarray(champ_names, dtype=str)[summary.index])
+
+    return summary
+
+
+def compact_patch(metric, region, tier, patch, data_folder='./data/',
+                  keep_daily=False):
+    """
+    Rolls the daily files of one patch into its compacted and summary files
+
+    Parameters
+    ----------
+    metric      : string
+                  'win', 'ban', or 'pick'
+    region      : string
+                  op.gg region
+    tier        : string
+                  Rank tier
+    patch       : string
+                  Closed patch version
+    data_folder : string
+                  Folder containing the scraped data
+    keep_daily  : boolean
+                  Keep the daily files after compacting?
+
+    Returns
+    -------
+    num_files : integer
+                Daily files rolled into the compacted file
+    """
+
+    rate_folder = get_rate_folder(metric, region, tier, patch, data_folder)
+    daily_files = get_daily_rate_files(metric, rate_folder)
+    if not daily_files:
+        return 0
+
+    # Earlier compacted days and the new daily files, in date order
+    rate_df = pd.concat(read_patch_rates(metric, rate_folder, patch),
+                        ignore_index=True)
+    rate_df = rate_df.sort_values('date', kind='stable', ignore_index=True)
+    champ_names = load_champ_names(data_folder, patch)
+    summary = summarize_patch_rates(rate_df, metric, champ_names)
+
+    # Write next to the final files and swap them in, a failed run leaves
+    # the old files in place
+    compacted_path, summary_path = get_compacted_path(metric, rate_folder,
+                                                      patch)
+    rate_df.to_csv(f'{compacted_path}.tmp', index=False, compression='gzip')
+    written = pd.read_csv(f'{compacted_path}.tmp', compression='gzip')
+    if len(written) != len(rate_df):
+        remove(f'{compacted_path}.tmp')
+        raise IOError(f'{compacted_path} could not be written (._.)')
+    replace(f'{compacted_path}.tmp', compacted_path)
+    summary.to_csv(summary_path, index=False)
+
+    if not keep_daily:
+        for file in daily_files.values():
+            remove(file)
+
+    return len(daily_files)
+
+
+@profile_stage
+def compact_rate_data(data_folder='./data/', date=None, keep_daily=False):
+    """
+    Compacts every closed patch of every rate, region and tier
+
+    Parameters
+    ----------
+    data_folder : string
+                  Folder containing the scraped data
+    date        : string
+                  Day patches are closed on as 'YYYY-MM-DD', today by
+                  default
+    keep_daily  : boolean
+                  Keep the daily files after compacting?
+
+    Returns
+    -------
+    compacted : pandas data frame
+                Contains metric, region, tier, patch and the number of
+                daily files rolled up, one row per compacted patch
+    """
+
+    closed = set(get_closed_patches(load_patch_dates(data_folder), date))
+
+    compacted = []
+    for metric in ['win', 'ban', 'pick']:
+        pattern = path.join(get_rate_folder(metric, '*', '*', '*',
+                                            data_folder), '')
+        for folder in sorted(glob.glob(pattern)):
+            tier_folder, patch = path.split(path.dirname(folder))
+            region_folder, tier = path.split(tier_folder)
+            region = path.basename(region_folder)
+            if patch not in closed:
+                continue
+            num_files = compact_patch(metric, region, tier, patch,
+                                      data_folder, keep_daily)
+            if num_files:
+                compacted.append((metric, region, tier, patch, num_files))
+
+    compacted = pd.DataFrame(compacted, columns=['metric', 'region', 'tier',
+                                                 'patch', 'num_files'])
+    compacted = compacted.sort_values(
+        'patch', key=lambda patches: patches.map(patch_key), kind='stable',
+        ignore_index=True)
+
+    return compacted
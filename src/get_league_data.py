@@ -8,10 +8,13 @@ Created on Thu Aug 29 13:17:50 2019
 
 import pandas as pd
 import datetime
-from selenium import webdriver
 import time
-from bs4 import BeautifulSoup
 from os import path
+from src.lazy_imports import lazy_import
+
+# Scraping stack is only imported the first time a scraper needs it
+webdriver = lazy_import('selenium.webdriver')
+bs4 = lazy_import('bs4')
 
 
 def get_scrape_date():
@@ -159,7 +162,7 @@ def get_number_of_skins(names, scrape=False, save=False):
             driver.get(skins_url)
             time.sleep(1)
 
-            soup = BeautifulSoup(driver.page_source, 'html.parser')
+            soup = bs4.BeautifulSoup(driver.page_source, 'html.parser')
 
             num_skins.append(len(soup.find_all('div', {'style': style})))
 
@@ -424,7 +427,7 @@ def get_last_patch_change(names, scrape=False, save=False):
             driver.get(champ_url)
             time.sleep(1)
 
-            soup = BeautifulSoup(driver.page_source, 'html.parser')
+            soup = bs4.BeautifulSoup(driver.page_source, 'html.parser')
 
             history = [link for link in soup.find_all('a')
                        if '>v1.' in str(link) or 'Patch 1.' in str(link)
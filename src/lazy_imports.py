@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Wed Oct  2 09:31:18 2019
+
+@author: jeremy_lehner
+
+Deferred imports for the scraping stack and an import time budget for the
+analysis path, measured with python -X importtime.
+
+    python -m src.lazy_imports
+"""
+
+import re
+import sys
+import importlib
+import subprocess
+
+
+# Cumulative import time budgets in milliseconds for the analysis path
+IMPORT_BUDGETS_MS = {'src.model_artifacts': 250,
+                     'src.load_league_data': 800,
+                     'src.process_league_data': 800,
+                     'src.model_functions': 250,
+                     'src.prediction_service': 300}
+
+# Packages that only the scrape path should ever import
+SCRAPE_ONLY_PACKAGES = ['selenium',
+                        'chromedriver_binary',
+                        'fake_useragent',
+                        'bs4',
+                        'requests']
+
+
+class _LazyModule:
+    """
+    Stand-in for a module that is imported on first attribute access
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attribute):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attribute)
+
+
+def lazy_import(name):
+    """
+    Returns a stand-in for a module that is only imported the first time one
+      of its attributes is used
+
+    Parameters
+    ----------
+    name : string
+           Full name of the module, e.g. 'selenium.webdriver'
+
+    Returns
+    -------
+    module : _LazyModule
+             Proxy forwarding attribute access to the imported module
+    """
+
+    return _LazyModule(name)
+
+
+def measure_import_time(module):
+    """
+    Imports a module in a fresh interpreter under python -X importtime and
+      collects the cumulative time of every module it pulled in
+
+    Parameters
+    ----------
+    module : string
+             Name of the module to import
+
+    Returns
+    -------
+    import_times : dictionary
+                   Cumulative import time in ms for each imported module
+    """
+
+    result = subprocess.run([sys.executable, '-X', 'importtime',
+                             '-c', f'import {module}'],
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        raise ImportError(f'Could not import {module}:\n{result.stderr}')
+
+    # Lines look like 'import time:   self [us] | cumulative | package'
+    line_format = re.compile(r'import time:\s+\d+ \|\s+(\d+) \|(\s*)(\S+)')
+    import_times = {}
+    for line in result.stderr.splitlines():
+        match = line_format.match(line)
+        if match:
+            import_times[match.group(3)] = int(match.group(1)) / 1000
+
+    return import_times
+
+
+def check_import_budget(budgets=None):
+    """
+    Checks each analysis module against its import time budget and makes
+      sure none of them import the scraping stack
+
+    Parameters
+    ----------
+    budgets : dictionary
+              Budget in ms for each module, IMPORT_BUDGETS_MS by default
+
+    Returns
+    -------
+    within_budget : boolean
+                    True if every module is within budget and scrape free
+    """
+
+    if budgets is None:
+        budgets = IMPORT_BUDGETS_MS
+
+    within_budget = True
+    for module, budget in budgets.items():
+        import_times = measure_import_time(module)
+        elapsed = import_times.get(module, 0.0)
+
+        scrape_imports = sorted({name.split('.')[0] for name in import_times
+                                 if name.split('.')[0]
+                                 in SCRAPE_ONLY_PACKAGES})
+
+        status = 'ok'
+        if elapsed > budget or scrape_imports:
+            status = 'OVER BUDGET' if elapsed > budget else 'SCRAPE IMPORTS'
+            within_budget = False
+
+        print(f'{module:<28} {elapsed:8.1f} ms / {budget:5d} ms  {status}')
+        if scrape_imports:
+            print(f'    imports scrape-only packages: {scrape_imports}')
+
+    return within_budget
+
+
+if __name__ == '__main__':
+    sys.exit(0 if check_import_budget() else 1)
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Thu Oct 17 09:52:40 2019
+
+@author: jeremy_lehner
+
+In-memory dtypes of the league data. Names repeated on every row are
+categoricals, dates are datetime64, counts are small integers and rates are
+float32, so one row of league_df takes a few dozen bytes instead of several
+hundred. Loaders and the steps combining their outputs pass them through
+apply_schema or cast_column, and the csv files and SQLite store keep
+'YYYY-MM-DD' strings.
+
+    python -m src.league_schema              memory report on three seasons
+    python -m src.league_schema --days 365   ... or on other synthetic data
+"""
+
+import argparse
+import numpy as np
+import pandas as pd
+from os import path
+
+
+# dtype of each column, columns not listed keep the dtype they have
+SCHEMA = {'champion': 'category',
+          'region': 'category',
+          'tier': 'category',
+          'patch': 'category',
+          'date': 'datetime64[ns]',
+          'release_date': 'datetime64[ns]',
+          'start_date': 'datetime64[ns]',
+          'num_skins': 'int16',
+          'patches_since_change': 'int16',
+          'champion_age': 'int32',
+          'winrate': 'float32',
+          'banrate': 'float32',
+          'pickrate': 'float32'}
+
+# Rates whose derived columns, e.g. 'pickrate_mean3', are float32 as well
+RATE_NAMES = ['winrate', 'banrate', 'pickrate']
+
+# Synthetic data of the memory report: three seasons of one region
+REPORT_DATA = {'days': 1095, 'champs': 170, 'regions': 1, 'patches': 47}
+REPORT_FOLDER = './cache/synthetic/seasons/'
+
+
+def get_column_dtype(column):
+    """
+    Gets the in-memory dtype of a column
+
+    Parameters
+    ----------
+    column : string
+             Column name
+
+    Returns
+    -------
+    dtype : string
+            dtype from SCHEMA, None for columns without one
+    """
+
+    dtype = SCHEMA.get(column)
+    if dtype is None and str(column).split('_')[0] in RATE_NAMES:
+        dtype = 'float32'
+
+    return dtype
+
+
+def cast_column(values, column):
+    """
+    Casts the values of one column to its dtype in SCHEMA
+
+    Parameters
+    ----------
+    values : pandas series
+             Values of the column, e.g. as read from a csv file
+    column : string
+             Column name giving the dtype
+
+    Returns
+    -------
+    values : pandas series
+             Values with the column's dtype, dates that aren't 'YYYY-MM-DD'
+             become NaT and counts with missing values stay floats
+    """
+
+    dtype = get_column_dtype(column)
+    if dtype is None or values.dtype == dtype:
+        return values
+
+    if dtype == 'category':
+        values = values.astype('category')
+    elif dtype.startswith('datetime'):
+        values = pd.to_datetime(values, format='%Y-%m-%d', errors='coerce')
+    else:
+        values = pd.to_numeric(values, errors='coerce')
+        if dtype.startswith('int') and values.isna().any():
+            dtype = 'float32'
+        values = values.astype(dtype)
+
+    return values
+
+
+def apply_schema(frame):
+    """
+    Casts every column of a data frame that has a dtype in SCHEMA
+
+    Parameters
+    ----------
+    frame : pandas data frame
+            Contains league data with columns of any dtype
+
+    Returns
+    -------
+    frame : pandas data frame
+            Copy of frame with compact dtypes
+    """
+
+    frame = frame.copy(deep=False)
+    for column in frame.columns:
+        frame[column] = cast_column(frame[column], column)
+
+    return frame
+
+
+def to_wide_dtypes(frame):
+    """
+    Casts a data frame back to the dtypes the loaders produced before the
+      schema: object strings, int64 and float64
+
+    Parameters
+    ----------
+    frame : pandas data frame
+            Contains league data with compact dtypes
+
+    Returns
+    -------
+    frame : pandas data frame
+            Copy of frame with the wide dtypes
+    """
+
+    frame = frame.copy()
+    for column in frame.columns:
+        values = frame[column]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            frame[column] = values.astype(str).astype(object)
+        elif pd.api.types.is_datetime64_any_dtype(values):
+            frame[column] = values.dt.strftime('%Y-%m-%d').astype(object)
+        elif pd.api.types.is_integer_dtype(values):
+            frame[column] = values.astype(np.int64)
+        elif pd.api.types.is_float_dtype(values):
+            frame[column] = values.astype(np.float64)
+
+    return frame
+
+
+def memory_report(frame):
+    """
+    Compares the memory of each column with compact and with wide dtypes
+
+    Parameters
+    ----------
+    frame : pandas data frame
+            Contains league data with compact dtypes
+
+    Returns
+    -------
+    report : pandas data frame
+             Contains the wide and compact dtype and MB of each column, with
+             a total row
+    """
+
+    wide = to_wide_dtypes(frame)
+    report = pd.DataFrame({
+        'wide_dtype': wide.dtypes.astype(str),
+        'wide_mb': wide.memory_usage(index=False, deep=True) / 1024**2,
+        'compact_dtype': frame.dtypes.astype(str),
+        'compact_mb': frame.memory_usage(index=False, deep=True) / 1024**2})
+    report.loc['total'] = ['', report['wide_mb'].sum(), '',
+                           report['compact_mb'].sum()]
+    report['ratio'] = report['wide_mb'] / report['compact_mb']
+
+    return report
+
+
+if __name__ == '__main__':
+    from src.synthetic_data import make_synthetic_data
+    from src.pipeline import build_league_data
+
+    parser = argparse.ArgumentParser(
+        description='Report the memory of league_df with compact dtypes')
+    for name, default in REPORT_DATA.items():
+        parser.add_argument(f'--{name}', type=int, default=default)
+    parser.add_argument('--folder', default=REPORT_FOLDER)
+    args = parser.parse_args()
+
+    spec = {name: getattr(args, name) for name in REPORT_DATA}
+    if not path.exists(path.join(args.folder, 'patch_dates.csv')):
+        print(f'Writing synthetic data to {args.folder}')
+        make_synthetic_data(args.folder, **spec)
+
+    league_df = build_league_data(args.folder, args.folder)
+    print(f'{len(league_df)} rows, {league_df["date"].nunique()} days, '
+          f'{league_df["patch"].nunique()} patches')
+    with pd.option_context('display.float_format', '{:.2f}'.format,
+                           'display.width', 120):
+        print(memory_report(league_df))
@@ -0,0 +1,455 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Tue Oct  8 13:05:41 2019
+
+@author: jeremy_lehner
+
+Embedded SQLite store for the scraped data. Scraped csv files are ingested
+incrementally, and the load_* functions query the store when given a db_path.
+
+    python main.py ingest
+    python main.py risers --days 5 --top 10
+"""
+
+import glob
+import sqlite3
+import pandas as pd
+from os import path
+
+from src.profiling import profile_stage
+from src.process_league_data import patch_key
+
+
+DB_PATH = './data/league.db'
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS champions (
+    champion_id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    release_date TEXT
+);
+CREATE TABLE IF NOT EXISTS static_features (
+    patch TEXT NOT NULL,
+    champion_id INTEGER NOT NULL REFERENCES champions (champion_id),
+    position INTEGER NOT NULL,
+    num_skins INTEGER,
+    last_patch TEXT,
+    PRIMARY KEY (patch, champion_id)
+);
+CREATE TABLE IF NOT EXISTS daily_rates (
+    champion_id INTEGER NOT NULL REFERENCES champions (champion_id),
+    date TEXT NOT NULL,
+    region TEXT NOT NULL,
+    tier TEXT NOT NULL,
+    patch TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    winrate REAL,
+    banrate REAL,
+    pickrate REAL,
+    PRIMARY KEY (champion_id, date, region, tier)
+);
+CREATE INDEX IF NOT EXISTS daily_rates_partition
+    ON daily_rates (region, tier, date, position);
+CREATE TABLE IF NOT EXISTS patch_dates (
+    patch TEXT PRIMARY KEY,
+    start_date TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS ingested_files (
+    file_path TEXT PRIMARY KEY,
+    mtime REAL NOT NULL
+);
+'''
+
+# Columns of the store behind each static csv file
+STATIC_COLUMNS = {'champion_names': 'c.name',
+                  'champion_release_dates': 'c.release_date',
+                  'num_skins': 's.num_skins',
+                  'last_patch': 's.last_patch'}
+
+
+def connect_store(db_path=DB_PATH):
+    """
+    Opens the store, creating its tables if they don't exist yet
+
+    Parameters
+    ----------
+    db_path : string
+              Path to the SQLite database file
+
+    Returns
+    -------
+    connection : sqlite3 connection
+                 Open connection to the store
+    """
+
+    connection = sqlite3.connect(db_path)
+    connection.executescript(SCHEMA)
+
+    return connection
+
+
+def _is_ingested(connection, file_path):
+    # A file needs ingesting if it is new or changed since the last ingest
+    mtime = path.getmtime(file_path)
+    row = connection.execute('SELECT mtime FROM ingested_files '
+                             'WHERE file_path = ?', (file_path,)).fetchone()
+    return row is not None and row[0] == mtime
+
+
+def _mark_ingested(connection, file_path):
+    connection.execute('INSERT OR REPLACE INTO ingested_files VALUES (?, ?)',
+                       (file_path, path.getmtime(file_path)))
+
+
+def _format_dates(dates):
+    # The store keeps dates as 'YYYY-MM-DD' text, loaders parse them
+    return pd.to_datetime(dates).dt.strftime('%Y-%m-%d')
+
+
+@profile_stage
+def ingest_league_data(data_folder='./data/', db_path=DB_PATH):
+    """
+    Ingests new or changed csv files from the data folder into the store,
+      files that were already ingested are skipped
+
+    Parameters
+    ----------
+    data_folder : string
+                  Folder containing the scraped data
+    db_path     : string
+                  Path to the SQLite database file
+
+    Returns
+    -------
+    num_files : integer
+                Number of csv files ingested
+    """
+
+    # Import here, the loaders import this module to query the store
+    from src.load_league_data import load_patch_dates
+    from src.load_league_data import get_static_patches
+    from src.load_league_data import get_static_folder
+    from src.load_league_data import load_champ_names
+    from src.load_league_data import load_release_dates
+    from src.load_league_data import load_number_of_skins
+    from src.load_league_data import load_last_patch_change
+    from src.champion_ids import update_champion_ids
+    from src.champion_ids import get_champion_ids
+
+    # Champions keep their canonical ids in the store
+    update_champion_ids(data_folder)
+
+    connection = connect_store(db_path)
+    num_files = 0
+
+    with connection:
+        # Patch calendar
+        patch_dates_path = path.join(data_folder, 'patch_dates.csv')
+        if not _is_ingested(connection, patch_dates_path):
+            patch_dates = load_patch_dates(data_folder)
+            connection.executemany('INSERT OR REPLACE INTO patch_dates '
+                                   'VALUES (?, ?)',
+                                   zip(patch_dates['patch'],
+                                       _format_dates(
+                                           patch_dates['start_date'])))
+            _mark_ingested(connection, patch_dates_path)
+            num_files += 1
+
+        # Static data snapshots, champions get an id the first time seen
+        for patch in get_static_patches(data_folder):
+            static_folder = get_static_folder(patch, data_folder)
+            files = sorted(glob.glob(path.join(static_folder, '*.csv')))
+            if all(_is_ingested(connection, file) for file in files):
+                continue
+
+            names = load_champ_names(data_folder, patch)
+            release_dates = load_release_dates(data_folder, patch)
+            num_skins = load_number_of_skins(data_folder, patch)
+            last_patch = load_last_patch_change(data_folder, patch)
+
+            champion_ids = get_champion_ids(names, data_folder)
+            connection.executemany(
+                'INSERT INTO champions (champion_id, name, release_date) '
+                'VALUES (?, ?, ?) '
+                'ON CONFLICT (champion_id) DO UPDATE '
+                'SET name = excluded.name, '
+                'release_date = excluded.release_date',
+                zip(champion_ids, names, _format_dates(release_dates)))
+            connection.execute('DELETE FROM static_features WHERE patch = ?',
+                               (patch,))
+            connection.executemany(
+                'INSERT INTO static_features VALUES (?, ?, ?, ?, ?)',
+                zip([patch] * len(names), champion_ids, range(len(names)),
+                    [int(skins) for skins in num_skins], last_patch))
+
+            for file in files:
+                _mark_ingested(connection, file)
+            num_files += len(files)
+
+        # Daily rates, partitioned as <metric>/<region>/<tier>/<patch>/
+        snapshot_ids = {}
+        for metric in ['win', 'ban', 'pick']:
+            # Daily files and compacted patches, not the patch summaries
+            pattern = path.join(data_folder, metric, '*', '*', '*',
+                                f'{metric}_rates_*')
+            for file in sorted(glob.glob(pattern)):
+                if _is_ingested(connection, file):
+                    continue
+
+                patch_folder = path.dirname(file)
+                tier_folder = path.dirname(patch_folder)
+                region_folder = path.dirname(tier_folder)
+                patch = path.basename(patch_folder)
+                tier = path.basename(tier_folder)
+                region = path.basename(region_folder)
+
+                # Rows are in the alphabetical order of the patch's snapshot
+                snapshot = path.basename(get_static_folder(patch,
+                                                           data_folder))
+                if snapshot not in snapshot_ids:
+                    snapshot_ids[snapshot] = [
+                        row[0] for row in connection.execute(
+                            'SELECT champion_id FROM static_features '
+                            'WHERE patch = ? ORDER BY position', (snapshot,))]
+                champion_ids = snapshot_ids[snapshot]
+
+                # Compacted files hold every day of the patch
+                column = f'{metric}rate'
+                for date, rate_df in pd.read_csv(file).groupby('date',
+                                                               sort=False):
+                    # A short file would leave champions without rates
+                    if len(rate_df) != len(champion_ids):
+                        raise ValueError(f'{file} has {len(rate_df)} rows on '
+                                         f'{date} but the {snapshot} snapshot '
+                                         f'has {len(champion_ids)} champions '
+                                         '(._.)')
+
+                    connection.executemany(
+                        'INSERT INTO daily_rates (champion_id, date, region, '
+                        f'tier, patch, position, {column}) '
+                        'VALUES (?, ?, ?, ?, ?, ?, ?) '
+                        'ON CONFLICT (champion_id, date, region, tier) '
+                        f'DO UPDATE SET {column} = excluded.{column}',
+                        zip(champion_ids, rate_df['date'],
+                            [region] * len(rate_df), [tier] * len(rate_df),
+                            [patch] * len(rate_df), range(len(rate_df)),
+                            rate_df[column].astype(float)))
+
+                _mark_ingested(connection, file)
+                num_files += 1
+
+    connection.close()
+
+    return num_files
+
+
+def query_static(name, db_path=DB_PATH, patch=None):
+    """
+    Queries one static feature from the store, in the same order and format
+      as the matching load_* function
+
+    Parameters
+    ----------
+    name    : string
+              'champion_names', 'champion_release_dates', 'num_skins', or
+              'last_patch'
+    db_path : string
+              Path to the SQLite database file
+    patch   : string
+              Patch whose static snapshot is used, the newest by default
+
+    Returns
+    -------
+    feature : pandas series
+              Contains the feature for each champion in alphabetical order
+    """
+
+    connection = sqlite3.connect(db_path)
+
+    # Newest snapshot taken on or before the patch
+    snapshots = [row[0] for row in connection.execute(
+        'SELECT DISTINCT patch FROM static_features')]
+    if patch is not None:
+        snapshots = [snapshot for snapshot in snapshots
+                     if patch_key(snapshot) <= patch_key(patch)]
+    if not snapshots:
+        connection.close()
+        raise LookupError(f'No static data in {db_path} for patch {patch}')
+    snapshot = max(snapshots, key=patch_key)
+
+    feature = pd.read_sql_query(
+        f'SELECT {STATIC_COLUMNS[name]} AS {name} '
+        'FROM static_features s JOIN champions c USING (champion_id) '
+        'WHERE s.patch = ? ORDER BY s.position',
+        connection, params=(snapshot,))[name]
+    connection.close()
+
+    return feature.rename(None)
+
+
+def query_rates(metric, db_path=DB_PATH, regions=('na',), tiers=('all',),
+                patches=None):
+    """
+    Queries one daily rate from the store, in the same order and format as
+      load_rate_files
+
+    Parameters
+    ----------
+    metric  : string
+              'win', 'ban', or 'pick'
+    db_path : string
+              Path to the SQLite database file
+    regions : list
+              Regions to query
+    tiers   : list
+              Rank tiers to query
+    patches : list
+              Patches to query, every patch by default
+
+    Returns
+    -------
+    rates_all : pandas data frame
+                Contains champion rates as floats, dates as strings, and the
+                region, tier and patch of each row
+    """
+
+    column = f'{metric}rate'
+    conditions = [f'region IN ({",".join("?" * len(regions))})',
+                  f'tier IN ({",".join("?" * len(tiers))})',
+                  f'{column} IS NOT NULL']
+    params = list(regions) + list(tiers)
+    if patches is not None:
+        conditions.append(f'patch IN ({",".join("?" * len(patches))})')
+        params += list(patches)
+
+    connection = sqlite3.connect(db_path)
+    rates_all = pd.read_sql_query(
+        f'SELECT {column}, date, region, tier, patch FROM daily_rates '
+        f'WHERE {" AND ".join(conditions)} '
+        'ORDER BY region, tier, date, position',
+        connection, params=params)
+    connection.close()
+
+    if rates_all.empty:
+        raise LookupError(f'No {metric} rates in {db_path} for regions '
+                          f'{list(regions)}, tiers {list(tiers)} and '
+                          f'patches {patches}')
+
+    return rates_all
+
+
+def query_patch_dates(db_path=DB_PATH):
+    """
+    Queries the patch calendar from the store
+
+    Parameters
+    ----------
+    db_path : string
+              Path to the SQLite database file
+
+    Returns
+    -------
+    patch_dates : pandas data frame
+                  Contains each patch and its start_date as strings
+    """
+
+    connection = sqlite3.connect(db_path)
+    patch_dates = pd.read_sql_query('SELECT patch, start_date '
+                                    'FROM patch_dates ORDER BY start_date',
+                                    connection)
+    connection.close()
+
+    return patch_dates
+
+
+def query_rate_patches(db_path=DB_PATH, region='na', tier='all'):
+    """
+    Queries the patches that have daily rates for a region and tier
+
+    Parameters
+    ----------
+    db_path : string
+              Path to the SQLite database file
+    region  : string
+              op.gg region
+    tier    : string
+              Rank tier
+
+    Returns
+    -------
+    patches : list
+              Contains the patch versions as strings
+    """
+
+    connection = sqlite3.connect(db_path)
+    patches = [row[0] for row in connection.execute(
+        'SELECT DISTINCT patch FROM daily_rates WHERE region = ? '
+        'AND tier = ?', (region, tier))]
+    connection.close()
+
+    return patches
+
+
+@profile_stage
+def query_top_risers(db_path=DB_PATH, days=5, top=10, metric='pick',
+                     region='na', tier='all'):
+    """
+    Finds the champions whose rate rose the most over the last few days of
+      data, without loading the full data set
+
+    Parameters
+    ----------
+    db_path : string
+              Path to the SQLite database file
+    days    : integer
+              Number of most recent days of data to compare across
+    top     : integer
+              Number of champions to return
+    metric  : string
+              'win', 'ban', or 'pick'
+    region  : string
+              Region to query
+    tier    : string
+              Rank tier to query
+
+    Returns
+    -------
+    risers : pandas data frame
+             Contains champion, rate on the first and last day, and change
+    """
+
+    column = f'{metric}rate'
+    query = f'''
+        WITH recent AS (
+            SELECT DISTINCT date FROM daily_rates
+            WHERE region = :region AND tier = :tier
+            ORDER BY date DESC LIMIT :days
+        ), bounds AS (
+            SELECT MIN(date) AS first_date, MAX(date) AS last_date
+            FROM recent
+        )
+        SELECT c.name AS champion,
+               bounds.first_date, first.{column} AS first_{column},
+               bounds.last_date, last.{column} AS last_{column},
+               last.{column} - first.{column} AS change
+        FROM bounds
+        JOIN daily_rates first
+            ON first.date = bounds.first_date
+            AND first.region = :region AND first.tier = :tier
+        JOIN daily_rates last
+            ON last.champion_id = first.champion_id
+            AND last.date = bounds.last_date
+            AND last.region = :region AND last.tier = :tier
+        JOIN champions c ON c.champion_id = first.champion_id
+        ORDER BY change DESC
+        LIMIT :top
+    '''
+
+    connection = sqlite3.connect(db_path)
+    risers = pd.read_sql_query(query, connection,
+                               params={'region': region, 'tier': tier,
+                                       'days': days, 'top': top})
+    connection.close()
+
+    return risers
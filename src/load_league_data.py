@@ -7,29 +7,133 @@ Created on Wed Sep 25 09:06:22 2019
 """
 
 import pandas as pd
+import numpy as np
 from os import path
 import glob
+from src.profiling import profile_stage
+from src.process_league_data import patch_key
+from src.league_schema import apply_schema
+from src.league_schema import cast_column
+from src.league_store import query_static
+from src.league_store import query_rates
+from src.league_store import query_patch_dates
+from src.league_store import query_rate_patches
 
 
-def load_champ_names():
+def get_static_patches(data_folder='./data/'):
+    """
+    Gets the patches that have a static data snapshot, oldest first
+
+    Parameters
+    ----------
+    data_folder : string
+                  Folder containing the scraped data
+
+    Returns
+    -------
+    patches : list
+              Contains the patch versions as strings
+    """
+
+    folders = glob.glob(path.join(data_folder, 'static', '*', ''))
+    patches = sorted((path.basename(path.dirname(folder))
+                      for folder in folders), key=patch_key)
+
+    return patches
+
+
+def get_static_folder(patch=None, data_folder='./data/'):
+    """
+    Gets the folder with the static data snapshot in effect for a patch,
+      the newest snapshot taken on or before that patch
+
+    Parameters
+    ----------
+    patch       : string
+                  Patch version, the newest snapshot by default
+    data_folder : string
+                  Folder containing the scraped data
+
+    Returns
+    -------
+    static_folder : string
+                    Static csv folder, data/static/<patch>/
+    """
+
+    patches = get_static_patches(data_folder)
+    if patch is not None:
+        patches = [snapshot for snapshot in patches
+                   if patch_key(snapshot) <= patch_key(patch)]
+    if not patches:
+        raise FileNotFoundError(f'No static data in {data_folder} for patch '
+                                f'{patch}')
+
+    static_folder = path.join(data_folder, 'static', patches[-1])
+
+    return static_folder
+
+
+def load_patch_dates(data_folder='./data/', db_path=None):
+    """
+    Loads the patch calendar from a csv file,
+      returns it as a pandas data frame
+
+    Parameters
+    ----------
+    data_folder : string
+                  Folder containing the scraped data
+    db_path     : string
+                  Query this SQLite store instead of reading csv files
+
+    Returns
+    -------
+    patch_dates : pandas data frame
+                  Contains each patch as a category and its start_date
+                  as a datetime
+    """
+
+    if db_path is not None:
+        return apply_schema(query_patch_dates(db_path))
+
+    patch_dates = pd.read_csv(path.join(data_folder, 'patch_dates.csv'),
+                              dtype=str)
+    patch_dates = apply_schema(patch_dates)
+
+    return patch_dates
+
+
+@profile_stage
+def load_champ_names(data_folder='./data/', patch=None, db_path=None):
     """
     Loads the champion names from a csv file,
       returns them as a pandas series
 
     Parameters
     ----------
-    None
+    data_folder : string
+                  Folder containing the scraped data
+    patch       : string
+                  Patch whose static snapshot is loaded, the newest by default
+    db_path     : string
+                  Query this SQLite store instead of reading csv files
 
     Returns
     -------
     names : pandas series
-            Contains champion names as strings
+            Contains champion names as a category
     """
 
-    if path.exists('./data/champion_names.csv'):
-        names = pd.read_csv('./data/champion_names.csv',
+    if db_path is not None:
+        names = query_static('champion_names', db_path, patch)
+        return cast_column(names, 'champion')
+
+    static_folder = get_static_folder(patch, data_folder)
+    file_path = path.join(static_folder, 'champion_names.csv')
+    if path.exists(file_path):
+        names = pd.read_csv(file_path,
                             header=None,
                             squeeze=True)
+        names = cast_column(names, 'champion')
     else:
         print('champion_names.csv cannot be found (._.)')
         names = []
@@ -37,25 +141,38 @@ def load_champ_names():
     return names
 
 
-def load_release_dates():
+@profile_stage
+def load_release_dates(data_folder='./data/', patch=None, db_path=None):
     """
     Loads the champion release dates from a csv file,
       returns them as a pandas series
 
     Parameters
     ----------
-    None
+    data_folder : string
+                  Folder containing the scraped data
+    patch       : string
+                  Patch whose static snapshot is loaded, the newest by default
+    db_path     : string
+                  Query this SQLite store instead of reading csv files
 
     Returns
     -------
     dates : pandas series
-            Contains champion release dates as strings 'YYYY-MM-DD'
+            Contains champion release dates as datetimes
     """
 
-    if path.exists('./data/champion_release_dates.csv'):
-        dates = pd.read_csv('./data/champion_release_dates.csv',
+    if db_path is not None:
+        dates = query_static('champion_release_dates', db_path, patch)
+        return cast_column(dates, 'release_date')
+
+    static_folder = get_static_folder(patch, data_folder)
+    file_path = path.join(static_folder, 'champion_release_dates.csv')
+    if path.exists(file_path):
+        dates = pd.read_csv(file_path,
                             header=None,
                             squeeze=True)
+        dates = cast_column(dates, 'release_date')
     else:
         print('champion_release_dates.csv file cannot be found (._.)')
         dates = []
@@ -63,25 +180,38 @@ def load_release_dates():
     return dates
 
 
-def load_number_of_skins():
+@profile_stage
+def load_number_of_skins(data_folder='./data/', patch=None, db_path=None):
     """
     Loads the number of skins for each champion from a csv file,
       returns them as a pandas series
 
     Parameters
     ----------
-    None
+    data_folder : string
+                  Folder containing the scraped data
+    patch       : string
+                  Patch whose static snapshot is loaded, the newest by default
+    db_path     : string
+                  Query this SQLite store instead of reading csv files
 
     Returns
     -------
     num_skins : pandas series
-                Contains number of champion skins as integers
+                Contains number of champion skins as int16
     """
 
-    if path.exists('./data/num_skins.csv'):
-        num_skins = pd.read_csv('./data/num_skins.csv',
+    if db_path is not None:
+        num_skins = query_static('num_skins', db_path, patch)
+        return cast_column(num_skins, 'num_skins')
+
+    static_folder = get_static_folder(patch, data_folder)
+    file_path = path.join(static_folder, 'num_skins.csv')
+    if path.exists(file_path):
+        num_skins = pd.read_csv(file_path,
                                 header=None,
                                 squeeze=True)
+        num_skins = cast_column(num_skins, 'num_skins')
     else:
         print('num_skins.csv file cannot be found (._.)')
         num_skins = []
@@ -89,108 +219,427 @@ def load_number_of_skins():
     return num_skins
 
 
-def load_win_rates():
+def get_rate_folder(metric, region='na', tier='all', patch=None,
+                    data_folder='./data/'):
+    """
+    Gets the folder holding the daily csv files of one rate metric for one
+      region, rank tier and patch, partitioned as
+      data/<metric>/<region>/<tier>/<patch>/
+
+    Parameters
+    ----------
+    metric      : string
+                  'win', 'ban', or 'pick'
+    region      : string
+                  op.gg region, e.g. 'na', 'euw', or 'kr'
+    tier        : string
+                  Rank tier, 'all' for players of all ranks
+    patch       : string
+                  Patch version, None for the folder holding every patch
+    data_folder : string
+                  Folder containing the scraped data
+
+    Returns
+    -------
+    rate_folder : string
+                  Folder containing the daily csv files
+    """
+
+    rate_folder = path.join(data_folder, metric, region, tier)
+    if patch is not None:
+        rate_folder = path.join(rate_folder, patch)
+
+    return rate_folder
+
+
+def get_rate_patches(data_folder='./data/', region='na', tier='all',
+                     patches=None, db_path=None):
+    """
+    Gets the patches whose rates a build loads, without loading the rates
+
+    Parameters
+    ----------
+    data_folder : string
+                  Folder containing the scraped data
+    region      : string
+                  op.gg region
+    tier        : string
+                  Rank tier
+    patches     : list
+                  Requested patches, every patch with win rates by default
+    db_path     : string
+                  Query this SQLite store instead of listing folders
+
+    Returns
+    -------
+    patches : list
+              Contains the patch versions in chronological order
+    """
+
+    if patches is None:
+        if db_path is not None:
+            patches = query_rate_patches(db_path, region, tier)
+        else:
+            tier_folder = get_rate_folder('win', region, tier,
+                                          data_folder=data_folder)
+            patches = [path.basename(path.dirname(folder))
+                       for folder in glob.glob(path.join(tier_folder, '*',
+                                                         ''))]
+
+    patches = sorted(patches, key=patch_key)
+
+    return patches
+
+
+def get_compacted_path(metric, rate_folder, patch):
+    """
+    Gets the paths of the compacted daily rates and the per-champion
+      aggregates of one closed patch, see compact_rate_data
+
+    Parameters
+    ----------
+    metric      : string
+                  'win', 'ban', or 'pick'
+    rate_folder : string
+                  Folder of the patch, from get_rate_folder
+    patch       : string
+                  Patch version
+
+    Returns
+    -------
+    compacted_path : string
+                     File with the daily rows of every day of the patch
+    summary_path   : string
+                     File with the per-patch aggregates of each champion
+    """
+
+    compacted_path = path.join(rate_folder, f'{metric}_rates_{patch}.csv.gz')
+    summary_path = path.join(rate_folder, f'{metric}_summary_{patch}.csv')
+
+    return compacted_path, summary_path
+
+
+def get_daily_rate_files(metric, rate_folder):
+    """
+    Gets the daily csv files of one patch folder by date
+
+    Parameters
+    ----------
+    metric      : string
+                  'win', 'ban', or 'pick'
+    rate_folder : string
+                  Folder of the patch, from get_rate_folder
+
+    Returns
+    -------
+    daily_files : dictionary
+                  Path of each day's file by date as 'YYYY-MM-DD', in
+                  date order
+    """
+
+    daily_files = {}
+    for file in sorted(glob.glob(path.join(rate_folder,
+                                           f'{metric}_rates_*.csv'))):
+        stamp = path.basename(file)[len(metric) + 7:-4]
+        daily_files[f'{stamp[:4]}-{stamp[4:6]}-{stamp[6:]}'] = file
+
+    return daily_files
+
+
+def read_patch_rates(metric, rate_folder, patch):
+    """
+    Reads the rates of one patch folder, merging its compacted file with
+      the daily files of days it doesn't cover
+
+    Parameters
+    ----------
+    metric      : string
+                  'win', 'ban', or 'pick'
+    rate_folder : string
+                  Folder of the patch, from get_rate_folder
+    patch       : string
+                  Patch version
+
+    Returns
+    -------
+    rates : list
+            Contains one pandas data frame per file read, in date order
+    """
+
+    rates = []
+    daily_files = get_daily_rate_files(metric, rate_folder)
+
+    compacted_path = get_compacted_path(metric, rate_folder, patch)[0]
+    if path.exists(compacted_path):
+        compacted = pd.read_csv(compacted_path)
+        rates.append(compacted)
+        for date in compacted['date'].unique():
+            daily_files.pop(date, None)
+
+    for file in daily_files.values():
+        rates.append(pd.read_csv(file))
+
+    return rates
+
+
+def load_rate_files(metric, data_folder='./data/', regions=('na',),
+                    tiers=('all',), patches=None, db_path=None):
+    """
+    Loads the daily csv files of one rate metric for the requested regions,
+      tiers and patches only, reading compacted patches from their single
+      file, returns them in a pandas data frame
+
+    Parameters
+    ----------
+    metric      : string
+                  'win', 'ban', or 'pick'
+    data_folder : string
+                  Folder containing the scraped data
+    regions     : list
+                  Regions to load, other regions' files are never read
+    tiers       : list
+                  Rank tiers to load, other tiers' files are never read
+    patches     : list
+                  Patches to load, every patch by default
+    db_path     : string
+                  Query this SQLite store instead of reading csv files
+
+    Returns
+    -------
+    rates_all : pandas data frame
+                Contains champion rates as float32, dates as datetimes, and
+                the region, tier and patch of each row as categories
+    """
+
+    if db_path is not None:
+        return apply_schema(query_rates(metric, db_path, regions, tiers,
+                                        patches))
+
+    rates = []
+    partitions = []
+    for region in regions:
+        for tier in tiers:
+            tier_folder = get_rate_folder(metric, region, tier,
+                                          data_folder=data_folder)
+            tier_patches = patches
+            if tier_patches is None:
+                tier_patches = [path.basename(path.dirname(folder))
+                                for folder in glob.glob(path.join(tier_folder,
+                                                                  '*', ''))]
+            tier_patches = sorted(tier_patches, key=patch_key)
+            if not tier_patches:
+                print(f'No {metric} rate files found for {region} {tier} '
+                      '(._.)')
+
+            # Closed patches are one compacted file, open ones daily files
+            for patch in tier_patches:
+                patch_rates = read_patch_rates(
+                    metric, path.join(tier_folder, patch), patch)
+                rates += patch_rates
+                partitions += [(region, tier, patch)] * len(patch_rates)
+
+    if not rates:
+        raise FileNotFoundError(f'No {metric} rate files found in '
+                                f'{data_folder} for regions {list(regions)}, '
+                                f'tiers {list(tiers)} and patches {patches}')
+
+    rates_all = pd.concat(rates, ignore_index=True)
+
+    # Label each row with its partition in one pass after concatenating,
+    # repeating category codes rather than strings
+    lengths = [len(rate_df) for rate_df in rates]
+    for idx, key in enumerate(['region', 'tier', 'patch']):
+        labels = pd.Categorical([partition[idx] for partition in partitions])
+        rates_all[key] = pd.Categorical.from_codes(
+            np.repeat(labels.codes, lengths), labels.categories)
+    rates_all = apply_schema(rates_all)
+
+    return rates_all
+
+
+def load_rate_summaries(metric, data_folder='./data/', regions=('na',),
+                        tiers=('all',), patches=None):
+    """
+    Loads the per-patch aggregates of one rate metric written when patches
+      are compacted
+
+    Parameters
+    ----------
+    metric      : string
+                  'win', 'ban', or 'pick'
+    data_folder : string
+                  Folder containing the scraped data
+    regions     : list
+                  Regions to load
+    tiers       : list
+                  Rank tiers to load
+    patches     : list
+                  Patches to load, every compacted patch by default
+
+    Returns
+    -------
+    summaries : pandas data frame
+                Contains champion, days, mean, min, max and last rate, and
+                the region, tier and patch of each row
+    """
+
+    summaries = []
+    for region in regions:
+        for tier in tiers:
+            tier_folder = get_rate_folder(metric, region, tier,
+                                          data_folder=data_folder)
+            patch_files = {path.basename(path.dirname(file)): file
+                           for file in glob.glob(path.join(
+                               tier_folder, '*', f'{metric}_summary_*.csv'))}
+            for patch in sorted(patch_files, key=patch_key):
+                file = patch_files[patch]
+                if patches is None or patch in patches:
+                    summaries.append(pd.read_csv(file).assign(
+                        region=region, tier=tier, patch=patch))
+
+    if not summaries:
+        raise FileNotFoundError(f'No compacted {metric} rates found in '
+                                f'{data_folder} (._.)')
+
+    summaries = apply_schema(pd.concat(summaries, ignore_index=True))
+
+    return summaries
+
+
+@profile_stage
+def load_win_rates(data_folder='./data/', regions=('na',),
+                   tiers=('all',), patches=None, db_path=None):
     """
     Loads the champion win rates and correspdonding dates from csv files,
       returns them in a pandas data frame
 
     Parameters
     ----------
-    None
+    data_folder : string
+                  Folder containing the scraped data
+    regions     : list
+                  Regions to load, North America by default
+    tiers       : list
+                  Rank tiers to load, all ranks combined by default
+    patches     : list
+                  Patches to load, every patch by default
+    db_path     : string
+                  Query this SQLite store instead of reading csv files
 
     Returns
     -------
     winrates_all : pandas data frame
-                   Contains champion win rates as floats and dates as strings
+                   Contains champion win rates as float32 and dates as
+                   datetimes
     """
 
-    path = './data/win/'
-    files = glob.glob(path + '*.csv')
-
-    winrates = []
-    for file in files:
-        winrates.append(pd.read_csv(file))
-
-    winrates_all = pd.concat(winrates, ignore_index=True)
+    winrates_all = load_rate_files('win', data_folder, regions, tiers,
+                                   patches, db_path)
 
     return winrates_all
 
 
-def load_ban_rates():
+@profile_stage
+def load_ban_rates(data_folder='./data/', regions=('na',),
+                   tiers=('all',), patches=None, db_path=None):
     """
     Loads the champion ban rates and correspdonding dates from csv files,
       returns them in a pandas data frame
 
     Parameters
     ----------
-    None
+    data_folder : string
+                  Folder containing the scraped data
+    regions     : list
+                  Regions to load, North America by default
+    tiers       : list
+                  Rank tiers to load, all ranks combined by default
+    patches     : list
+                  Patches to load, every patch by default
+    db_path     : string
+                  Query this SQLite store instead of reading csv files
 
     Returns
     -------
     banrates_all : pandas data frame
-                   Contains champion ban rates as floats and dates as strings
+                   Contains champion ban rates as float32 and dates as
+                   datetimes
     """
 
-    path = './data/ban/'
-    files = glob.glob(path + '*.csv')
-
-    banrates = []
-    for file in files:
-        banrates.append(pd.read_csv(file))
-
-    banrates_all = pd.concat(banrates, ignore_index=True)
+    banrates_all = load_rate_files('ban', data_folder, regions, tiers,
+                                   patches, db_path)
 
     return banrates_all
 
 
-def load_pick_rates():
+@profile_stage
+def load_pick_rates(data_folder='./data/', regions=('na',),
+                    tiers=('all',), patches=None, db_path=None):
     """
     Loads the champion pick rates and correspdonding dates from csv files,
       returns them in a pandas data frame
 
     Parameters
     ----------
-    None
+    data_folder : string
+                  Folder containing the scraped data
+    regions     : list
+                  Regions to load, North America by default
+    tiers       : list
+                  Rank tiers to load, all ranks combined by default
+    patches     : list
+                  Patches to load, every patch by default
+    db_path     : string
+                  Query this SQLite store instead of reading csv files
 
     Returns
     -------
     pickrates_all : pandas data frame
-                    Contains champion pick rates as floats and dates as strings
+                    Contains champion pick rates as float32 and dates as
+                    datetimes
     """
 
-    path = './data/pick/'
-    files = glob.glob(path + '*.csv')
-
-    pickrates = []
-    for file in files:
-        pickrates.append(pd.read_csv(file))
-
-    pickrates_all = pd.concat(pickrates, ignore_index=True)
+    pickrates_all = load_rate_files('pick', data_folder, regions, tiers,
+                                    patches, db_path)
 
     return pickrates_all
 
 
-def load_last_patch_change():
+@profile_stage
+def load_last_patch_change(data_folder='./data/', patch=None, db_path=None):
     """
     Loads the last patch each champion was changed from csv files
       returns them as a pandas data frame
 
     Parameters
     ----------
-    None
+    data_folder : string
+                  Folder containing the scraped data
+    patch       : string
+                  Patch whose static snapshot is loaded, the newest by default
+    db_path     : string
+                  Query this SQLite store instead of reading csv files
 
     Returns
     -------
     last_patch : pandas series
-                 Contains last patch each champion was changed as strings
+                 Contains last patch each champion was changed as a category
     """
 
-    if path.exists('./data/last_patch.csv'):
-        last_patch = pd.read_csv('./data/last_patch.csv',
+    if db_path is not None:
+        last_patch = query_static('last_patch', db_path, patch)
+        return cast_column(last_patch, 'patch')
+
+    static_folder = get_static_folder(patch, data_folder)
+    file_path = path.join(static_folder, 'last_patch.csv')
+    if path.exists(file_path):
+        # Read as strings so patches like '9.10' don't become 9.1
+        last_patch = pd.read_csv(file_path,
                                  header=None,
-                                 squeeze=True)
-        last_patch = last_patch.astype('str')
-        
+                                 squeeze=True,
+                                 dtype=str)
+        last_patch = cast_column(last_patch, 'patch')
+
     else:
         print('last_patch.csv file cannot be found (._.)')
         last_patch = []
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Tue Oct  1 16:45:10 2019
+
+@author: jeremy_lehner
+
+Load test for the local prediction service.
+
+    python -m src.prediction_service &
+    python -m src.load_test_service --clients 32 --requests 200
+"""
+
+import json
+import time
+import random
+import argparse
+import threading
+import numpy as np
+import urllib.request
+
+
+def post_json(url, payload):
+    """
+    Sends a json payload to the url and returns the decoded json response
+
+    Parameters
+    ----------
+    url     : string
+              Address of the endpoint
+    payload : dictionary
+              Body of the request
+
+    Returns
+    -------
+    response : dictionary
+               Decoded json body of the response
+    """
+
+    body = json.dumps(payload).encode('utf-8')
+    request = urllib.request.Request(url, data=body,
+                                     headers={'Content-Type':
+                                              'application/json'})
+    with urllib.request.urlopen(request) as reply:
+        response = json.loads(reply.read())
+
+    return response
+
+
+def get_json(url):
+    """
+    Gets the url and returns the decoded json response
+
+    Parameters
+    ----------
+    url : string
+          Address of the endpoint
+
+    Returns
+    -------
+    response : dictionary
+               Decoded json body of the response
+    """
+
+    with urllib.request.urlopen(url) as reply:
+        response = json.loads(reply.read())
+
+    return response
+
+
+def run_load_test(base_url='http://127.0.0.1:8050', model='model1',
+                  clients=32, requests=200, rows=1):
+    """
+    Hammers the prediction service from concurrent clients and prints the
+      throughput along with client and server side latency percentiles
+
+    Parameters
+    ----------
+    base_url : string
+               Address of the prediction service
+    model    : string
+               Name of the model to query
+    clients  : integer
+               Number of concurrent client threads
+    requests : integer
+               Number of requests sent by each client
+    rows     : integer
+               Number of champions scored per request
+
+    Returns
+    -------
+    summary : dictionary
+              Throughput and latency percentiles seen by the clients
+    """
+
+    features = get_json(f'{base_url}/models')[model]
+    url = f'{base_url}/predict/{model}'
+
+    latencies = []
+    lock = threading.Lock()
+
+    def client():
+        own_latencies = []
+        for _ in range(requests):
+            payload = {'rows': [[random.random() for _ in features]
+                                for _ in range(rows)]}
+            start = time.perf_counter()
+            post_json(url, payload)
+            own_latencies.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(own_latencies)
+
+    # Run all clients at once
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    latencies = np.array(latencies) * 1000
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    summary = {'requests': len(latencies),
+               'seconds': round(elapsed, 3),
+               'requests_per_second': round(len(latencies) / elapsed, 1),
+               'rows_per_second': round(len(latencies) * rows / elapsed, 1),
+               'client_p50_ms': round(p50, 3),
+               'client_p95_ms': round(p95, 3),
+               'client_p99_ms': round(p99, 3)}
+
+    print(json.dumps(summary, indent=2))
+    print('Server side:')
+    print(json.dumps(get_json(f'{base_url}/stats')[model], indent=2))
+
+    return summary
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Load test the local prediction service')
+    parser.add_argument('--url', default='http://127.0.0.1:8050')
+    parser.add_argument('--model', default='model1')
+    parser.add_argument('--clients', type=int, default=32)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--rows', type=int, default=1)
+    args = parser.parse_args()
+
+    run_load_test(args.url, args.model, args.clients, args.requests,
+                  args.rows)
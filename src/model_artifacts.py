@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Sep 30 10:14:52 2019
+
+@author: jeremy_lehner
+"""
+
+import json
+import hashlib
+import numpy as np
+from os import path, makedirs
+from src.profiling import profile_stage
+
+
+# Version of the artifact layout, bump when the saved fields change
+ARTIFACT_VERSION = 1
+
+# Artifacts that have already been read, keyed by file path
+_artifact_cache = {}
+
+
+def get_schema_hash(features):
+    """
+    Calculates a short hash identifying an ordered list of model features
+
+    Parameters
+    ----------
+    features : list
+               Contains the feature names as strings in model order
+
+    Returns
+    -------
+    schema_hash : string
+                  First 16 hex digits of the sha256 of the feature names
+    """
+
+    schema = '|'.join(features) + f'|v{ARTIFACT_VERSION}'
+    schema_hash = hashlib.sha256(schema.encode('utf-8')).hexdigest()[:16]
+
+    return schema_hash
+
+
+@profile_stage
+def save_model_artifact(model, features, name, folder='./models/'):
+    """
+    Saves the coefficients of a fitted linear model to a small json artifact
+      so predictions can be made without sklearn or the training data
+
+    Parameters
+    ----------
+    model    : sklearn linear model
+               Fitted model with coef_ and intercept_ attributes
+    features : list
+               Contains the feature names as strings in training order
+    name     : string
+               Name of the artifact, e.g. 'model1'
+    folder   : string
+               Folder in which the artifact is written
+
+    Returns
+    -------
+    artifact_path : string
+                    Path of the saved artifact
+    """
+
+    features = [str(feature) for feature in features]
+    coefficients = [float(coef) for coef in np.ravel(model.coef_)]
+
+    if len(coefficients) != len(features):
+        raise ValueError(f'{name} has {len(coefficients)} coefficients '
+                         f'but {len(features)} features')
+
+    artifact = {'name': name,
+                'version': ARTIFACT_VERSION,
+                'schema_hash': get_schema_hash(features),
+                'features': features,
+                'coefficients': coefficients,
+                'intercept': float(model.intercept_),
+                'penalty': getattr(model, 'penalty', 'ols')}
+
+    # Write artifact to json file
+    if not path.exists(folder):
+        makedirs(folder)
+    artifact_path = path.join(folder, f'{name}.json')
+    with open(artifact_path, 'w') as artifact_file:
+        json.dump(artifact, artifact_file, separators=(',', ':'))
+
+    # Drop any stale copy of this artifact
+    _artifact_cache.pop(artifact_path, None)
+
+    return artifact_path
+
+
+@profile_stage
+def load_model_artifact(artifact_path='./models/model1.json'):
+    """
+    Loads a saved model artifact, reading the file only once per process
+      unless it has been modified since
+
+    Parameters
+    ----------
+    artifact_path : string
+                    Path to the json artifact written by save_model_artifact
+
+    Returns
+    -------
+    artifact : dictionary
+               Contains features, coefficients as a numpy array, intercept,
+               version, schema_hash and penalty of the saved model
+    """
+
+    mtime = path.getmtime(artifact_path)
+    cached = _artifact_cache.get(artifact_path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+
+    with open(artifact_path) as artifact_file:
+        artifact = json.load(artifact_file)
+
+    # Make sure the artifact was written by a compatible version
+    if artifact['version'] != ARTIFACT_VERSION:
+        raise ValueError(f'{artifact_path} has artifact version '
+                         f'{artifact["version"]}, expected {ARTIFACT_VERSION}')
+    if artifact['schema_hash'] != get_schema_hash(artifact['features']):
+        raise ValueError(f'{artifact_path} schema hash does not match its '
+                         'features')
+
+    artifact['coefficients'] = np.asarray(artifact['coefficients'],
+                                          dtype=np.float64)
+    _artifact_cache[artifact_path] = (mtime, artifact)
+
+    return artifact
+
+
+@profile_stage
+def predict_pick_rates(frame, artifact_path='./models/model1.json'):
+    """
+    Predicts pick rates for a batch of champions from a saved model artifact
+      with a single matrix-vector product
+
+    Parameters
+    ----------
+    frame         : pandas data frame
+                    Contains at least the features the model was trained on
+    artifact_path : string
+                    Path to the json artifact written by save_model_artifact
+
+    Returns
+    -------
+    pick_rates : numpy array
+                 Contains the predicted pick rates as floats
+    """
+
+    artifact = load_model_artifact(artifact_path)
+    features = artifact['features']
+
+    missing = [feature for feature in features if feature not in frame]
+    if missing:
+        raise KeyError(f'Features missing from frame: {missing}')
+
+    X = frame[features].to_numpy(dtype=np.float64)
+    pick_rates = X @ artifact['coefficients'] + artifact['intercept']
+
+    return pick_rates
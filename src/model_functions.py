@@ -7,8 +7,10 @@ Created on Thu Sep 26 16:38:24 2019
 """
 
 import numpy as np
+from src.profiling import profile_stage
 
 
+@profile_stage
 def adjusted_r2(X_test, y_test, y_pred):
     """
     Calculates the adjusted R^2 from the residuals of the test set predictions
@@ -20,24 +22,26 @@ def adjusted_r2(X_test, y_test, y_pred):
     y_test : pandas series
              Actual win rates from the test set
     y_pred : numpy array
-             Predicted win rates for the test set
+             Predicted win rates for the test set, or one column of
+             predictions per model to score several models at once
 
     Returns
     -------
     r2_adj : float
-                 An OLS linear regression model
-    prediction : numpy array
-                 Contains the predicted pick rates for the test set
-    mse
+             Adjusted R^2, a numpy array of one per model for 2D y_pred
     """
 
     # Get number of observations and number of features in test set
     n_obs = len(y_test)
     n_feat = X_test.shape[1]
 
-    # Calculate sum of squares quantities
-    ss_residual = sum((y_test - y_pred)**2)
-    ss_total = sum((y_test - np.mean(y_test))**2)
+    # Calculate sum of squares quantities, per column of predictions
+    y_test = np.asarray(y_test, dtype=np.float64)
+    y_pred = np.asarray(y_pred, dtype=np.float64)
+    if y_pred.ndim > 1:
+        y_test = y_test[:, None]
+    ss_residual = np.sum((y_test - y_pred)**2, axis=0)
+    ss_total = np.sum((y_test - np.mean(y_test))**2, axis=0)
 
     # Calculate R^2 scores
     r2 = 1.0 - (ss_residual / ss_total)
@@ -0,0 +1,686 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Thu Oct  3 11:20:05 2019
+
+@author: jeremy_lehner
+"""
+
+import json
+import time
+import resource
+import pandas as pd
+import numpy as np
+from os import path, makedirs
+
+# Import data loading functions
+from src.load_league_data import load_champ_names
+from src.load_league_data import load_release_dates
+from src.load_league_data import load_number_of_skins
+from src.load_league_data import load_win_rates
+from src.load_league_data import load_ban_rates
+from src.load_league_data import load_pick_rates
+from src.load_league_data import load_last_patch_change
+from src.load_league_data import load_patch_dates
+from src.load_league_data import get_rate_patches
+from src.load_league_data import get_rate_folder
+
+# Import data processing functions
+from src.process_league_data import patch_key
+from src.process_league_data import get_patches_since_change
+from src.process_league_data import join_static_by_patch
+from src.process_league_data import combine_rate_data
+from src.process_league_data import get_champ_age
+from src.process_league_data import add_ratio_features
+
+# Import the in-memory dtypes of the data
+from src.league_schema import apply_schema
+
+# Import data validation functions
+from src.validate_league_data import validate_static_data
+from src.validate_league_data import raise_problems
+from src.validate_league_data import validate_rate_data
+
+# Import trend feature functions
+from src.trend_features import add_trend_features
+
+# Import the trajectory index
+from src.trajectory_index import update_saved_index
+
+# Import functions for model analysis
+from src.model_functions import adjusted_r2
+
+# Import regularized model fitting
+from src.regularization_paths import fit_regularized_model
+
+# Import functions for saving and scoring fitted models
+from src.model_artifacts import save_model_artifact
+from src.model_artifacts import predict_pick_rates
+from src.model_artifacts import load_model_artifact
+
+# Import bootstrap confidence intervals
+from src.bootstrap import bootstrap_models
+from src.bootstrap import get_percentile_intervals
+
+# Import browser pool defaults (selenium itself is imported when scraping)
+from src.browser_pool import MAX_PAGES
+
+# Import the stage executor
+from src.stage_graph import StageGraph
+from src.stage_graph import get_path_stamp
+
+# Import profiling hooks
+from src.profiling import profile_stage
+from src.profiling import profile_block
+
+
+# Folders for inputs and for outputs shared between stages
+DATA_FOLDER = './data/'
+CACHE_FOLDER = './cache/'
+MODEL_FOLDER = './models/'
+
+# Columns used for modeling (target = pickrate)
+MODEL_DATA = ['champion_age',
+              'patches_since_change',
+              'num_skins',
+              'winrate',
+              'banrate',
+              'pickrate']
+
+# Stage graph of the build, kept so later builds in this process only rerun
+# the stages whose files or arguments changed
+_build_graph = StageGraph()
+
+# Models that are trained, evaluated and used for prediction
+MODEL_NAMES = ['model1', 'model2']
+
+
+def report_stage(name, stage, *args, **kwargs):
+    """
+    Runs one pipeline stage and prints its wall time and the peak memory
+      of the process
+
+    Parameters
+    ----------
+    name  : string
+            Name of the stage shown in the report
+    stage : function
+            Stage to run
+    *args, **kwargs
+            Passed to the stage
+
+    Returns
+    -------
+    output : any
+             Whatever the stage returns
+    """
+
+    start = time.perf_counter()
+    output = stage(*args, **kwargs)
+    elapsed = time.perf_counter() - start
+
+    # ru_maxrss is reported in kilobytes on Linux
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f'[{name}] wall time {elapsed:.3f} s, peak memory {peak_mb:.1f} MB')
+
+    return output
+
+
+@profile_stage
+def scrape_data(static=False, regions=('na',), tiers=('all',), pool_size=None,
+                max_pages=MAX_PAGES, block=True):
+    """
+    Scrapes today's win, ban, and pick rates, and optionally the static
+      champion data, saving everything to the data folder
+
+    Parameters
+    ----------
+    static    : boolean
+                Also scrape names, release dates, skins and last patch change?
+    regions   : list
+                op.gg regions to scrape rates for, scraped concurrently
+    tiers     : list
+                Rank tiers to scrape in each region
+    pool_size : integer
+                Number of browsers, one per region by default
+    max_pages : integer
+                Page loads after which a browser is relaunched
+    block     : boolean
+                Block images, ads and trackers in the browsers?
+
+    Returns
+    -------
+    stats : dictionary
+            Browser pool metrics of the run, raises RuntimeError if any
+            region failed
+    """
+
+    # Import data scraping functions, which pull in selenium and chromedriver
+    import chromedriver_binary
+    from src.browser_pool import BrowserPool
+    from src.scrape_league_data import scrape_champ_names
+    from src.scrape_league_data import scrape_release_dates
+    from src.scrape_league_data import scrape_number_of_skins
+    from src.scrape_league_data import scrape_last_patch_change
+    from src.scrape_league_data import scrape_rates_by_region
+
+    if pool_size is None:
+        pool_size = len(regions)
+
+    # Every scraper of the run shares the same browsers
+    with BrowserPool(pool_size, max_pages, block=block) as pool:
+        if static:
+            scrape_champ_names()
+            scrape_release_dates()
+            champ_names = load_champ_names()
+            scrape_number_of_skins(champ_names, pool=pool)
+            scrape_last_patch_change(champ_names, pool=pool)
+
+        failed = scrape_rates_by_region(regions, tiers, pool=pool)
+
+        stats = pool.stats()
+
+    print(f'Browser pool: {stats["launches"]} launches for '
+          f'{stats["checkouts"]} checkouts and {stats["pages"]} pages, '
+          f'{stats["launch_seconds_saved"]:.1f} s of launches saved')
+    for host, host_stats in pool.pacer.stats().items():
+        print(f'{host}: {host_stats["requests"]} requests, '
+              f'{host_stats["throttled"]} throttled, '
+              f'{host_stats["rate"]} per second at the end')
+
+    # Fail the run, so a scheduled scrape doesn't pass with missing regions
+    if failed:
+        raise RuntimeError(f'Scraping failed for regions {failed} (._.)')
+
+    return stats
+
+
+def assemble_static(patch, champ_names, release_dates, num_skins,
+                    patches_since_change):
+    """
+    Combines the static features of one patch's snapshot into a data frame
+
+    Parameters
+    ----------
+    patch                : string
+                           Patch the features describe
+    champ_names          : pandas series
+                           Contains champion names as strings
+    release_dates        : pandas series
+                           Contains release dates as strings 'YYYY-MM-DD'
+    num_skins            : pandas series
+                           Contains number of champion skins as integers
+    patches_since_change : pandas series
+                           Contains patches since each champion changed
+
+    Returns
+    -------
+    static : pandas data frame
+             Contains the static features and patch of each champion
+    """
+
+    static_features = [champ_names, release_dates, num_skins,
+                       patches_since_change]
+
+    # Name files of different lengths before concatenating pads them
+    lengths = {name: len(feature) for name, feature in
+               zip(['names', 'release dates', 'skins', 'last patches'],
+                   static_features)}
+    if len(set(lengths.values())) > 1:
+        raise_problems([f'static files have different lengths: {lengths}'],
+                       f'Static data of {patch}')
+
+    static = pd.concat(static_features, axis=1)
+    static.columns = ['champion',
+                      'release_date',
+                      'num_skins',
+                      'patches_since_change']
+    validate_static_data(static)
+    static['patch'] = patch
+
+    return static
+
+
+def concat_static(**static_by_patch):
+    """
+    Stacks the static features of each patch, oldest patch first
+
+    Parameters
+    ----------
+    **static_by_patch : pandas data frame
+                        Static features of each patch, keyed by patch
+
+    Returns
+    -------
+    static : pandas data frame
+             Contains the static features and patch of each champion
+    """
+
+    patches = sorted(static_by_patch, key=patch_key)
+    static = apply_schema(pd.concat([static_by_patch[patch]
+                                     for patch in patches],
+                                    ignore_index=True))
+
+    return static
+
+
+def validate_build_inputs(win, ban, pick, static, patch_dates):
+    """
+    Validates the loaded rates against the static snapshot of each patch
+
+    Parameters
+    ----------
+    win, ban, pick : pandas data frame
+                     Loaded win, ban, and pick rates
+    static         : pandas data frame
+                     Static features of every patch in the rates
+    patch_dates    : pandas data frame
+                     Contains each patch and its start_date
+
+    Returns
+    -------
+    None
+    """
+
+    champ_counts = static.groupby('patch', observed=True).size().to_dict()
+    validate_rate_data(win, ban, pick, champ_counts, patch_dates)
+
+    # Bye! <3
+    return
+
+
+def get_input_stamp(db_path, *paths):
+    """
+    Fingerprints what a build loader reads: the store when querying it,
+      the csv files and folders otherwise
+
+    Parameters
+    ----------
+    db_path : string
+              SQLite store queried by the loader, None for csv files
+    *paths  : string
+              Files and folders the loader reads from csv
+
+    Returns
+    -------
+    stamp : tuple
+            Output of get_path_stamp
+    """
+
+    if db_path is not None:
+        return get_path_stamp(db_path, f'{db_path}-wal')
+
+    return get_path_stamp(*paths)
+
+
+def reset_build_graph():
+    """
+    Forgets the stages memoized by earlier builds, so the next build runs
+      every stage
+    """
+
+    global _build_graph
+    _build_graph = StageGraph()
+
+    # Bye! <3
+    return
+
+
+@profile_stage
+def build_league_data(cache_folder=CACHE_FOLDER, data_folder=DATA_FOLDER,
+                      region='na', tier='all', patches=None, db_path=None,
+                      max_workers=None, executor='thread'):
+    """
+    Loads the scraped data, combines static and daily data into one data
+      frame, and caches it for the later stages
+
+    Parameters
+    ----------
+    cache_folder : string
+                   Folder in which league_df.pkl is written
+    data_folder  : string
+                   Folder containing the scraped data
+    region       : string
+                   Region whose rates are modeled
+    tier         : string
+                   Rank tier whose rates are modeled
+    patches      : list
+                   Patches whose rates are modeled, every patch by default
+    db_path      : string
+                   Query this SQLite store instead of reading csv files
+    max_workers  : integer
+                   Number of loads and features run at the same time
+    executor     : string
+                   'thread' or 'process' pool for the independent stages
+
+    Returns
+    -------
+    league_df : pandas data frame
+                Contains static and daily data for each champion on each day
+    """
+
+    # Stages of earlier builds whose files and arguments are unchanged keep
+    # their outputs
+    graph = _build_graph
+
+    # Patches come from the partition folders (or the store), so the static
+    # loads of every patch are in the same graph as the rate loads
+    data_patches = get_rate_patches(data_folder, region, tier, patches,
+                                    db_path)
+    if not data_patches:
+        raise FileNotFoundError(f'No rates found for {region} {tier} in '
+                                f'{db_path or data_folder} (._.)')
+
+    # Load the daily rates of the requested patches only, all at once
+    for metric, loader in [('win', load_win_rates),
+                           ('ban', load_ban_rates),
+                           ('pick', load_pick_rates)]:
+        stamp = get_input_stamp(db_path, *[
+            get_rate_folder(metric, region, tier, patch, data_folder)
+            for patch in data_patches])
+        graph.add(f'{metric}_rates', loader, data_folder, [region], [tier],
+                  data_patches, db_path, stamp=stamp)
+    graph.add('patch_dates', load_patch_dates, data_folder, db_path,
+              stamp=get_input_stamp(db_path, path.join(data_folder,
+                                                       'patch_dates.csv')))
+
+    # Construct data frame of static features for each patch in the data
+    # from the static snapshot in effect during that patch
+    static_stamp = get_input_stamp(db_path, path.join(data_folder, 'static'))
+    for patch in data_patches:
+        for name, loader in [('champ_names', load_champ_names),
+                             ('release_dates', load_release_dates),
+                             ('num_skins', load_number_of_skins),
+                             ('last_patch', load_last_patch_change)]:
+            graph.add(f'{name}.{patch}', loader, data_folder, patch, db_path,
+                      stamp=static_stamp)
+
+        # Determine number of patches since champion was last changed
+        graph.add(f'patches_since_change.{patch}', get_patches_since_change,
+                  current_patch=patch,
+                  inputs={'last_patch': f'last_patch.{patch}',
+                          'patch_dates': 'patch_dates'})
+
+        graph.add(f'static.{patch}', assemble_static, patch,
+                  inputs={name: f'{name}.{patch}' for name in
+                          ['champ_names', 'release_dates', 'num_skins',
+                           'patches_since_change']})
+    graph.add('static', concat_static,
+              inputs={patch: f'static.{patch}' for patch in data_patches})
+
+    # Fail fast on missing champions, bad rates or misaligned files
+    graph.add('validate', validate_build_inputs,
+              inputs={'win': 'win_rates', 'ban': 'ban_rates',
+                      'pick': 'pick_rates', 'static': 'static',
+                      'patch_dates': 'patch_dates'})
+
+    # Combine dynamic win, ban, and pick rates into one data frame
+    graph.add('dynamic', combine_rate_data,
+              inputs={'win': 'win_rates', 'ban': 'ban_rates',
+                      'pick': 'pick_rates'})
+
+    outputs = graph.run(['static', 'validate', 'dynamic'], max_workers,
+                        executor)
+    static = outputs['static']
+    dynamic = outputs['dynamic']
+    print(f'[build] {graph.report()}')
+
+    # Combine each day of dynamic data with the static data of its patch
+    league_df = join_static_by_patch(static, dynamic)
+
+    # Determine the champion age on each day that data was collected
+    champ_age = get_champ_age(league_df['release_date'], league_df['date'])
+    league_df['champion_age'] = champ_age
+
+    # Add rolling, delta, EWMA and lagged rates of each champion
+    league_df = add_trend_features(league_df)
+
+    # Cache the combined data for the train, evaluate and predict stages
+    if not path.exists(cache_folder):
+        makedirs(cache_folder)
+    league_df.to_pickle(path.join(cache_folder, 'league_df.pkl'))
+
+    # Extend the saved trajectory index with the new days
+    update_saved_index(league_df, folder=cache_folder)
+
+    return league_df
+
+
+@profile_stage
+def load_league_df(cache_folder=CACHE_FOLDER, data_folder=DATA_FOLDER):
+    """
+    Loads the combined data frame cached by build_league_data, building it
+      first if there is no cached copy
+
+    Parameters
+    ----------
+    cache_folder : string
+                   Folder containing league_df.pkl
+    data_folder  : string
+                   Folder containing the scraped data, built from if there
+                   is no cached copy
+
+    Returns
+    -------
+    league_df : pandas data frame
+                Contains static and daily data for each champion on each day
+    """
+
+    cache_path = path.join(cache_folder, 'league_df.pkl')
+    if path.exists(cache_path):
+        league_df = apply_schema(pd.read_pickle(cache_path))
+    else:
+        print('league_df.pkl cannot be found, building it (._.)')
+        league_df = build_league_data(cache_folder, data_folder)
+
+    return league_df
+
+
+def get_model_features(league_df, name):
+    """
+    Selects the features used by one of the models
+
+    Parameters
+    ----------
+    league_df : pandas data frame
+                Contains static and daily data for each champion on each day
+    name      : string
+                'model1' for the base features, 'model2' to add the
+                engineered ratio features
+
+    Returns
+    -------
+    X : pandas data frame
+        Contains the model features in training order
+    """
+
+    X = league_df[MODEL_DATA[0:5]]
+    if name == 'model2':
+        X = add_ratio_features(X)
+
+    return X
+
+
+@profile_stage
+def train_models(league_df, model_folder=MODEL_FOLDER,
+                 cache_folder=CACHE_FOLDER, test_size=0.3, penalty='ols',
+                 l1_ratio=None, n_folds=5):
+    """
+    Fits both linear models on a train split, saves them as artifacts, and
+      records which rows were held out for evaluation
+
+    Parameters
+    ----------
+    league_df    : pandas data frame
+                   Contains static and daily data for each champion on each day
+    model_folder : string
+                   Folder in which model artifacts are written
+    cache_folder : string
+                   Folder in which the held out row indices are written
+    test_size    : float
+                   Fraction of rows held out for evaluation
+    penalty      : string
+                   'ols' for least squares, or 'ridge', 'lasso' or
+                   'elasticnet' to pick a penalty along its path
+    l1_ratio     : float
+                   Share of an elastic net penalty on the L1 norm
+    n_folds      : integer
+                   Day folds used to choose the penalty
+
+    Returns
+    -------
+    models : dictionary
+             Fitted model for each model name
+    """
+
+    from sklearn.model_selection import train_test_split
+    from sklearn import linear_model
+
+    y = league_df['pickrate']
+
+    models = {}
+    test_rows = {}
+    for name in MODEL_NAMES:
+        X = get_model_features(league_df, name)
+        X_train, X_test, y_train, y_test = train_test_split(
+            X, y, test_size=test_size)
+
+        with profile_block(f'fit.{name}') as record:
+            if penalty == 'ols':
+                model = linear_model.LinearRegression()
+                model.fit(X_train, y_train)
+            else:
+                # Days are kept whole in the folds that choose alpha
+                model = fit_regularized_model(
+                    X_train, y_train, league_df['date'].loc[X_train.index],
+                    penalty, l1_ratio, n_folds)
+                print(f'{name}: {penalty} alpha = {model.alpha_:.3g}, '
+                      f'{np.count_nonzero(model.coef_)} nonzero '
+                      'coefficients')
+            record['output'] = X_train
+
+        # Save coefficients so predictions don't require refitting
+        save_model_artifact(model, X.columns, name, model_folder)
+
+        models[name] = model
+        test_rows[name] = [int(idx) for idx in X_test.index]
+
+    # Keep the held out rows so evaluate scores on unseen data
+    if not path.exists(cache_folder):
+        makedirs(cache_folder)
+    with open(path.join(cache_folder, 'test_rows.json'), 'w') as rows_file:
+        json.dump(test_rows, rows_file)
+
+    return models
+
+
+@profile_stage
+def evaluate_models(league_df, model_folder=MODEL_FOLDER,
+                    cache_folder=CACHE_FOLDER, n_boot=0, n_jobs=1):
+    """
+    Scores the saved models on the rows held out during training
+
+    Parameters
+    ----------
+    league_df    : pandas data frame
+                   Contains static and daily data for each champion on each day
+    model_folder : string
+                   Folder containing the model artifacts
+    cache_folder : string
+                   Folder containing test_rows.json
+    n_boot       : integer
+                   Bootstrap resamples of the training rows for confidence
+                   intervals, none by default
+    n_jobs       : integer
+                   Processes the resamples are split over
+
+    Returns
+    -------
+    scores : dictionary
+             Mean squared error and adjusted R^2 for each model, and the
+             95% OLS intervals of the coefficients and scores if
+             bootstrapped
+    """
+
+    with open(path.join(cache_folder, 'test_rows.json')) as rows_file:
+        test_rows = json.load(rows_file)
+
+    scores = {}
+    for name in MODEL_NAMES:
+        X_test = get_model_features(league_df, name).loc[test_rows[name]]
+        y_test = league_df['pickrate'].loc[test_rows[name]]
+
+        artifact_path = path.join(model_folder, f'{name}.json')
+        y_pred = predict_pick_rates(X_test, artifact_path)
+
+        mse = float(np.mean((y_test - y_pred)**2))
+        r2_adj = float(adjusted_r2(X_test, y_test, y_pred))
+        scores[name] = {'mse': mse, 'r2_adj': r2_adj}
+
+        print(f'{name}: mse = {mse:.3g}, adjusted R^2 = {r2_adj:.3f}')
+
+        if n_boot:
+            # Refit OLS on resamples of the rows the model was trained on
+            X = get_model_features(league_df, name)
+            train_rows = X.index.difference(test_rows[name])
+            samples = bootstrap_models(X.loc[train_rows],
+                                       league_df['pickrate'].loc[train_rows],
+                                       X_test, y_test, n_boot, n_jobs=n_jobs)
+
+            # Intervals are of OLS fits, so they are only shown next to the
+            # saved model's estimates when it was fit by OLS too
+            artifact = load_model_artifact(artifact_path)
+            penalty = artifact.get('penalty', 'ols')
+            estimates = None
+            if penalty == 'ols':
+                estimates = dict(zip(artifact['features'],
+                                     artifact['coefficients']))
+                estimates.update(intercept=artifact['intercept'], mse=mse,
+                                 adjusted_r2=r2_adj)
+            intervals = get_percentile_intervals(samples, estimates)
+            scores[name]['intervals'] = intervals
+            if penalty == 'ols':
+                print(intervals.to_string(float_format='{:.4g}'.format))
+            else:
+                print(f'{name}: OLS bootstrap intervals, not of the saved '
+                      f'{penalty} model')
+                print(intervals[['lower', 'upper']].to_string(
+                    float_format='{:.4g}'.format))
+
+    return scores
+
+
+@profile_stage
+def predict_latest(league_df, name='model1', date=None,
+                   model_folder=MODEL_FOLDER):
+    """
+    Predicts pick rates for every champion on one day of data
+
+    Parameters
+    ----------
+    league_df    : pandas data frame
+                   Contains static and daily data for each champion on each day
+    name         : string
+                   Name of the model artifact to use
+    date         : string
+                   Day to predict as 'YYYY-MM-DD', the latest day by default
+    model_folder : string
+                   Folder containing the model artifacts
+
+    Returns
+    -------
+    predictions : pandas data frame
+                  Contains champion, date, pickrate and predicted_pickrate
+    """
+
+    if date is None:
+        date = league_df['date'].max()
+    day_df = league_df[league_df['date'] == date]
+
+    X = get_model_features(day_df, name)
+    artifact_path = path.join(model_folder, f'{name}.json')
+
+    predictions = day_df[['champion', 'date', 'pickrate']].copy()
+    predictions['predicted_pickrate'] = predict_pick_rates(X, artifact_path)
+
+    return predictions.reset_index(drop=True)
@@ -0,0 +1,383 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Tue Oct  1 14:02:37 2019
+
+@author: jeremy_lehner
+
+Local HTTP service for pick rate predictions from saved model artifacts.
+
+    python -m src.prediction_service --port 8050 --window-ms 2
+
+POST /predict/<model> with {"rows": [{"feature": value, ...}, ...]} returns
+{"pick_rates": [...]}; GET /models lists the features each model's rows
+need, and GET /stats returns request counts and latency percentiles for each
+model. Rows hold only the base features, engineered ratio features are added
+by the service the way training adds them.
+"""
+
+import sys
+import json
+import time
+import queue
+import argparse
+import threading
+import collections
+import numpy as np
+from os import path
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from src.model_artifacts import load_model_artifact
+from src.lazy_imports import lazy_import
+
+# Only models with engineered features need pandas to build their rows
+pd = lazy_import('pandas')
+process_league_data = lazy_import('src.process_league_data')
+
+
+class MicroBatcher:
+    """
+    Collects concurrent prediction requests for one model and scores each
+      micro-batch with a single matrix-vector product
+
+    Parameters
+    ----------
+    artifact  : dictionary
+                Model artifact returned by load_model_artifact
+    window    : float
+                Seconds to wait for more requests after the first one arrives
+    max_batch : integer
+                Maximum number of rows scored in one batch
+    timeout   : float
+                Seconds a request waits for its batch before giving up
+    """
+
+    def __init__(self, artifact, window=0.002, max_batch=4096, timeout=10.0):
+        self.features = artifact['features']
+        self.inputs = get_request_features(self.features)
+        self.coefficients = artifact['coefficients']
+        self.intercept = artifact['intercept']
+        self.window = window
+        self.max_batch = max_batch
+        self.timeout = timeout
+
+        self.requests = queue.Queue()
+        self.latencies = collections.deque(maxlen=10000)
+        self.num_requests = 0
+        self.num_batches = 0
+        self.num_errors = 0
+        self.lock = threading.Lock()
+
+        worker = threading.Thread(target=self._run, daemon=True)
+        worker.start()
+
+    def predict(self, rows):
+        """
+        Queues rows for the next micro-batch and waits for their predictions
+
+        Parameters
+        ----------
+        rows : numpy array
+               Feature matrix with one row per champion in model order
+
+        Returns
+        -------
+        pick_rates : numpy array
+                     Contains the predicted pick rates as floats
+        """
+
+        start = time.perf_counter()
+        pending = {'rows': rows, 'done': threading.Event(), 'result': None,
+                   'error': None}
+        self.requests.put(pending)
+
+        # A failed batch or a dead worker ends the request with an error
+        # instead of leaving it waiting
+        answered = pending['done'].wait(self.timeout)
+        if not answered or pending['error'] is not None:
+            with self.lock:
+                self.num_errors += 1
+            if not answered:
+                raise TimeoutError(f'No predictions after {self.timeout} s')
+            raise RuntimeError('Scoring the batch failed: '
+                               f'{pending["error"]!r}')
+
+        with self.lock:
+            self.latencies.append(time.perf_counter() - start)
+            self.num_requests += 1
+
+        return pending['result']
+
+    def stats(self):
+        """
+        Summarizes the request latencies seen by this batcher
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        summary : dictionary
+                  Request and batch counts, latency percentiles in ms
+        """
+
+        with self.lock:
+            latencies = np.array(self.latencies) * 1000
+            summary = {'requests': self.num_requests,
+                       'batches': self.num_batches,
+                       'errors': self.num_errors}
+
+        if len(latencies) > 0:
+            p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+            summary.update({'p50_ms': round(p50, 3),
+                            'p95_ms': round(p95, 3),
+                            'p99_ms': round(p99, 3),
+                            'max_ms': round(latencies.max(), 3)})
+
+        return summary
+
+    def _run(self):
+        while True:
+            # Block until a request arrives, then gather for one window
+            batch = [self.requests.get()]
+            num_rows = len(batch[0]['rows'])
+            deadline = time.perf_counter() + self.window
+            while num_rows < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    pending = self.requests.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                batch.append(pending)
+                num_rows += len(pending['rows'])
+
+            # Score the whole batch at once and hand back each slice, a
+            # failure is handed to every request of the batch
+            try:
+                X = np.vstack([pending['rows'] for pending in batch])
+                pick_rates = X @ self.coefficients + self.intercept
+            except Exception as error:
+                for pending in batch:
+                    pending['error'] = error
+                    pending['done'].set()
+                continue
+
+            start = 0
+            for pending in batch:
+                stop = start + len(pending['rows'])
+                pending['result'] = pick_rates[start:stop]
+                pending['done'].set()
+                start = stop
+
+            with self.lock:
+                self.num_batches += 1
+
+
+class PredictionServer(ThreadingHTTPServer):
+    """
+    Threaded HTTP server with a listen backlog deep enough for bursts of
+      concurrent clients
+    """
+
+    daemon_threads = True
+    request_queue_size = 128
+
+
+def get_request_features(features):
+    """
+    Gets the features request rows must hold, the model features without
+      the engineered ones computed from them
+
+    Parameters
+    ----------
+    features : list
+               Contains the feature names as strings in model order
+
+    Returns
+    -------
+    inputs : list
+             Contains the feature names requests send, in model order
+    """
+
+    ratio_features = process_league_data.RATIO_FEATURES
+    if not any(feature in ratio_features for feature in features):
+        return list(features)
+
+    return [feature for feature in features if feature not in ratio_features]
+
+
+def rows_to_matrix(rows, features, inputs=None):
+    """
+    Converts request rows into a feature matrix in model order, adding the
+      engineered features with add_ratio_features as training does
+
+    Parameters
+    ----------
+    rows     : list
+               Contains dictionaries of feature values, or lists of values
+               already in the order of inputs
+    features : list
+               Contains the feature names as strings in model order
+    inputs   : list
+               Contains the features each row holds, from
+               get_request_features by default
+
+    Returns
+    -------
+    X : numpy array
+        Feature matrix with one row per request row
+    """
+
+    if inputs is None:
+        inputs = get_request_features(features)
+
+    # Every row must hold exactly one value per input feature
+    values = []
+    for idx, row in enumerate(rows):
+        if isinstance(row, dict):
+            row = [row[feature] for feature in inputs]
+        elif len(row) != len(inputs):
+            raise ValueError(f'row {idx} has {len(row)} values, expected '
+                             f'{len(inputs)} ({", ".join(inputs)})')
+        values.append(row)
+
+    X = np.asarray(values, dtype=np.float64).reshape(-1, len(inputs))
+    if len(inputs) < len(features):
+        frame = pd.DataFrame(X, columns=inputs)
+        X = process_league_data.add_ratio_features(frame)[features].to_numpy(
+            dtype=np.float64)
+
+    return X
+
+
+def make_handler(batchers):
+    """
+    Builds a request handler class that serves the given batchers
+
+    Parameters
+    ----------
+    batchers : dictionary
+               MicroBatcher for each model name
+
+    Returns
+    -------
+    handler : class
+              BaseHTTPRequestHandler subclass for ThreadingHTTPServer
+    """
+
+    class PredictionHandler(BaseHTTPRequestHandler):
+
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            if self.path == '/stats':
+                self._send(200, {name: batcher.stats()
+                                 for name, batcher in batchers.items()})
+            elif self.path == '/models':
+                self._send(200, {name: batcher.inputs
+                                 for name, batcher in batchers.items()})
+            else:
+                self._send(404, {'error': f'unknown path {self.path}'})
+
+        def do_POST(self):
+            name = self.path.rsplit('/', 1)[-1]
+            if not self.path.startswith('/predict/') or name not in batchers:
+                self._send(404, {'error': f'unknown model path {self.path}'})
+                return
+
+            try:
+                length = int(self.headers.get('Content-Length', 0))
+                body = json.loads(self.rfile.read(length))
+                X = rows_to_matrix(body['rows'], batchers[name].features,
+                                   batchers[name].inputs)
+            except (ValueError, KeyError, TypeError) as error:
+                self._send(400, {'error': f'bad request: {error!r}'})
+                return
+
+            try:
+                pick_rates = batchers[name].predict(X)
+            except (RuntimeError, TimeoutError) as error:
+                self._send(500, {'error': str(error)})
+                return
+
+            self._send(200, {'pick_rates': pick_rates.tolist()})
+
+        def _send(self, status, payload):
+            body = json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            # Keep per-request logging off the hot path
+            return
+
+    return PredictionHandler
+
+
+def serve_predictions(models=('model1', 'model2'), folder='./models/',
+                      host='127.0.0.1', port=8050, window=0.002):
+    """
+    Loads saved model artifacts and serves predictions over HTTP until
+      interrupted
+
+    Parameters
+    ----------
+    models : list
+             Names of the artifacts to serve
+    folder : string
+             Folder containing the artifacts
+    host   : string
+             Address to bind, localhost by default
+    port   : integer
+             Port to bind
+    window : float
+             Micro-batching window in seconds
+
+    Returns
+    -------
+    None
+    """
+
+    batchers = {}
+    for name in models:
+        artifact_path = path.join(folder, f'{name}.json')
+        if not path.exists(artifact_path):
+            print(f'{artifact_path} cannot be found (._.)')
+            continue
+        batchers[name] = MicroBatcher(load_model_artifact(artifact_path),
+                                      window=window)
+
+    if not batchers:
+        sys.exit('No model artifacts to serve, run main.py first')
+
+    server = PredictionServer((host, port), make_handler(batchers))
+    print(f'Serving {", ".join(batchers)} on http://{host}:{port}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+    # Bye! <3
+    return
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Serve pick rate predictions over HTTP')
+    parser.add_argument('--models', nargs='+', default=['model1', 'model2'])
+    parser.add_argument('--folder', default='./models/')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8050)
+    parser.add_argument('--window-ms', type=float, default=2.0)
+    args = parser.parse_args()
+
+    serve_predictions(args.models, args.folder, args.host, args.port,
+                      args.window_ms / 1000)
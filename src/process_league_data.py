@@ -7,41 +7,130 @@ Created on Wed Sep 25 20:38:06 2019
 """
 
 import pandas as pd
-import glob
+import numpy as np
+from src.profiling import profile_stage
+from src.league_schema import apply_schema
+from src.league_schema import cast_column
 
 
-def get_patches_since_change(last_patch):
+# Patches from newest to oldest before a patch calendar was kept, newer
+# patches come from data/patch_dates.csv
+PATCHES = '9.18 9.17 9.16 9.15 9.14 9.13 9.12 9.11 9.10 9.9 9.8 9.7 9.6 \
+           9.5 9.4 9.3 9.2 9.1 8.24b 8.24 8.23 8.22 8.21 8.20 8.19 8.18 \
+           8.17 8.16 8.15 8.14 8.13 8.12 8.11 8.10 8.9 8.8 8.7 8.6 8.5 \
+           8.4 8.3 8.2 8.1 7.24b 7.24 7.23 7.22'.split()
+
+# Columns add_ratio_features adds to the base features
+RATIO_FEATURES = ['patch_age_ratio',
+                  'patch_by_skin',
+                  'win_age_ratio',
+                  'ban_age_ratio',
+                  'win_ban_ratio']
+
+
+def patch_key(patch):
+    """
+    Gets a sort key that orders patch versions like '8.24b' and '9.9'
+      chronologically
+
+    Parameters
+    ----------
+    patch : string
+            Patch version, e.g. '9.18' or '8.24b'
+
+    Returns
+    -------
+    key : tuple
+          (major, minor, suffix) of the patch
+    """
+
+    major, minor = str(patch).split('.')
+    suffix = minor.lstrip('0123456789')
+    key = (int(major), int(minor[:len(minor) - len(suffix)]), suffix)
+
+    return key
+
+
+@profile_stage
+def get_patch_for_date(dates, patch_dates):
+    """
+    Determines which patch was live on each date
+
+    Parameters
+    ----------
+    dates       : pandas series
+                  Dates as datetimes or strings 'YYYY-MM-DD'
+    patch_dates : pandas data frame
+                  Contains each patch and its start_date
+
+    Returns
+    -------
+    patches : pandas series
+              Contains the patch live on each date as strings
+    """
+
+    patch_dates = patch_dates.sort_values('start_date')
+    starts = pd.to_datetime(patch_dates['start_date']).to_numpy()
+    dates = pd.Series(dates)
+
+    # Index of the last patch starting on or before each date
+    idx = np.searchsorted(starts, pd.to_datetime(dates).to_numpy(),
+                          side='right') - 1
+    if (idx < 0).any():
+        raise ValueError('Dates before the first patch '
+                         f'{patch_dates["start_date"].iloc[0]} found')
+
+    patches = pd.Series(patch_dates['patch'].to_numpy()[idx],
+                        index=dates.index)
+
+    return patches
+
+
+@profile_stage
+def get_patches_since_change(last_patch, current_patch='9.18',
+                             patch_dates=None):
     """
     Determines the number of patches since each champion was changed as of
-      patch 9.18
+      the current patch
 
     Parameters
     ----------
-    last_patch : pandas series
-                 Contains the last patch each champion was changed as strings
+    last_patch    : pandas series
+                    Contains the last patch each champion was changed as
+                    strings
+    current_patch : string
+                    Patch to count from
+    patch_dates   : pandas data frame
+                    Patch calendar, adds patches newer than PATCHES
 
     Returns
     -------
     patches_since_change : pandas series
-                           Contains number of patches since last change as ints
+                           Contains patches since last change as int16
     """
 
     # Construct list of patches from current patch to oldest
-    patches = '9.18 9.17 9.16 9.15 9.14 9.13 9.12 9.11 9.10 9.9 9.8 9.7 9.6 \
-               9.5 9.4 9.3 9.2 9.1 8.24b 8.24 8.23 8.22 8.21 8.20 8.19 8.18 \
-               8.17 8.16 8.15 8.14 8.13 8.12 8.11 8.10 8.9 8.8 8.7 8.6 8.5 \
-               8.4 8.3 8.2 8.1 7.24b 7.24 7.23 7.22'.split()
+    patches = set(PATCHES)
+    if patch_dates is not None:
+        patches.update(patch_dates['patch'])
+    patches = sorted(patches, key=patch_key, reverse=True)
+    patches = patches[patches.index(current_patch):]
+    patch_index = {patch: idx for idx, patch in enumerate(patches)}
 
-    # Set number of patches since last change starting with 1 for 9.18 change
-    patches_since_change = pd.Series(patches.index(s)+1 for s in last_patch)
+    # Set number of patches since last change starting with 1 for a change
+    # in the current patch
+    patches_since_change = pd.Series(patch_index[s]+1 for s in last_patch)
+    patches_since_change = cast_column(patches_since_change,
+                                       'patches_since_change')
 
     return patches_since_change
 
 
+@profile_stage
 def combine_rate_data(win, ban, pick):
     """
-    Creates one data frame of dynamic data over patch 9.18 from individual
-      win rate, ban rate, and pick rate data frames
+    Creates one data frame of dynamic data from individual win rate, ban
+      rate, and pick rate data frames, keeping the patch of each row if known
 
     Parameters
     ----------
@@ -59,17 +148,18 @@ def combine_rate_data(win, ban, pick):
     """
 
     # Extract individual series to use in combined data frame
-    date = win['date']
+    keys = win[[key for key in ['date', 'patch'] if key in win]]
     winrates = win['winrate']
     banrates = ban['banrate']
     pickrates = pick['pickrate']
 
     # Combine into single data frame
-    dynamic_df = pd.concat([date, winrates, banrates, pickrates], axis=1)
+    dynamic_df = pd.concat([keys, winrates, banrates, pickrates], axis=1)
 
     return dynamic_df
 
 
+@profile_stage
 def repeat_each_day(static_df, num_days):
     """
     Stacks rows of the data frame containing static league data over patch 9.18
@@ -94,11 +184,58 @@ def repeat_each_day(static_df, num_days):
         static_copies.append(static_df)
 
     # Combine copies into one data frame
-    repeat_df = pd.concat(static_copies, ignore_index=True)
+    repeat_df = apply_schema(pd.concat(static_copies, ignore_index=True))
 
     return repeat_df
 
 
+@profile_stage
+def join_static_by_patch(static_df, dynamic_df):
+    """
+    Attaches the static data of the right patch to each row of daily data,
+      replacing repeat_each_day when data spans more than one patch
+
+    Parameters
+    ----------
+    static_df  : pandas data frame
+                 Contains static data with a patch column, one row per
+                 champion per patch in alphabetical champion order
+    dynamic_df : pandas data frame
+                 Contains daily rates with date and patch columns, one row
+                 per champion per day in alphabetical champion order
+
+    Returns
+    -------
+    league_df : pandas data frame
+                Contains static and daily data for each champion on each day
+    """
+
+    # Rows are aligned by alphabetical position within each patch and day
+    static_df = static_df.copy()
+    static_df['position'] = static_df.groupby('patch',
+                                              observed=True).cumcount()
+    dynamic_df = dynamic_df.copy()
+    dynamic_df['position'] = dynamic_df.groupby(['patch', 'date'],
+                                                observed=True).cumcount()
+
+    # Left join keeps the row order of the daily data
+    league_df = dynamic_df.merge(static_df, on=['patch', 'position'],
+                                 how='left', validate='many_to_one')
+
+    if league_df['champion'].isna().any():
+        raise ValueError('Daily data has more champions than the static '
+                         'data of its patch')
+
+    static_columns = [column for column in static_df
+                      if column not in ('patch', 'position')]
+    dynamic_columns = [column for column in dynamic_df
+                       if column != 'position']
+    league_df = apply_schema(league_df[static_columns + dynamic_columns])
+
+    return league_df
+
+
+@profile_stage
 def get_champ_age(release_dates, data_dates):
     """
     Calculates the age of each champion in days on each data that data was
@@ -114,7 +251,7 @@ def get_champ_age(release_dates, data_dates):
     Returns
     -------
     champ_age : pandas series
-                Contains the age of each champion on each day as integers
+                Contains the age of each champion on each day as int32
     """
 
     # Convert dates to datetime objects
@@ -122,6 +259,38 @@ def get_champ_age(release_dates, data_dates):
     data_dates = pd.to_datetime(data_dates)
 
     # Calculate champions ages
-    champ_age = (data_dates - release_dates).dt.days
+    champ_age = cast_column((data_dates - release_dates).dt.days,
+                            'champion_age')
 
     return champ_age
+
+
+@profile_stage
+def add_ratio_features(features):
+    """
+    Adds the engineered ratio and interaction features used by the second
+      model to a copy of the base feature data frame
+
+    Parameters
+    ----------
+    features : pandas data frame
+               Contains champion_age, patches_since_change, num_skins,
+               winrate, and banrate columns
+
+    Returns
+    -------
+    ratio_df : pandas data frame
+               Copy of features with the engineered columns appended
+    """
+
+    ratio_df = features.copy()
+
+    ratio_df['patch_age_ratio'] = (ratio_df.patches_since_change
+                                   / ratio_df.champion_age)
+    ratio_df['patch_by_skin'] = (ratio_df.patches_since_change
+                                 * ratio_df.num_skins)
+    ratio_df['win_age_ratio'] = ratio_df.winrate / ratio_df.champion_age
+    ratio_df['ban_age_ratio'] = ratio_df.winrate / ratio_df.champion_age
+    ratio_df['win_ban_ratio'] = ratio_df.winrate / ratio_df.banrate
+
+    return ratio_df
@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Fri Oct  4 15:48:33 2019
+
+@author: jeremy_lehner
+
+Stage timing and memory instrumentation, switched on by environment variables
+that are read once at import time:
+
+    LEAGUE_PROFILE=1                 record every decorated function
+    LEAGUE_PROFILE_TRACE=trace.json  where the json trace is written
+                                     (./cache/profile_trace.json by default)
+    LEAGUE_PROFILE_DUMP=cprofile     also dump a cProfile file per top stage
+    LEAGUE_PROFILE_DUMP=tracemalloc  also dump a tracemalloc snapshot instead
+
+Stages run by a StageGraph carry the depth and key of the stage that ran
+the graph, so their calls nest under it instead of counting as top stages,
+and events recorded in process workers are merged into this process's trace.
+Only top stages of the main thread write a dump, named after the stage key
+when it has one.
+
+The trace uses the Chrome trace event format, so it can be opened directly in
+chrome://tracing or https://ui.perfetto.dev. When LEAGUE_PROFILE is unset the
+decorator hands back the undecorated function and costs nothing.
+"""
+
+import os
+import json
+import time
+import atexit
+import cProfile
+import resource
+import threading
+import functools
+import contextlib
+import tracemalloc
+from os import path, makedirs
+
+
+PROFILE_ENABLED = os.environ.get('LEAGUE_PROFILE', '') not in ('', '0')
+TRACE_PATH = os.environ.get('LEAGUE_PROFILE_TRACE',
+                            './cache/profile_trace.json')
+DUMP_MODE = os.environ.get('LEAGUE_PROFILE_DUMP', '').lower()
+
+# Events recorded so far, the nesting depth and stage key of each thread,
+# and the dumps written of each name
+_events = []
+_events_lock = threading.Lock()
+_depth = threading.local()
+_dump_counts = {}
+_trace_start = time.perf_counter()
+
+
+def count_rows(output):
+    """
+    Counts the rows of a stage output when it has any
+
+    Parameters
+    ----------
+    output : any
+             Value returned by a profiled function
+
+    Returns
+    -------
+    rows : integer or None
+           Number of rows, or None for outputs without a length
+    """
+
+    shape = getattr(output, 'shape', None)
+    if shape:
+        return int(shape[0])
+    if isinstance(output, (list, tuple, dict)):
+        return len(output)
+
+    return None
+
+
+def get_profile_context():
+    """
+    Gets the nesting depth and stage key of the calling thread, to hand to
+      work that runs on another thread or process
+    """
+
+    return getattr(_depth, 'value', 0), getattr(_depth, 'key', None)
+
+
+@contextlib.contextmanager
+def inherit_profile_context(context, key=None):
+    """
+    Runs a block in a worker at the depth of the caller that submitted it,
+      collecting the events the block records
+
+    Parameters
+    ----------
+    context : tuple
+              Output of get_profile_context in the submitting thread
+    key     : string
+              Stage key added to the block's events and dump names
+
+    Yields
+    ------
+    events : list
+             Filled with the events recorded in the block when it ends
+    """
+
+    events = []
+    if not PROFILE_ENABLED:
+        yield events
+        return
+
+    saved = get_profile_context()
+    _depth.value, _depth.key = context[0], key or context[1]
+    with _events_lock:
+        mark = len(_events)
+    try:
+        yield events
+    finally:
+        _depth.value, _depth.key = saved
+        with _events_lock:
+            events.extend(event for event in _events[mark:]
+                          if event['tid'] == threading.get_ident())
+
+
+def add_profile_events(events):
+    """
+    Adds events recorded in another process to this process's trace
+    """
+
+    with _events_lock:
+        _events.extend(events)
+
+
+def _get_peak_rss_kb():
+    # ru_maxrss is reported in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+@contextlib.contextmanager
+def profile_block(name):
+    """
+    Records wall time, cpu time and peak RSS growth of a block of code, plus
+      rows of the output if the block stores one in record['output']
+
+    Parameters
+    ----------
+    name : string
+           Name of the block in the trace
+
+    Yields
+    ------
+    record : dictionary
+             Event being recorded, extra fields may be added to 'args'
+    """
+
+    record = {'name': name, 'args': {}}
+    if not PROFILE_ENABLED:
+        yield record
+        return
+
+    depth, key = get_profile_context()
+    _depth.value = depth + 1
+
+    # Only the outermost block of the main thread is profiled in detail,
+    # tracemalloc's peak is shared by every thread
+    top = depth == 0 and threading.current_thread() is threading.main_thread()
+    profiler = None
+    if top and DUMP_MODE == 'cprofile':
+        profiler = cProfile.Profile()
+        profiler.enable()
+    elif top and DUMP_MODE == 'tracemalloc':
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+
+    rss_before = _get_peak_rss_kb()
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        wall_end = time.perf_counter()
+        cpu_end = time.process_time()
+        rss_after = _get_peak_rss_kb()
+        _depth.value = depth
+
+        args = record['args']
+        if key is not None:
+            args['stage'] = key
+        args['wall_s'] = round(wall_end - wall_start, 6)
+        args['cpu_s'] = round(cpu_end - cpu_start, 6)
+        args['peak_rss_delta_kb'] = rss_after - rss_before
+        if 'output' in record:
+            args['rows'] = count_rows(record.pop('output'))
+
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(_get_dump_path(name, key, 'prof'))
+        elif top and DUMP_MODE == 'tracemalloc':
+            args['traced_peak_kb'] = tracemalloc.get_traced_memory()[1] // 1024
+            tracemalloc.take_snapshot().dump(_get_dump_path(name, key,
+                                                            'tracemalloc'))
+
+        event = {'name': name,
+                 'ph': 'X',
+                 'ts': round((wall_start - _trace_start) * 1e6, 1),
+                 'dur': round((wall_end - wall_start) * 1e6, 1),
+                 'pid': os.getpid(),
+                 'tid': threading.get_ident(),
+                 'args': args}
+        with _events_lock:
+            _events.append(event)
+
+
+def profile_stage(func):
+    """
+    Decorator recording each call of a load, process, scrape or model function
+      in the profiling trace, returns func untouched when profiling is off
+
+    Parameters
+    ----------
+    func : function
+           Function to profile
+
+    Returns
+    -------
+    wrapper : function
+              Profiled version of func
+    """
+
+    if not PROFILE_ENABLED:
+        return func
+
+    name = f'{func.__module__.split(".")[-1]}.{func.__name__}'
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with profile_block(name) as record:
+            output = func(*args, **kwargs)
+            record['output'] = output
+        return output
+
+    return wrapper
+
+
+def get_profile_events():
+    """
+    Returns a copy of the events recorded so far
+
+    Parameters
+    ----------
+    None
+
+    Returns
+    -------
+    events : list
+             Contains one dictionary per profiled call
+    """
+
+    with _events_lock:
+        events = list(_events)
+
+    return events
+
+
+def write_profile_trace(trace_path=None):
+    """
+    Writes the recorded events to a json trace file
+
+    Parameters
+    ----------
+    trace_path : string
+                 Path of the trace, LEAGUE_PROFILE_TRACE by default
+
+    Returns
+    -------
+    None
+    """
+
+    events = get_profile_events()
+    if not events:
+        return
+
+    if trace_path is None:
+        trace_path = TRACE_PATH
+    folder = path.dirname(trace_path)
+    if folder and not path.exists(folder):
+        makedirs(folder)
+
+    with open(trace_path, 'w') as trace_file:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'},
+                  trace_file, indent=1)
+
+    # Bye! <3
+    return
+
+
+def _get_dump_path(name, key, extension):
+    # Named after the stage key, and numbered when a name is dumped again,
+    # so no dump of the run overwrites another
+    folder = path.dirname(TRACE_PATH) or '.'
+    if not path.exists(folder):
+        makedirs(folder)
+    if key is not None:
+        name = f'{name}.{key}'
+    with _events_lock:
+        _dump_counts[name] = _dump_counts.get(name, 0) + 1
+        count = _dump_counts[name]
+    if count > 1:
+        name = f'{name}.{count}'
+    return path.join(folder, f'{name}.{extension}')
+
+
+if PROFILE_ENABLED:
+    atexit.register(write_profile_trace)
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Wed Oct 23 08:52:14 2019
+
+@author: jeremy_lehner
+
+Streaming detector of unusual daily rate swings, e.g. after a hotfix. For
+each region, tier and rate it keeps every champion's exponentially weighted
+mean and variance
+
+    diff = rate - mean
+    mean = mean + ALPHA diff
+    var  = (1 - ALPHA) (var + ALPHA diff^2)
+
+and flags a new day's rate when it is more than Z_THRESHOLD standard
+deviations from the mean before the update. Each saved rate file updates
+the state in O(champions) without rereading earlier days, and the state is
+kept between runs in one small npz file.
+"""
+
+import threading
+import numpy as np
+import pandas as pd
+from os import path, makedirs, replace
+
+
+# Detector state and the log of flagged rates
+STATE_PATH = './cache/rate_detector.npz'
+ANOMALY_PATH = './cache/rate_anomalies.csv'
+
+# Weight of the newest day, about the last 2 weeks count
+ALPHA = 0.15
+
+# Days a champion needs before it can be flagged, and the smallest
+# standard deviation used, half a percentage point, so steady rates don't
+# flag ordinary day to day noise
+MIN_DAYS = 7
+MIN_STD = 0.005
+
+# Standard deviations from the mean that count as unusual
+Z_THRESHOLD = 4.0
+
+# Fields kept for each region, tier and rate
+STATE_FIELDS = ['champions', 'days', 'mean', 'var', 'last_date']
+
+# Regions are scraped by several threads sharing one state file
+_state_lock = threading.Lock()
+
+
+def get_state_key(metric, region='na', tier='all'):
+    return f'{region}.{tier}.{metric}'
+
+
+def load_detector_state(state_path=STATE_PATH):
+    """
+    Loads the detector state saved by save_detector_state
+
+    Parameters
+    ----------
+    state_path : string
+                 Path to the npz file
+
+    Returns
+    -------
+    state : dictionary
+            Fields of STATE_FIELDS for each region, tier and rate key,
+            empty if nothing was saved yet
+    """
+
+    state = {}
+    if not path.exists(state_path):
+        return state
+
+    with np.load(state_path) as saved:
+        for name in saved.files:
+            key, field = name.rsplit('.', 1)
+            state.setdefault(key, {})[field] = saved[name]
+
+    return state
+
+
+def save_detector_state(state, state_path=STATE_PATH):
+    """
+    Writes the detector state to an npz file, replacing it in one step so
+      a crash never leaves half a file
+
+    Parameters
+    ----------
+    state      : dictionary
+                 Output of load_detector_state or update_detector
+    state_path : string
+                 Path to the npz file
+
+    Returns
+    -------
+    None
+    """
+
+    folder = path.dirname(state_path)
+    if folder and not path.exists(folder):
+        makedirs(folder)
+
+    arrays = {f'{key}.{field}': values
+              for key, fields in state.items()
+              for field, values in fields.items()}
+    temp_path = f'{state_path}.tmp.npz'
+    np.savez(temp_path, **arrays)
+    replace(temp_path, state_path)
+
+    # Bye! <3
+    return
+
+
+def _align_state(fields, champions):
+    # State of the champions of the new day, new champions start empty
+    champions = np.asarray(champions, dtype=str)
+    aligned = {'champions': champions,
+               'days': np.zeros(len(champions), dtype=np.int32),
+               'mean': np.zeros(len(champions)),
+               'var': np.zeros(len(champions)),
+               'last_date': np.asarray(fields.get('last_date', ''))}
+
+    if 'champions' in fields:
+        known = pd.Index(fields['champions'])
+        position = known.get_indexer(champions)
+        found = position >= 0
+        for field in ['days', 'mean', 'var']:
+            aligned[field][found] = fields[field][position[found]]
+
+    return aligned
+
+
+def update_detector(state, rates, champions, metric, date, region='na',
+                    tier='all', alpha=ALPHA, threshold=Z_THRESHOLD):
+    """
+    Scores one day of rates against the running state and folds the day
+      into it
+
+    Parameters
+    ----------
+    state     : dictionary
+                Output of load_detector_state, updated in place
+    rates     : pandas series
+                Contains the rates as floats in the order of champions
+    champions : list
+                Champion names of the rates
+    metric    : string
+                'win', 'ban', or 'pick'
+    date      : string
+                Date of the rates as 'YYYY-MM-DD'
+    region    : string
+                op.gg region of the rates
+    tier      : string
+                Rank tier of the rates
+    alpha     : float
+                Weight of the new day
+    threshold : float
+                Standard deviations from the mean that are flagged
+
+    Returns
+    -------
+    anomalies : pandas data frame
+                Contains date, region, tier, metric, champion, rate, the
+                expected rate and z-score of each flagged champion, empty
+                when the date was already seen
+    """
+
+    key = get_state_key(metric, region, tier)
+    fields = _align_state(state.get(key, {}), champions)
+    columns = ['date', 'region', 'tier', 'metric', 'champion', 'rate',
+               'expected', 'z_score']
+
+    # Rescrapes of a day must not count it twice
+    if str(fields['last_date']) >= date:
+        return pd.DataFrame(columns=columns)
+
+    values = np.asarray(rates, dtype=np.float64)
+    seen = ~np.isnan(values)
+
+    # Score against the state before this day
+    std = np.maximum(np.sqrt(fields['var']), MIN_STD)
+    z_scores = (values - fields['mean']) / std
+    flagged = seen & (fields['days'] >= MIN_DAYS) \
+        & (np.abs(z_scores) > threshold)
+
+    # Exponentially weighted update, a champion's first day sets its mean
+    diff = np.where(seen, values - fields['mean'], 0.0)
+    first = seen & (fields['days'] == 0)
+    fields['mean'] = np.where(first, values, fields['mean'] + alpha * diff)
+    fields['var'] = np.where(first | ~seen, fields['var'],
+                             (1 - alpha) * (fields['var'] + alpha * diff**2))
+    fields['days'] = fields['days'] + seen
+    fields['last_date'] = np.asarray(date)
+    state[key] = fields
+
+    anomalies = pd.DataFrame({'date': date, 'region': region, 'tier': tier,
+                              'metric': metric,
+                              'champion': fields['champions'][flagged],
+                              'rate': values[flagged].round(4),
+                              'expected': (values - diff)[flagged].round(4),
+                              'z_score': z_scores[flagged].round(2)},
+                             columns=columns)
+
+    return anomalies
+
+
+def detect_rate_anomalies(rates, champions, metric, date, region='na',
+                          tier='all', state_path=STATE_PATH,
+                          anomaly_path=ANOMALY_PATH):
+    """
+    Updates the saved detector state with one scraped rate file, appending
+      and printing any flagged champions
+
+    Parameters
+    ----------
+    rates        : pandas series
+                   Contains the rates as floats in the order of champions
+    champions    : list
+                   Champion names of the rates
+    metric       : string
+                   'win', 'ban', or 'pick'
+    date         : string
+                   Date of the rates as 'YYYY-MM-DD'
+    region       : string
+                   op.gg region of the rates
+    tier         : string
+                   Rank tier of the rates
+    state_path   : string
+                   Path to the detector state
+    anomaly_path : string
+                   csv file the flagged rates are appended to
+
+    Returns
+    -------
+    anomalies : pandas data frame
+                Output of update_detector
+    """
+
+    with _state_lock:
+        state = load_detector_state(state_path)
+        anomalies = update_detector(state, rates, champions, metric, date,
+                                    region, tier)
+        save_detector_state(state, state_path)
+
+        if not anomalies.empty:
+            anomalies.to_csv(anomaly_path, mode='a', index=False,
+                             header=not path.exists(anomaly_path))
+
+    for row in anomalies.itertuples():
+        print(f'Unusual {metric} rate for {row.champion} in {region} '
+              f'{tier}: {row.rate:.4f}, expected {row.expected:.4f} '
+              f'(z = {row.z_score})')
+
+    return anomalies
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 14 11:03:26 2019
+
+@author: jeremy_lehner
+
+Streaming parser for the champion table of the op.gg statistics page. It
+feeds the page to lxml's HTML pull parser a chunk at a time, stops reading
+once the requested top level table ends, and reads the requested columns
+from that table's rows only. Column names follow pd.read_html: a header cell
+spanning two columns gives 'Champion' and 'Champion.1'.
+"""
+
+import pandas as pd
+from lxml import etree
+from src.profiling import profile_stage
+from src.validate_league_data import raise_problems
+
+
+# Characters of page source fed to the parser at a time
+CHUNK_SIZE = 65536
+
+
+def find_table(page_source, table_index=1):
+    """
+    Parses a page until its table_index-th top level table ends
+
+    Parameters
+    ----------
+    page_source : string
+                  HTML of the page
+    table_index : integer
+                  Position of the table among the top level tables
+
+    Returns
+    -------
+    table : lxml element
+            The table, None if the page has fewer tables
+    """
+
+    parser = etree.HTMLPullParser(events=('start', 'end'), tag='table')
+    tables_seen = 0
+    depth = 0
+    for start in range(0, len(page_source), CHUNK_SIZE):
+        parser.feed(page_source[start:start + CHUNK_SIZE])
+        for event, element in parser.read_events():
+            # Tables nested in a cell belong to their top level table
+            if event == 'start':
+                if depth == 0:
+                    tables_seen += 1
+                depth += 1
+                continue
+            depth -= 1
+            if depth == 0 and tables_seen == table_index + 1:
+                return element
+
+    # Bye! <3
+    return None
+
+
+def get_cell_text(cell):
+    # Text of a cell and everything in it, with whitespace collapsed
+    return ' '.join(''.join(cell.itertext()).split())
+
+
+def read_table_rows(table, columns):
+    """
+    Reads the header and the requested columns of a table's own rows
+
+    Parameters
+    ----------
+    table   : lxml element
+              Table to read
+    columns : list
+              Names of the columns to keep
+
+    Returns
+    -------
+    header : list
+             Contains the column names of the last header row
+    rows   : list
+             Contains the requested cells of each data row as strings
+    """
+
+    header = []
+    rows = []
+    wanted = None
+    for row in table.xpath('./tr|./thead/tr|./tbody/tr|./tfoot/tr'):
+        # Each cell fills as many positions as it spans
+        cells = []
+        for cell in row.xpath('./td|./th'):
+            span = cell.get('colspan') or '1'
+            cells += [cell] * (int(span) if span.isdigit() else 1)
+
+        # Rows of header cells above the data count as header rows, header
+        # rows name the columns, data rows keep only the requested columns
+        is_header = row.getparent().tag == 'thead' or (
+            not rows and all(cell.tag == 'th' for cell in cells))
+        if is_header:
+            header = dedupe_columns([get_cell_text(cell) for cell in cells])
+            wanted = [header.index(column) for column in columns
+                      if column in header]
+        elif wanted is not None:
+            rows.append([get_cell_text(cells[idx]) if idx < len(cells)
+                         else '' for idx in wanted])
+
+    return header, rows
+
+
+def dedupe_columns(names):
+    """
+    Renames repeated column names the way pd.read_html does
+
+    Parameters
+    ----------
+    names : list
+            Contains header cell texts as strings
+
+    Returns
+    -------
+    columns : list
+              Contains the names with '.1', '.2', ... added to repeats
+    """
+
+    seen = {}
+    columns = []
+    for name in names:
+        if name in seen:
+            seen[name] += 1
+            columns.append(f'{name}.{seen[name]}')
+        else:
+            seen[name] = 0
+            columns.append(name)
+
+    return columns
+
+
+@profile_stage
+def parse_rate_table(page_source, columns, table_index=1):
+    """
+    Pulls the requested columns of one table out of a page without parsing
+      the other tables into data frames
+
+    Parameters
+    ----------
+    page_source : string
+                  HTML of the page
+    columns     : list
+                  Names of the columns to keep, e.g. ['Champion.1',
+                  'Win rate']
+    table_index : integer
+                  Position of the table among the top level tables of the
+                  page, matching pd.read_html(page_source)[table_index] on
+                  pages without nested tables
+
+    Returns
+    -------
+    table : pandas data frame
+            Contains the requested columns as strings
+    """
+
+    header, rows = [], []
+    element = find_table(page_source, table_index)
+    if element is not None:
+        header, rows = read_table_rows(element, columns)
+
+    missing = [column for column in columns if column not in header]
+    if missing:
+        raise_problems([f'missing columns {missing}, found {header}'],
+                       'op.gg rate table')
+
+    table = pd.DataFrame(rows, columns=list(columns))
+
+    return table
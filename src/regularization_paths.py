@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Fri Oct 18 10:06:51 2019
+
+@author: jeremy_lehner
+
+Ridge, lasso and elastic-net regularization paths. Every penalty minimizes
+
+    1 / (2 n) ||y - X b||^2 + alpha l1_ratio ||b||_1
+                            + alpha (1 - l1_ratio) / 2 ||b||^2
+
+over standardized features, l1_ratio 0 for ridge and 1 for lasso. Ridge
+solves every alpha of the path from one SVD of X. Lasso and elastic net
+run coordinate descent on the Gram matrix X'X / n, computed once, from the
+largest alpha down, each alpha starting from the coefficients of the one
+before and finishing with an exact solve on the features it kept. Alphas
+are chosen by cross validation on folds of whole days, so rows of one day
+are never split between training and scoring.
+"""
+
+import numpy as np
+import pandas as pd
+from src.profiling import profile_stage
+
+
+# l1_ratio of each penalty, elastic net's can be changed
+PENALTIES = {'ridge': 0.0, 'lasso': 1.0, 'elasticnet': 0.5}
+
+# Default path length, smallest alpha relative to the largest, and
+# coordinate descent limits
+N_ALPHAS = 100
+ALPHA_RATIO = 1e-3
+MAX_ITER = 1000
+TOL = 1e-7
+
+
+class PathModel:
+    """
+    Linear model chosen from a regularization path, with the coef_ and
+      intercept_ that save_model_artifact reads
+
+    Parameters
+    ----------
+    penalty  : string
+               'ridge', 'lasso', or 'elasticnet'
+    l1_ratio : float
+               Share of the penalty on the L1 norm
+    path     : dictionary
+               Output of get_regularization_path on all training rows
+    cv_mse   : numpy array
+               Mean held out squared error of each alpha over the folds
+    """
+
+    def __init__(self, penalty, l1_ratio, path, cv_mse):
+        self.penalty = penalty
+        self.l1_ratio = l1_ratio
+        self.alphas_ = path['alphas']
+        self.coef_path_ = path['coefs']
+        self.intercept_path_ = path['intercepts']
+        self.cv_mse_ = cv_mse
+
+        # argmin would quietly pick the first alpha
+        if np.isnan(cv_mse).all():
+            raise ValueError('Every alpha has a NaN cross validation error, '
+                             'no alpha can be chosen (._.)')
+        best = int(np.nanargmin(cv_mse))
+        self.alpha_ = self.alphas_[best]
+        self.coef_ = self.coef_path_[best]
+        self.intercept_ = self.intercept_path_[best]
+
+    def predict(self, X):
+        return np.asarray(X, dtype=np.float64) @ self.coef_ + self.intercept_
+
+
+def standardize(X, y):
+    """
+    Centers the features and target and scales features to unit variance
+
+    Parameters
+    ----------
+    X : numpy array
+        Feature matrix, one row per observation
+    y : numpy array
+        Target values
+
+    Returns
+    -------
+    X_std  : numpy array
+             Standardized features
+    y_std  : numpy array
+             Centered target
+    center : tuple
+             (feature means, feature scales, target mean) to map
+             coefficients back to the original features
+    """
+
+    X_mean = X.mean(axis=0)
+    X_scale = X.std(axis=0)
+    X_scale[X_scale == 0] = 1.0
+    y_mean = y.mean()
+
+    X_std = (X - X_mean) / X_scale
+    y_std = y - y_mean
+
+    return X_std, y_std, (X_mean, X_scale, y_mean)
+
+
+def get_alpha_grid(X_std, y_std, l1_ratio, n_alphas=N_ALPHAS,
+                   alpha_ratio=ALPHA_RATIO):
+    """
+    Gets a log-spaced grid of alphas from largest to smallest
+
+    Parameters
+    ----------
+    X_std       : numpy array
+                  Standardized features
+    y_std       : numpy array
+                  Centered target
+    l1_ratio    : float
+                  Share of the penalty on the L1 norm
+    n_alphas    : integer
+                  Number of alphas
+    alpha_ratio : float
+                  Smallest alpha relative to the largest, squared for ridge
+
+    Returns
+    -------
+    alphas : numpy array
+             Contains the alphas in decreasing order
+    """
+
+    n_obs = len(y_std)
+    if l1_ratio > 0:
+        # Smallest alpha at which every coefficient is zero
+        alpha_max = np.abs(X_std.T @ y_std).max() / (n_obs * l1_ratio)
+    else:
+        # Ridge never zeroes coefficients and shrinks smoothly over more
+        # decades, start above the largest eigenvalue of X'X / n
+        alpha_max = 1e2 * np.linalg.norm(X_std, ord=2)**2 / n_obs
+        alpha_ratio = alpha_ratio**2
+    alpha_max = max(alpha_max, np.finfo(float).eps)
+
+    alphas = np.logspace(np.log10(alpha_max),
+                         np.log10(alpha_max * alpha_ratio), n_alphas)
+
+    return alphas
+
+
+def _ridge_path(X_std, y_std, alphas):
+    # b(alpha) = V diag(s / (s^2 + n alpha)) U'y for every alpha at once
+    U, s, Vt = np.linalg.svd(X_std, full_matrices=False)
+    Uty = U.T @ y_std
+    shrink = s / (s**2 + len(y_std) * alphas[:, None])
+    return (shrink * Uty) @ Vt
+
+
+def _solve_support(gram, corr, coef, l1, l2, tol):
+    # Exact solution for the support and signs coordinate descent found,
+    # None if it breaks the optimality conditions
+    support = coef != 0
+    signs = np.sign(coef[support])
+    system = gram[np.ix_(support, support)] + l2 * np.eye(support.sum())
+    solved = np.linalg.lstsq(system, corr[support] - l1 * signs,
+                             rcond=None)[0]
+    if np.any(solved * signs < 0):
+        return None
+
+    exact = np.zeros_like(coef)
+    exact[support] = solved
+    grad = corr - gram @ exact
+    if np.any(np.abs(grad[~support]) > l1 + tol):
+        return None
+
+    return exact
+
+
+def _descent_path(X_std, y_std, alphas, l1_ratio, max_iter, tol):
+    # Coordinate descent on the Gram matrix, warm started along the path.
+    # Once the support settles it is solved exactly instead of descending
+    # along the nearly collinear ratio features
+    n_obs, n_feat = X_std.shape
+    gram = X_std.T @ X_std / n_obs
+    corr = X_std.T @ y_std / n_obs
+    diag = np.diag(gram)
+
+    coefs = np.zeros((len(alphas), n_feat))
+    coef = np.zeros(n_feat)
+    for idx, alpha in enumerate(alphas):
+        l1 = alpha * l1_ratio
+        l2 = alpha * (1 - l1_ratio)
+        grad = corr - gram @ coef
+        for _ in range(max_iter):
+            largest_step = 0.0
+            for feat in range(n_feat):
+                rho = grad[feat] + diag[feat] * coef[feat]
+                new = np.sign(rho) * max(abs(rho) - l1, 0.0) \
+                    / (diag[feat] + l2)
+                step = new - coef[feat]
+                if step != 0.0:
+                    grad -= gram[:, feat] * step
+                    coef[feat] = new
+                    largest_step = max(largest_step, abs(step))
+            if largest_step <= tol:
+                break
+            exact = _solve_support(gram, corr, coef, l1, l2, tol)
+            if exact is not None:
+                coef = exact
+                break
+        coefs[idx] = coef
+
+    return coefs
+
+
+@profile_stage
+def get_regularization_path(X, y, penalty='ridge', l1_ratio=None,
+                            alphas=None, n_alphas=N_ALPHAS,
+                            max_iter=MAX_ITER, tol=TOL):
+    """
+    Fits a penalized linear model at every alpha of a path in one call
+
+    Parameters
+    ----------
+    X        : pandas data frame
+               Contains the model features
+    y        : pandas series
+               Contains the target
+    penalty  : string
+               'ridge', 'lasso', or 'elasticnet'
+    l1_ratio : float
+               Share of the penalty on the L1 norm, PENALTIES by default,
+               only elasticnet takes another share
+    alphas   : numpy array
+               Alphas in decreasing order, get_alpha_grid by default
+    n_alphas : integer
+               Number of alphas of the default grid
+    max_iter : integer
+               Most coordinate descent sweeps for one alpha
+    tol      : float
+               Coordinate descent stops when no coefficient moves more
+               than tol
+
+    Returns
+    -------
+    path : dictionary
+           alphas, coefs (one row per alpha) and intercepts, in the scale
+           of the original features
+    """
+
+    # Any other share would fit an elastic net saved as ridge or lasso
+    if l1_ratio is None:
+        l1_ratio = PENALTIES[penalty]
+    elif penalty != 'elasticnet' and l1_ratio != PENALTIES[penalty]:
+        raise ValueError(f'{penalty} has an l1_ratio of {PENALTIES[penalty]}'
+                         f', {l1_ratio} needs the elasticnet penalty (._.)')
+
+    X = np.asarray(X, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    X_std, y_std, (X_mean, X_scale, y_mean) = standardize(X, y)
+
+    if alphas is None:
+        alphas = get_alpha_grid(X_std, y_std, l1_ratio, n_alphas)
+    alphas = np.sort(np.asarray(alphas, dtype=np.float64))[::-1]
+
+    if l1_ratio == 0:
+        coefs = _ridge_path(X_std, y_std, alphas)
+    else:
+        coefs = _descent_path(X_std, y_std, alphas, l1_ratio, max_iter, tol)
+
+    # Back to the scale of the original features
+    coefs = coefs / X_scale
+    intercepts = y_mean - coefs @ X_mean
+
+    path = {'alphas': alphas, 'coefs': coefs, 'intercepts': intercepts}
+
+    return path
+
+
+def get_group_folds(groups, n_folds=5):
+    """
+    Assigns each row to a cross validation fold, keeping groups together
+      and consecutive groups in the same fold
+
+    Parameters
+    ----------
+    groups  : pandas series
+              Group of each row, e.g. its date
+    n_folds : integer
+              Number of folds
+
+    Returns
+    -------
+    folds : numpy array
+            Contains the fold of each row as integers
+    """
+
+    # Each fold needs rows to hold out and rows left to train on
+    codes, uniques = pd.factorize(pd.Series(groups), sort=True)
+    if not 2 <= n_folds <= len(uniques):
+        raise ValueError(f'{n_folds} folds cannot split {len(uniques)} '
+                         f'groups, use 2 to {len(uniques)} folds (._.)')
+    group_fold = np.zeros(len(uniques), dtype=int)
+    for fold, block in enumerate(np.array_split(np.arange(len(uniques)),
+                                                n_folds)):
+        group_fold[block] = fold
+
+    folds = group_fold[codes]
+
+    return folds
+
+
+@profile_stage
+def fit_regularized_model(X, y, groups, penalty='ridge', l1_ratio=None,
+                          n_folds=5, n_alphas=N_ALPHAS):
+    """
+    Computes a regularization path on each group fold, picks the alpha with
+      the lowest held out squared error and keeps the full data path
+
+    Parameters
+    ----------
+    X        : pandas data frame
+               Contains the model features
+    y        : pandas series
+               Contains the target
+    groups   : pandas series
+               Group of each row, rows of one group share a fold
+    penalty  : string
+               'ridge', 'lasso', or 'elasticnet'
+    l1_ratio : float
+               Share of the penalty on the L1 norm, PENALTIES by default
+    n_folds  : integer
+               Number of cross validation folds
+    n_alphas : integer
+               Number of alphas on the path
+
+    Returns
+    -------
+    model : PathModel
+            Model at the chosen alpha, with the path and CV errors
+    """
+
+    if l1_ratio is None:
+        l1_ratio = PENALTIES[penalty]
+
+    X = np.asarray(X, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    # Every fold uses the alphas of the full data so errors line up
+    path = get_regularization_path(X, y, penalty, l1_ratio,
+                                   n_alphas=n_alphas)
+    folds = get_group_folds(groups, n_folds)
+
+    fold_mse = []
+    for fold in np.unique(folds):
+        train = folds != fold
+        fold_path = get_regularization_path(X[train], y[train], penalty,
+                                            l1_ratio, path['alphas'])
+        y_pred = X[~train] @ fold_path['coefs'].T + fold_path['intercepts']
+        fold_mse.append(((y[~train, None] - y_pred)**2).mean(axis=0))
+
+    model = PathModel(penalty, l1_ratio, path, np.mean(fold_mse, axis=0))
+
+    return model
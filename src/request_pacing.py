@@ -0,0 +1,417 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Fri Oct 25 09:31:07 2019
+
+@author: jeremy_lehner
+
+Request pacing shared by every page the scrapers fetch. Each host gets a
+token bucket whose rate adapts to how the host answers: a 429 or 503 halves
+the rate and pauses the host for its Retry-After, and answered requests
+raise the rate again, doubling it every second until the host first
+throttles and adding RECOVERY requests per second every second after. A
+throttled session is dropped, and sessions are also rotated every
+SESSION_REQUESTS requests, each with its own user agent.
+
+    pacer = get_request_pacer()
+    identity = pacer.wait(url)        # blocks for a token of the host
+    ...fetch url as identity['user_agent'] in session identity['session']
+    pacer.record(url, status, retry_after)
+
+Browser drivers from the pool pace themselves this way, and fetch_url does
+the same for plain HTTP requests.
+"""
+
+import time
+import threading
+import urllib.error
+import urllib.request
+from http.cookiejar import CookieJar
+from urllib.parse import urlsplit
+
+
+# Desktop browsers sessions take turns posing as
+USER_AGENTS = [
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+    '(KHTML, like Gecko) Chrome/77.0.3865.120 Safari/537.36',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_14_6) AppleWebKit/537.36 '
+    '(KHTML, like Gecko) Chrome/77.0.3865.120 Safari/537.36',
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:69.0) Gecko/20100101 '
+    'Firefox/69.0',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10.14; rv:69.0) Gecko/20100101 '
+    'Firefox/69.0',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_14_6) AppleWebKit/605.1.15 '
+    '(KHTML, like Gecko) Version/13.0.2 Safari/605.1.15',
+    'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 '
+    '(KHTML, like Gecko) Chrome/77.0.3865.120 Safari/537.36']
+
+# Requests per second each host starts at, may fall to, and may climb to,
+# and requests that may go out back to back
+START_RATE = 1.0
+MIN_RATE = 0.05
+MAX_RATE = 10.0
+BURST = 1
+
+# Rate is multiplied by BACKOFF on a throttle response. Until a host first
+# throttles its rate doubles every second, after that it gains RECOVERY
+# requests per second every second without throttling
+BACKOFF = 0.5
+RECOVERY = 1.0
+
+# Responses that mean the host wants fewer requests
+THROTTLE_STATUSES = (429, 503)
+
+# Requests before a session is replaced by a fresh one
+SESSION_REQUESTS = 50
+
+# Tries of one url before giving up on a throttling host
+MAX_TRIES = 5
+
+# Pacer used by fetches that aren't handed one, created when first needed
+_default_pacer = None
+_default_lock = threading.Lock()
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket, acquire blocks until a token is free
+
+    Parameters
+    ----------
+    rate  : float
+            Tokens added per second
+    burst : integer
+            Most tokens the bucket holds
+    """
+
+    def __init__(self, rate, burst=BURST):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        # Nothing refills before the end of a pause
+        if now > self.updated:
+            self.tokens = min(self.burst,
+                              self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def set_rate(self, rate):
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = rate
+
+    def pause(self, seconds):
+        # No tokens are handed out for seconds, and the bucket starts empty
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens = 0.0
+            self.paused_until = max(self.paused_until, now + seconds)
+            self.updated = max(self.updated, self.paused_until)
+
+    def try_acquire(self):
+        # Takes one token if one is free, never waits
+        with self._lock:
+            now = time.monotonic()
+            if now < self.paused_until:
+                return False
+            self._refill(now)
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+    def acquire(self):
+        """
+        Takes one token, waiting for it if needed
+
+        Returns
+        -------
+        waited : float
+                 Seconds spent waiting
+        """
+
+        start = time.monotonic()
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now >= self.paused_until:
+                    self._refill(now)
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return now - start
+                    delay = (1 - self.tokens) / self.rate
+                else:
+                    delay = self.paused_until - now
+            time.sleep(delay)
+
+
+class HostPacer:
+    """
+    Adaptive rate and session of one host
+
+    Parameters
+    ----------
+    rate     : float
+               Starting requests per second
+    min_rate : float
+               Lowest requests per second after backing off
+    max_rate : float
+               Highest requests per second after recovering
+    burst    : integer
+               Requests that may go out back to back
+    """
+
+    def __init__(self, rate=START_RATE, min_rate=MIN_RATE,
+                 max_rate=MAX_RATE, burst=BURST):
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.bucket = TokenBucket(rate, burst)
+        self.session = 0
+        self.session_requests = 0
+        self.next_backoff = 0.0
+        self.metrics = {'requests': 0, 'throttled': 0, 'sessions': 1,
+                        'wait_seconds': 0.0}
+
+    @property
+    def rate(self):
+        return self.bucket.rate
+
+
+class RequestPacer:
+    """
+    Paces requests per host, rotates sessions and user agents, and adapts
+      each host's rate to its throttle responses
+
+    Parameters
+    ----------
+    rate             : float
+                       Starting requests per second of each host
+    min_rate         : float
+                       Lowest requests per second after backing off
+    max_rate         : float
+                       Highest requests per second after recovering
+    burst            : integer
+                       Requests that may go out back to back
+    user_agents      : list
+                       User agents sessions take turns using
+    session_requests : integer
+                       Requests before a session is replaced
+    """
+
+    def __init__(self, rate=START_RATE, min_rate=MIN_RATE, max_rate=MAX_RATE,
+                 burst=BURST, user_agents=USER_AGENTS,
+                 session_requests=SESSION_REQUESTS):
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.burst = burst
+        self.user_agents = list(user_agents)
+        self.session_requests = session_requests
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def get_host(self, url):
+        """
+        Gets the pacer of the url's host, creating it on first use
+        """
+
+        host = urlsplit(url).netloc
+        with self._lock:
+            if host not in self._hosts:
+                self._hosts[host] = HostPacer(self.rate, self.min_rate,
+                                              self.max_rate, self.burst)
+            return self._hosts[host]
+
+    def wait(self, url):
+        """
+        Blocks until the url's host may be sent another request
+
+        Parameters
+        ----------
+        url : string
+              Address about to be fetched
+
+        Returns
+        -------
+        identity : dictionary
+                   session number and user_agent the request should use,
+                   a new session number means cookies must be dropped
+        """
+
+        host = self.get_host(url)
+        waited = host.bucket.acquire()
+
+        with self._lock:
+            if host.session_requests >= self.session_requests:
+                host.session += 1
+                host.session_requests = 0
+                host.metrics['sessions'] += 1
+            host.session_requests += 1
+            host.metrics['requests'] += 1
+            host.metrics['wait_seconds'] += waited
+            identity = {'session': host.session,
+                        'user_agent': self.user_agents[
+                            host.session % len(self.user_agents)]}
+
+        return identity
+
+    def record(self, url, status, retry_after=None):
+        """
+        Adapts the url's host to the status of its response
+
+        Parameters
+        ----------
+        url         : string
+                      Address that was fetched
+        status      : integer
+                      HTTP status of the response
+        retry_after : float
+                      Seconds from the Retry-After header, if any
+
+        Returns
+        -------
+        throttled : boolean
+                    Did the host ask for fewer requests?
+        """
+
+        host = self.get_host(url)
+        throttled = status in THROTTLE_STATUSES
+
+        with self._lock:
+            now = time.monotonic()
+            if host.metrics['throttled']:
+                rate = host.rate + RECOVERY / host.rate
+            else:
+                rate = host.rate * 2**(1 / host.rate)
+            rate = min(rate, host.max_rate)
+            pause = None
+            if throttled:
+                host.metrics['throttled'] += 1
+                # The throttled session is dropped
+                host.session += 1
+                host.session_requests = 0
+                host.metrics['sessions'] += 1
+                # Requests already in flight when the host backed off
+                # don't halve the rate again
+                rate = host.rate
+                if now >= host.next_backoff:
+                    rate = max(host.rate * BACKOFF, host.min_rate)
+                    pause = retry_after if retry_after else 1 / rate
+                    host.next_backoff = now + pause + 1 / rate
+            host.bucket.set_rate(rate)
+            if pause is not None:
+                host.bucket.pause(pause)
+
+        return throttled
+
+    def stats(self):
+        """
+        Reports each host's current rate and its request, throttle, session
+          and wait counts
+
+        Returns
+        -------
+        stats : dictionary
+                Metrics of each host
+        """
+
+        with self._lock:
+            stats = {name: dict(host.metrics, rate=round(host.rate, 3))
+                     for name, host in self._hosts.items()}
+
+        return stats
+
+
+def get_request_pacer(pacer=None):
+    """
+    Gets the pacer a fetch should use
+
+    Parameters
+    ----------
+    pacer : RequestPacer
+            Pacer handed to the fetch, the process-wide pacer by default
+
+    Returns
+    -------
+    pacer : RequestPacer
+            Pacer shared by every fetch of the process
+    """
+
+    global _default_pacer
+    if pacer is not None:
+        return pacer
+    with _default_lock:
+        if _default_pacer is None:
+            _default_pacer = RequestPacer()
+
+    return _default_pacer
+
+
+def get_retry_after(headers):
+    # Seconds of a numeric Retry-After header, None if missing or a date
+    try:
+        return float(headers.get('Retry-After'))
+    except (TypeError, ValueError):
+        return None
+
+
+_openers = {}
+_openers_lock = threading.Lock()
+
+
+def _get_opener(host, session):
+    # One cookie jar per host session, older sessions are forgotten
+    with _openers_lock:
+        if _openers.get(host, (None,))[0] != session:
+            opener = urllib.request.build_opener(
+                urllib.request.HTTPCookieProcessor(CookieJar()))
+            _openers[host] = (session, opener)
+        return _openers[host][1]
+
+
+def fetch_url(url, pacer=None, max_tries=MAX_TRIES, timeout=30):
+    """
+    Fetches a url over plain HTTP, paced and retried by the pacer
+
+    Parameters
+    ----------
+    url       : string
+                Address to fetch
+    pacer     : RequestPacer
+                Pacer to use, the process-wide pacer by default
+    max_tries : integer
+                Tries before giving up on a throttling host
+    timeout   : float
+                Seconds to wait for each response
+
+    Returns
+    -------
+    body : bytes
+           Body of the response
+    """
+
+    pacer = get_request_pacer(pacer)
+    host = urlsplit(url).netloc
+
+    for _ in range(max_tries):
+        identity = pacer.wait(url)
+        opener = _get_opener(host, identity['session'])
+        request = urllib.request.Request(
+            url, headers={'User-Agent': identity['user_agent']})
+        try:
+            with opener.open(request, timeout=timeout) as reply:
+                body = reply.read()
+            pacer.record(url, reply.status)
+            return body
+        except urllib.error.HTTPError as error:
+            if not pacer.record(url, error.code,
+                                get_retry_after(error.headers)):
+                raise
+
+    raise ConnectionError(f'{url} was still throttled after {max_tries} '
+                          'tries (._.)')
@@ -6,12 +6,48 @@ Created on Tue Sep 24 16:43:33 2019
 @author: jeremy_lehner
 """
 
+import io
 import pandas as pd
 import datetime
-from selenium import webdriver
 import time
-from bs4 import BeautifulSoup
-from os import path
+import threading
+from os import path, makedirs
+from concurrent.futures import ThreadPoolExecutor
+from src.lazy_imports import lazy_import
+from src.profiling import profile_stage
+from src.load_league_data import get_rate_folder
+from src.load_league_data import load_patch_dates
+from src.load_league_data import load_champ_names
+from src.validate_league_data import validate_scraped_table
+from src.validate_league_data import validate_rate_file
+from src.champion_ids import update_champion_ids
+from src.champion_ids import get_champion_ids
+from src.champion_ids import get_source_names
+from src.rate_table_parser import parse_rate_table
+from src.browser_pool import get_browser_pool
+from src.process_league_data import get_patch_for_date
+from src.rate_anomalies import detect_rate_anomalies
+from src.request_pacing import fetch_url
+
+# Scraping stack is only imported the first time a scraper needs it,
+# drivers come from the browser pool
+bs4 = lazy_import('bs4')
+
+# Rank tiers on the op.gg statistics page, 'all' covers every rank
+TIERS = ['all', 'iron', 'bronze', 'silver', 'gold', 'platinum', 'diamond',
+         'master', 'grandmaster', 'challenger']
+
+# Table column and selector button of each rate on the op.gg statistics page
+RATE_COLUMNS = {'win': 'Win rate',
+                'ban': 'Ban ratio per game',
+                'pick': 'Pick ratio per game'}
+RATE_XPATHS = {'win': '//*[@id="rate_win"]/span/span',
+               'ban': '//*[@id="rate_ban"]/span/span',
+               'pick': '//*[@id="rate_pick"]/span/span'}
+
+# Page-ready time and bytes transferred of each scraped stats page
+METRICS_PATH = './cache/scrape_metrics.csv'
+_metrics_lock = threading.Lock()
 
 
 def get_scrape_date():
@@ -47,6 +83,352 @@ def get_scrape_date():
     return date_data
 
 
+def get_current_patch(date=None):
+    """
+    Gets the patch live on the scrape date from the patch calendar
+
+    Parameters
+    ----------
+    date : string
+           Date as 'YYYY-MM-DD', today by default
+
+    Returns
+    -------
+    patch : string
+            Patch version, e.g. '9.18'
+    """
+
+    if date is None:
+        date = get_scrape_date()
+
+    patch = get_patch_for_date([date], load_patch_dates()).iloc[0]
+
+    return patch
+
+
+def get_scrape_champions(date=None):
+    """
+    Gets the champion names in the static snapshot of the scrape date, the
+      rows and order every scraped rate table is aligned to
+
+    Parameters
+    ----------
+    date : string
+           Date as 'YYYY-MM-DD', today by default
+
+    Returns
+    -------
+    champ_names : pandas series
+                  Contains champion names as strings in alphabetical order
+    """
+
+    champ_names = load_champ_names(patch=get_current_patch(date))
+
+    return champ_names
+
+
+def get_static_path(file_name):
+    """
+    Gets the path of a static data file in the snapshot folder of the
+      current patch, creating the folder if needed
+
+    Parameters
+    ----------
+    file_name : string
+                Name of the csv file, e.g. 'num_skins.csv'
+
+    Returns
+    -------
+    file_path : string
+                Path to write the file to, data/static/<patch>/<file_name>
+    """
+
+    static_folder = path.join('./data/static/', get_current_patch())
+    if not path.exists(static_folder):
+        makedirs(static_folder)
+
+    file_path = path.join(static_folder, file_name)
+
+    return file_path
+
+
+def get_stats_url(region='na', tier='all'):
+    """
+    Gets the op.gg champion statistics url for a region and rank tier
+
+    Parameters
+    ----------
+    region : string
+             op.gg region, e.g. 'na', 'euw', or 'kr'
+    tier   : string
+             Rank tier from TIERS, 'all' for players of all ranks
+
+    Returns
+    -------
+    url : string
+          Champion statistics url for the region and tier
+    """
+
+    # Korea is op.gg's home region and has no region subdomain
+    subdomain = 'www' if region == 'kr' else region
+    url = f'https://{subdomain}.op.gg/statistics/champion/'
+    if tier != 'all':
+        url = url + f'?league={tier}'
+
+    return url
+
+
+def wait_for_page_ready(driver, timeout=30, settle=0.5, min_tables=2):
+    """
+    Waits until the page has loaded, its tables are drawn, and no new
+      requests have started for settle seconds
+
+    Parameters
+    ----------
+    driver     : selenium web driver
+                 Browser session showing the page
+    timeout    : float
+                 Seconds to wait before giving up
+    settle     : float
+                 Seconds without new requests that count as ready
+    min_tables : integer
+                 Tables the page must have drawn, 0 for pages without
+
+    Returns
+    -------
+    elapsed : float
+              Seconds waited
+    """
+
+    count_requests = "return performance.getEntriesByType('resource').length"
+    is_loaded = "return document.readyState === 'complete'"
+
+    start = time.perf_counter()
+    last_count, last_change = -1, start
+    while time.perf_counter() - start < timeout:
+        now = time.perf_counter()
+        count = driver.execute_script(count_requests)
+        if count != last_count:
+            last_count, last_change = count, now
+        elif (now - last_change >= settle
+              and driver.execute_script(is_loaded)
+              and len(driver.find_elements_by_tag_name('table'))
+              >= min_tables):
+            return now - start
+        time.sleep(0.1)
+
+    raise TimeoutError(f'{driver.current_url} was not ready after {timeout} s')
+
+
+def get_transfer_bytes(driver):
+    """
+    Gets the bytes transferred over the network for the open page
+
+    Parameters
+    ----------
+    driver : selenium web driver
+             Browser session showing the page
+
+    Returns
+    -------
+    transfer_bytes : integer
+                     Bytes of the document and every request since it loaded
+    """
+
+    transfer_bytes = driver.execute_script(
+        "return performance.getEntriesByType('navigation')"
+        ".concat(performance.getEntriesByType('resource'))"
+        ".reduce((total, entry) => total + (entry.transferSize || 0), 0)")
+
+    return int(transfer_bytes)
+
+
+def record_scrape_metrics(metrics, metrics_path=METRICS_PATH):
+    """
+    Appends the load metrics of one scraped page to a csv file, so scrapes
+      with and without request blocking can be compared
+
+    Parameters
+    ----------
+    metrics      : dictionary
+                   Metrics of one page, written as one row
+    metrics_path : string
+                   Path to the csv file
+
+    Returns
+    -------
+    None
+    """
+
+    folder = path.dirname(metrics_path)
+    with _metrics_lock:
+        if folder and not path.exists(folder):
+            makedirs(folder)
+        pd.DataFrame([metrics]).to_csv(metrics_path, mode='a', index=False,
+                                       header=not path.exists(metrics_path))
+
+    # Bye! <3
+    return
+
+
+def open_stats_page(driver, region='na', tier='all'):
+    """
+    Loads the op.gg champion statistics page for a region and tier, selects
+      the stats for the current day, and records how long the page took to
+      be ready and how many bytes it transferred
+
+    Parameters
+    ----------
+    driver : selenium web driver
+             Browser session used for the scrape
+    region : string
+             op.gg region, e.g. 'na', 'euw', or 'kr'
+    tier   : string
+             Rank tier from TIERS, 'all' for players of all ranks
+
+    Returns
+    -------
+    metrics : dictionary
+              Contains page_ready_seconds and transfer_bytes of the page
+    """
+
+    today_xpath = '//*[@id="recent_today"]/span/span'
+    scroll_down = "window.scrollTo(0, document.body.scrollHeight);"
+
+    start = time.perf_counter()
+    driver.get(get_stats_url(region, tier))
+    wait_for_page_ready(driver)
+
+    # Select stats for current day
+    today_button = driver.find_element_by_xpath(today_xpath)
+    today_button.click()
+
+    # Scroll to bottom of page and wait for the stats to redraw
+    driver.execute_script(scroll_down)
+    wait_for_page_ready(driver)
+
+    metrics = {'date': get_scrape_date(),
+               'region': region,
+               'tier': tier,
+               'blocked': getattr(driver, 'blocked', None),
+               'page_ready_seconds': round(time.perf_counter() - start, 3),
+               'transfer_bytes': get_transfer_bytes(driver)}
+    record_scrape_metrics(metrics)
+
+    return metrics
+
+
+def read_rate_table(driver, metric, champ_names=None):
+    """
+    Selects one rate on the open op.gg statistics page and reads it for every
+      champion in the order of champion_names.csv
+
+    Parameters
+    ----------
+    driver      : selenium web driver
+                  Browser session showing the op.gg statistics page
+    metric      : string
+                  'win', 'ban', or 'pick'
+    champ_names : pandas series
+                  Champion names the rates are aligned to, from
+                  champion_names.csv by default
+
+    Returns
+    -------
+    rates : pandas series
+            Contains the rates as floats in the order of champ_names
+    """
+
+    champs = 'Champion.1'
+    column = RATE_COLUMNS[metric]
+
+    # Select the rate and give the table a moment to redraw
+    rate_button = driver.find_element_by_xpath(RATE_XPATHS[metric])
+    rate_button.click()
+    time.sleep(2)
+
+    # Scrape rates, reading only the two columns of the stats table
+    rates = parse_rate_table(driver.page_source, [champs, column])
+
+    # Fail before a partial or changed table shifts the saved rows
+    if champ_names is None:
+        champ_names = get_scrape_champions()
+    validate_scraped_table(rates, column, len(champ_names), champs)
+
+    # Match op.gg spellings to champion ids instead of relying on both
+    # sources sorting names the same way
+    champion_ids = get_champion_ids(rates[champs])
+    rates = pd.Series(rates[column].to_numpy(), index=champion_ids)
+    rates = rates.reindex(get_champion_ids(champ_names))
+    rates = rates.reset_index(drop=True)
+
+    # Convert rates to float
+    rates = rates.str.replace('%', '')
+    rates = round(rates.astype('float')/100, 4)
+
+    return rates
+
+
+def save_rate_data(rates, metric, date, region='na', tier='all', save=True,
+                   num_champs=None):
+    """
+    Adds the scrape date to a series of rates, validates it, writes it to
+      the region, tier and patch partition of the data folder, and checks
+      it for unusual swings
+
+    Parameters
+    ----------
+    rates      : pandas series
+                 Contains the rates as floats in alphabetical champion order
+    metric     : string
+                 'win', 'ban', or 'pick'
+    date       : string
+                 Date of the scrape as 'YYYY-MM-DD'
+    region     : string
+                 op.gg region of the rates
+    tier       : string
+                 Rank tier of the rates
+    save       : boolean
+                 Save rates as csv file?
+    num_champs : integer
+                 Number of champions the rates must have, from
+                 champion_names.csv by default
+
+    Returns
+    -------
+    rate_df : pandas data frame
+              Contains the rates as floats and the date as strings
+    """
+
+    # Add a column with the date
+    rate_df = pd.DataFrame({f'{metric}rate': rates, 'date': date})
+
+    # Never write a file that would corrupt the data folder
+    champ_names = get_scrape_champions(date)
+    if num_champs is None:
+        num_champs = len(champ_names)
+    validate_rate_file(rate_df, metric, num_champs)
+
+    # Write rates to csv file
+    if save:
+        stamp = date.replace('-', '')
+        patch = get_current_patch(date)
+        rate_folder = get_rate_folder(metric, region, tier, patch)
+        if not path.exists(rate_folder):
+            makedirs(rate_folder)
+        rate_df.to_csv(path.join(rate_folder, f'{metric}_rates_{stamp}.csv'),
+                       index=False)
+
+        # Flag swings against the running state of earlier days
+        detect_rate_anomalies(rate_df[f'{metric}rate'], champ_names, metric,
+                              date, region, tier)
+    else:
+        print(f'{metric.capitalize()} rates were scraped, but not saved!')
+
+    return rate_df
+
+
+@profile_stage
 def scrape_champ_names(save=True):
     """
     Scrapes champion names from League of Legends Wiki and saves them to
@@ -66,7 +448,7 @@ def scrape_champ_names(save=True):
     url = 'https://leagueoflegends.fandom.com/wiki/List_of_champions'
 
     # Get champion names
-    names = pd.read_html(url)[1]
+    names = pd.read_html(io.StringIO(fetch_url(url).decode('utf-8')))[1]
 
     names = list(names['Champion'])
     names = [s.split(',')[0] for s in names]
@@ -75,12 +457,17 @@ def scrape_champ_names(save=True):
 
     # Write names to csv file
     if save:
-        names.to_csv('./data/champion_names.csv', index=False)
+        names.to_csv(get_static_path('champion_names.csv'),
+                     index=False, header=False)
+
+        # Give new champions an id
+        update_champion_ids()
 
     # Bye! <3
     return
 
 
+@profile_stage
 def scrape_release_dates(save=True):
     """
     Scrapes champion release dates from League of Legends Wiki and saves them
@@ -100,18 +487,20 @@ def scrape_release_dates(save=True):
     url = 'https://leagueoflegends.fandom.com/wiki/List_of_champions'
 
     # Get release dates
-    dates = pd.read_html(url)[1]
+    dates = pd.read_html(io.StringIO(fetch_url(url).decode('utf-8')))[1]
     dates = dates['Release Date'].rename('release_date')
 
     # Write release dates to csv file
     if save:
-        dates.to_csv('./data/champion_release_dates.csv', index=False)
+        dates.to_csv(get_static_path('champion_release_dates.csv'),
+                     index=False, header=False)
 
     # Bye! <3
     return
 
 
-def scrape_number_of_skins(names, save=True):
+@profile_stage
+def scrape_number_of_skins(names, save=True, pool=None):
     """
     Scrapes number of champion skins from League of Legends Wiki and saves
       them to a csv file, but returns nothing
@@ -122,6 +511,8 @@ def scrape_number_of_skins(names, save=True):
              Contains the champion names as strings in alphabetical order
     save   : boolean
              Save number of champion skins to csv file?
+    pool   : BrowserPool
+             Pool to check drivers out of, the shared pool by default
 
     Returns
     -------
@@ -131,247 +522,150 @@ def scrape_number_of_skins(names, save=True):
     # Assign scrape path variables
     style = 'display:inline-block; margin:5px; width:342px'
 
-    # Set up selenium web driver
-    driver = webdriver.Chrome('./src/utils/chromedriver')
-
-    # Get number of skins
+    # Get number of skins, one pooled driver checkout per page so drivers
+    # are recycled during the loop
     num_skins = []
     for name in names:
         name = name.replace(' ', '_')
         skins_url = f'https://leagueoflegends.fandom.com/wiki/{name}/Skins'
-        driver.get(skins_url)
-        time.sleep(2)
+        with get_browser_pool(pool).driver() as driver:
+            driver.get(skins_url)
+            wait_for_page_ready(driver, min_tables=0)
+            page_source = driver.page_source
 
-        soup = BeautifulSoup(driver.page_source, 'html.parser')
+        soup = bs4.BeautifulSoup(page_source, 'html.parser')
 
         num_skins.append(len(soup.find_all('div', {'style': style})))
 
     num_skins = pd.Series(num_skins)
 
-    # Close selenium web driver
-    driver.close()
-
     if save:
-        num_skins.to_csv('./data/num_skins.csv', index=False)
+        num_skins.to_csv(get_static_path('num_skins.csv'),
+                         index=False, header=False)
 
     # Bye! <3
     return
 
 
-def scrape_win_rates(save=True):
+@profile_stage
+def scrape_win_rates(region='na', tier='all', save=True, pool=None):
     """
-    Scrapes the current day North America champion win rates from op.gg and
-      saves them to a csv file along with the date, but returns nothing
+    Scrapes the current day champion win rates for one region and tier from
+      op.gg and saves them to a csv file along with the date
 
     Parameters
     ----------
-    save : boolean
-           Save win rates as csv file?
+    region : string
+             op.gg region, e.g. 'na', 'euw', or 'kr'
+    tier   : string
+             Rank tier from TIERS, 'all' for players of all ranks
+    save   : boolean
+             Save win rates as csv file?
+    pool   : BrowserPool
+             Pool to check drivers out of, the shared pool by default
 
     Returns
     -------
-    None
+    winrates : pandas data frame
+               Contains champion win rates as floats and the date as strings
     """
 
     # Get date at time of scraping
     date = get_scrape_date()
 
-    # Assign scraping variables
-    champstats_url = 'https://na.op.gg/statistics/champion/'
-    today_xpath = '//*[@id="recent_today"]/span/span'
-    winrate_xpath = '//*[@id="rate_win"]/span/span'
-    scroll_down = "window.scrollTo(0, document.body.scrollHeight);"
-    champs = 'Champion.1'
-    win = 'Win rate'
-
-    # Set up selenium web driver
-    driver = webdriver.Chrome('./src/utils/chromedriver')
-    driver.get(champstats_url)
-
-    # Select stats for current day
-    today_button = driver.find_element_by_xpath(today_xpath)
-    today_button.click()
-
-    # Select win rates
-    winrate_button = driver.find_element_by_xpath(winrate_xpath)
-    winrate_button.click()
+    # Check a driver out of the browser pool
+    with get_browser_pool(pool).driver() as driver:
+        open_stats_page(driver, region, tier)
 
-    # Scroll to bottom of page and wait to bypass ads
-    driver.execute_script(scroll_down)
-    time.sleep(10)
-
-    # Scrape win rates
-    winrates = pd.read_html(driver.page_source)[1]
-    winrates = winrates[[champs, win]]
-
-    # Sort win rates by champion in alphabetical order
-    winrates.sort_values(by=champs, inplace=True)
-    winrates = winrates[win].reset_index()[win]
-
-    # Close selenium web driver
-    driver.close()
+        # Scrape win rates
+        winrates = read_rate_table(driver, 'win')
 
-    # Convert win rates to float
-    winrates = winrates.str.replace('%', '')
-    winrates = round(winrates.astype('float')/100, 4)
-
-    # Add a column with the date
-    winrates = pd.DataFrame({'winrate': winrates, 'date': date})
-
-    # Write win rates to csv file
-    if save:
-        date = date.replace('-', '')
-        winrates.to_csv(f'./data/win/win_rates_{date}.csv', index=False)
-    else:
-        print('Win rates were scraped, but not saved!')
+    winrates = save_rate_data(winrates, 'win', date, region, tier, save)
 
     # Bye! <3
-    return
+    return winrates
 
 
-def scrape_ban_rates(save=True):
+@profile_stage
+def scrape_ban_rates(region='na', tier='all', save=True, pool=None):
     """
-    Scrapes the current day North America champion ban rates from op.gg and
-      saves them to a csv file along with the date, but returns nothing
+    Scrapes the current day champion ban rates for one region and tier from
+      op.gg and saves them to a csv file along with the date
 
     Parameters
     ----------
+    region : string
+             op.gg region, e.g. 'na', 'euw', or 'kr'
+    tier   : string
+             Rank tier from TIERS, 'all' for players of all ranks
     save   : boolean
              Save ban rates as csv file?
+    pool   : BrowserPool
+             Pool to check drivers out of, the shared pool by default
 
     Returns
     -------
-    None
+    banrates : pandas data frame
+               Contains champion ban rates as floats and the date as strings
     """
 
     # Get date at time of scraping
     date = get_scrape_date()
 
-    # Assign scraping variables
-    champstats_url = 'https://na.op.gg/statistics/champion/'
-    today_xpath = '//*[@id="recent_today"]/span/span'
-    banrate_xpath = '//*[@id="rate_ban"]/span/span'
-    scroll_down = "window.scrollTo(0, document.body.scrollHeight);"
-    champs = 'Champion.1'
-    ban = 'Ban ratio per game'
-
-    # Set up selenium web driver
-    driver = webdriver.Chrome('./src/utils/chromedriver')
-    driver.get(champstats_url)
-
-    # Select stats for current day
-    today_button = driver.find_element_by_xpath(today_xpath)
-    today_button.click()
-
-    # Select ban rates
-    banrate_button = driver.find_element_by_xpath(banrate_xpath)
-    banrate_button.click()
-
-    # Scroll to bottom of page and wait to bypass ads
-    driver.execute_script(scroll_down)
-    time.sleep(10)
-
-    # Scrape ban rates
-    banrates = pd.read_html(driver.page_source)[1]
-    banrates = banrates[[champs, ban]]
+    # Check a driver out of the browser pool
+    with get_browser_pool(pool).driver() as driver:
+        open_stats_page(driver, region, tier)
 
-    # Sort ban rates by champion in alphabetical order
-    banrates.sort_values(by=champs, inplace=True)
-    banrates = banrates[ban].reset_index()[ban]
+        # Scrape ban rates
+        banrates = read_rate_table(driver, 'ban')
 
-    # Close Selenioum web driver
-    driver.close()
-
-    # Convert ban rates to float
-    banrates = banrates.str.replace('%', '')
-    banrates = round(banrates.astype('float')/100, 4)
-
-    # Add a column with the date
-    banrates = pd.DataFrame({'banrate': banrates, 'date': date})
-
-    # Write ban rates to csv file
-    if save:
-        date = date.replace('-', '')
-        banrates.to_csv(f'./data/ban/ban_rates_{date}.csv', index=False)
-    else:
-        print('Ban rates were scraped, but not saved!')
+    banrates = save_rate_data(banrates, 'ban', date, region, tier, save)
 
     # Bye! <3
     return banrates
 
 
-def scrape_pick_rates(save=True):
+@profile_stage
+def scrape_pick_rates(region='na', tier='all', save=True, pool=None):
     """
-    Scrapes the current day North America champion pick rates from op.gg and
-      saves them to a csv file along with the date, but returns nothing
+    Scrapes the current day champion pick rates for one region and tier from
+      op.gg and saves them to a csv file along with the date
 
     Parameters
     ----------
+    region : string
+             op.gg region, e.g. 'na', 'euw', or 'kr'
+    tier   : string
+             Rank tier from TIERS, 'all' for players of all ranks
     save   : boolean
              Save pick rates as csv file?
+    pool   : BrowserPool
+             Pool to check drivers out of, the shared pool by default
 
     Returns
     -------
-    None
+    pickrates : pandas data frame
+                Contains champion pick rates as floats and the date as strings
     """
 
     # Get date at time of scraping
     date = get_scrape_date()
 
-    # Assign scraping variables
-    champstats_url = 'https://na.op.gg/statistics/champion/'
-    today_xpath = '//*[@id="recent_today"]/span/span'
-    pickrate_xpath = '//*[@id="rate_pick"]/span/span'
-    scroll_down = "window.scrollTo(0, document.body.scrollHeight);"
-    champs = 'Champion.1'
-    pick = 'Pick ratio per game'
-
-    # Set up selenium web driver
-    driver = webdriver.Chrome('./src/utils/chromedriver')
-    driver.get(champstats_url)
-
-    # Select stats for current day
-    today_button = driver.find_element_by_xpath(today_xpath)
-    today_button.click()
+    # Check a driver out of the browser pool
+    with get_browser_pool(pool).driver() as driver:
+        open_stats_page(driver, region, tier)
 
-    # Select pick rates
-    pickrate_button = driver.find_element_by_xpath(pickrate_xpath)
-    pickrate_button.click()
+        # Scrape pick rates
+        pickrates = read_rate_table(driver, 'pick')
 
-    # Scroll to bottom of page and wait to bypass ads
-    driver.execute_script(scroll_down)
-    time.sleep(10)
-
-    # Scrape pick rates
-    pickrates = pd.read_html(driver.page_source)[1]
-    pickrates = pickrates[[champs, pick]]
-
-    # Sort ban rates by champion in alphabetical order
-    pickrates.sort_values(by=champs, inplace=True)
-    pickrates = pickrates[pick].reset_index()[pick]
-
-    # Close selenium web driver
-    driver.close()
-
-    # Convert pick rates to float
-    pickrates = pickrates.str.replace('%', '')
-    pickrates = round(pickrates.astype('float')/100, 4)
-
-    # Add a column with the date
-    pickrates = pd.DataFrame({'pickrate': pickrates, 'date': date})
-
-    # Write pick rates to csv file
-    if save:
-        date = date.replace('-', '')
-        pickrates.to_csv(f'./data/pick/pick_rates_{date}.csv', index=False)
-    else:
-        print('Pick rates were scraped, but not saved!')
+    pickrates = save_rate_data(pickrates, 'pick', date, region, tier, save)
 
     # Bye! <3
     return pickrates
 
 
-def scrape_last_patch_change(names, save=True):
+@profile_stage
+def scrape_last_patch_change(names, save=True, pool=None):
     """
     Scrapes the last patch in which each champion was changed from League Wiki
       and saves them to a csv file, but returns nothing
@@ -382,25 +676,26 @@ def scrape_last_patch_change(names, save=True):
              Contains the champion names as strings in alphabetical order
     save   : boolean
              Save the last patch each champion was changed to csv file?
+    pool   : BrowserPool
+             Pool to check drivers out of, the shared pool by default
 
     Returns
     -------
     None
     """
 
-    # Set up selenium web driver
-    driver = webdriver.Chrome('./src/utils/chromedriver')
-
     # Get patch when champion was last changed
     last_patch = []
-    for name in names:
+    for name in get_source_names(names, 'gamepedia'):
         name = name.replace(' ', '_')
         champ_url = f'https://lol.gamepedia.com/{name}#Patch_History'
-        driver.get(champ_url)
-        time.sleep(2)
+        with get_browser_pool(pool).driver() as driver:
+            driver.get(champ_url)
+            wait_for_page_ready(driver, min_tables=0)
+            page_source = driver.page_source
 
         # Parse the champion page HTML
-        soup = BeautifulSoup(driver.page_source, 'html.parser')
+        soup = bs4.BeautifulSoup(page_source, 'html.parser')
 
         # Get entire patch history but only grab patch versions from HTML
         history = [link for link in soup.find_all('a')
@@ -419,9 +714,6 @@ def scrape_last_patch_change(names, save=True):
         most_recent = str(most_recent)[-8:-4]
         last_patch.append(most_recent)
 
-    # Close selenium web driver
-    driver.close()
-
     # Standardize the patch version format
     for idx, patch in enumerate(last_patch):
         last_patch[idx] = patch.replace('v', '')
@@ -433,9 +725,95 @@ def scrape_last_patch_change(names, save=True):
 
     # Write the patches to a csv file
     if save:
-        last_patch.to_csv('./data/last_patch.csv', index=False)
+        last_patch.to_csv(get_static_path('last_patch.csv'),
+                          index=False, header=False)
     else:
         print('Patches were scraped, but not saved!')
 
     # Bye! <3
     return last_patch
+
+
+@profile_stage
+def scrape_region_rates(region='na', tiers=('all',), save=True,
+                        pool=None):
+    """
+    Scrapes the current day win, ban, and pick rates of every requested tier
+      for one region in a single browser session
+
+    Parameters
+    ----------
+    region : string
+             op.gg region, e.g. 'na', 'euw', or 'kr'
+    tiers  : list
+             Rank tiers from TIERS to scrape
+    save   : boolean
+             Save the rates as csv files?
+    pool   : BrowserPool
+             Pool to check drivers out of, the shared pool by default
+
+    Returns
+    -------
+    None
+    """
+
+    # Get date at time of scraping
+    date = get_scrape_date()
+
+    champ_names = get_scrape_champions(date)
+
+    # Use one pooled driver for all tiers
+    with get_browser_pool(pool).driver() as driver:
+        for tier in tiers:
+            open_stats_page(driver, region, tier)
+            for metric in ['win', 'ban', 'pick']:
+                rates = read_rate_table(driver, metric, champ_names)
+                save_rate_data(rates, metric, date, region, tier, save,
+                               len(champ_names))
+
+    # Bye! <3
+    return
+
+
+@profile_stage
+def scrape_rates_by_region(regions=('na',), tiers=('all',), max_workers=None,
+                           save=True, pool=None):
+    """
+    Scrapes the current day win, ban, and pick rates for several regions at
+      once, each region with its own driver from the pool
+
+    Parameters
+    ----------
+    regions     : list
+                  op.gg regions to scrape, e.g. ['na', 'euw', 'kr']
+    tiers       : list
+                  Rank tiers from TIERS to scrape in each region
+    max_workers : integer
+                  Number of regions scraped at the same time, all by default
+    save        : boolean
+                  Save the rates as csv files?
+    pool        : BrowserPool
+                  Pool to check drivers out of, the shared pool by default
+
+    Returns
+    -------
+    failed : list
+             Regions whose scrape raised an error
+    """
+
+    if max_workers is None:
+        max_workers = len(regions)
+
+    # Scraping is spent waiting on pages, so threads are enough
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {region: executor.submit(scrape_region_rates, region,
+                                           tiers, save, pool)
+                   for region in regions}
+
+    failed = []
+    for region, future in futures.items():
+        if future.exception() is not None:
+            print(f'Scraping {region} failed: {future.exception()!r} (._.)')
+            failed.append(region)
+
+    return failed
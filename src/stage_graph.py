@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Wed Oct 16 10:17:32 2019
+
+@author: jeremy_lehner
+
+Small dependency graph executor for pipeline stages. Each stage names the
+stages whose outputs it takes, stages run on a thread or process pool as
+soon as their inputs are ready, and outputs are kept so later runs of the
+graph only compute what is new. Adding a stage again with the same
+arguments and stamp keeps its output, anything else replaces the stage and
+drops its output and every output downstream of it. Loaders pass a stamp
+of the files they read, from get_path_stamp, so new or changed files are
+read again.
+
+    graph = StageGraph()
+    graph.add('win_rates', load_win_rates, data_folder)
+    graph.add('ban_rates', load_ban_rates, data_folder)
+    graph.add('pick_rates', load_pick_rates, data_folder)
+    graph.add('dynamic', combine_rate_data,
+              inputs={'win': 'win_rates', 'ban': 'ban_rates',
+                      'pick': 'pick_rates'})
+    outputs = graph.run()
+"""
+
+import os
+import time
+from os import path
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import wait
+from src.profiling import get_profile_context
+from src.profiling import inherit_profile_context
+from src.profiling import add_profile_events
+
+
+def get_path_stamp(*paths):
+    """
+    Fingerprints files and folders by the path, size and modification time
+      of every file in them, to tell when the inputs of a stage changed
+
+    Parameters
+    ----------
+    *paths : string
+             Files or folders, missing ones and None count as empty
+
+    Returns
+    -------
+    stamp : tuple
+            Contains (path, size, mtime in ns) of each file
+    """
+
+    stamp = []
+    for root in paths:
+        if root is None:
+            continue
+        if path.isfile(root):
+            files = [root]
+        else:
+            files = sorted(path.join(folder, name)
+                           for folder, _, names in os.walk(root)
+                           for name in names)
+        for file in files:
+            stats = os.stat(file)
+            stamp.append((file, stats.st_size, stats.st_mtime_ns))
+
+    return tuple(stamp)
+
+
+def _run_stage(func, args, kwargs, name, context):
+    # Runs in the worker at the profiling depth of the caller, returns the
+    # output with its start and end times and the profile events it made
+    with inherit_profile_context(context, name) as events:
+        start = time.perf_counter()
+        output = func(*args, **kwargs)
+        end = time.perf_counter()
+    return output, start, end, events
+
+
+class StageGraph:
+    """
+    Runs stages in dependency order, independent stages at the same time
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self.outputs = {}
+        self.timings = {}
+        self.wall_seconds = 0.0
+        self.num_memoized = 0
+
+    def add(self, name, func, *args, inputs=None, stamp=None, **kwargs):
+        """
+        Adds a stage called as func(*args, **kwargs, **inputs), where each
+          input keyword gets the output of the named stage, or replaces the
+          stage of that name if anything about it changed
+
+        Parameters
+        ----------
+        name   : string
+                 Unique name of the stage
+        func   : function
+                 Stage to run, module level if a process pool is used
+        *args  : any
+                 Passed to func
+        inputs : dictionary
+                 Stage name whose output is passed for each keyword
+        stamp  : tuple
+                 Fingerprint of what the stage reads besides its inputs,
+                 e.g. from get_path_stamp
+        **kwargs
+                 Passed to func
+
+        Returns
+        -------
+        None
+        """
+
+        stage = (func, args, kwargs, dict(inputs or {}), stamp)
+        if self.stages.get(name) == stage:
+            return
+        self.stages[name] = stage
+        self.invalidate(name)
+
+        # Bye! <3
+        return
+
+    def get_dependencies(self, targets=None):
+        """
+        Gets every stage needed for the targets, checking the graph has no
+          unknown inputs or cycles
+
+        Parameters
+        ----------
+        targets : list
+                  Stages to compute, every stage by default
+
+        Returns
+        -------
+        needed : list
+                 Contains the needed stage names in dependency order
+        """
+
+        if targets is None:
+            targets = list(self.stages)
+
+        needed = []
+        state = {}
+
+        def visit(name, path):
+            if name not in self.stages:
+                raise KeyError(f'Unknown stage {name} needed by {path}')
+            if state.get(name) == 'done':
+                return
+            if state.get(name) == 'visiting':
+                raise ValueError(f'Stages form a cycle: {path + [name]}')
+            state[name] = 'visiting'
+            for source in self.stages[name][3].values():
+                visit(source, path + [name])
+            state[name] = 'done'
+            needed.append(name)
+
+        for target in targets:
+            visit(target, [])
+
+        return needed
+
+    def invalidate(self, name):
+        """
+        Drops the memoized output of a stage and of every stage downstream
+
+        Parameters
+        ----------
+        name : string
+               Stage whose output is stale
+
+        Returns
+        -------
+        None
+        """
+
+        self.outputs.pop(name, None)
+        for other, stage in self.stages.items():
+            if name in stage[3].values() and other in self.outputs:
+                self.invalidate(other)
+
+        # Bye! <3
+        return
+
+    def run(self, targets=None, max_workers=None, executor='thread'):
+        """
+        Runs every needed stage that has no memoized output, dispatching
+          stages to the pool as soon as their inputs are ready, timings and
+          the report cover this run only
+
+        Parameters
+        ----------
+        targets     : list
+                      Stages to compute, every stage by default
+        max_workers : integer
+                      Size of the pool, the executor default if None
+        executor    : string
+                      'thread' for a thread pool, 'process' for a process
+                      pool
+
+        Returns
+        -------
+        outputs : dictionary
+                  Output of each stage computed so far
+        """
+
+        self.timings = {}
+        self.wall_seconds = 0.0
+        dependencies = self.get_dependencies(targets)
+        needed = [name for name in dependencies if name not in self.outputs]
+        self.num_memoized = len(dependencies) - len(needed)
+        if not needed:
+            return self.outputs
+
+        pool_class = {'thread': ThreadPoolExecutor,
+                      'process': ProcessPoolExecutor}[executor]
+
+        waiting = {name: set(self.stages[name][3].values())
+                   - set(self.outputs) for name in needed}
+        running = {}
+        run_start = time.perf_counter()
+        context = get_profile_context()
+
+        with pool_class(max_workers=max_workers) as pool:
+            while waiting or running:
+                # Dispatch every stage whose inputs are ready
+                for name in [name for name, sources in waiting.items()
+                             if not sources]:
+                    func, args, kwargs, inputs, _ = self.stages[name]
+                    kwargs = dict(kwargs, **{keyword: self.outputs[source]
+                                             for keyword, source
+                                             in inputs.items()})
+                    future = pool.submit(_run_stage, func, args, kwargs,
+                                         name, context)
+                    running[future] = name
+                    del waiting[name]
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    output, start, end, events = future.result()
+                    if executor == 'process':
+                        add_profile_events(events)
+                    self.outputs[name] = output
+                    self.timings[name] = (start, end)
+                    for sources in waiting.values():
+                        sources.discard(name)
+
+        self.wall_seconds = time.perf_counter() - run_start
+
+        return self.outputs
+
+    def get_critical_path(self):
+        """
+        Finds the chain of dependent stages with the longest total run time,
+          the lower bound on the wall time of the graph
+
+        Returns
+        -------
+        path    : list
+                  Contains the stage names of the chain in order
+        seconds : float
+                  Total run time of the chain
+        """
+
+        durations = {name: end - start
+                     for name, (start, end) in self.timings.items()}
+        longest = {}
+        previous = {}
+        for name in self.get_dependencies(list(durations)):
+            sources = [source for source in self.stages[name][3].values()
+                       if source in durations]
+            before = max(sources, key=lambda source: longest[source],
+                         default=None)
+            longest[name] = durations.get(name, 0.0)
+            if before is not None:
+                longest[name] += longest[before]
+            previous[name] = before
+
+        if not longest:
+            return [], 0.0
+
+        name = max(longest, key=longest.get)
+        seconds = longest[name]
+        path = []
+        while name is not None:
+            path.append(name)
+            name = previous[name]
+
+        return path[::-1], seconds
+
+    def report(self):
+        """
+        Summarizes the last run: wall time, summed stage time, the critical
+          path, and the stages whose memoized outputs were reused
+
+        Returns
+        -------
+        summary : string
+                  One line summary
+        """
+
+        path, seconds = self.get_critical_path()
+        total = sum(end - start for start, end in self.timings.values())
+        summary = (f'{len(self.timings)} stages in {self.wall_seconds:.3f} s, '
+                   f'sum of stages {total:.3f} s, critical path '
+                   f'{seconds:.3f} s ({" -> ".join(path)}), '
+                   f'{self.num_memoized} memoized')
+
+        return summary
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct  7 10:12:44 2019
+
+@author: jeremy_lehner
+
+Synthetic data shaped like the scraped data folder, for benchmarking the
+pipeline at sizes larger than one patch of North America data.
+
+    python -m src.synthetic_data ./cache/synthetic --days 365 --champs 170
+"""
+
+import argparse
+import datetime
+import numpy as np
+import pandas as pd
+from os import path, makedirs
+
+from src.load_league_data import get_rate_folder
+from src.process_league_data import PATCHES
+
+
+# Regions used to name synthetic region folders
+REGIONS = ['na', 'euw', 'eune', 'kr', 'br', 'lan', 'las', 'oce', 'ru', 'tr',
+           'jp']
+
+
+def make_synthetic_data(folder, days=13, champs=145, regions=1, patches=1,
+                        start_date='2019-09-11', seed=0):
+    """
+    Writes synthetic data in the layout of the data folder: a patch calendar,
+      a static data snapshot per patch, and one win, ban and pick rate csv
+      per day for each region
+
+    Parameters
+    ----------
+    folder     : string
+                 Root folder of the synthetic data
+    days       : integer
+                 Number of days of rate data
+    champs     : integer
+                 Number of champions
+    regions    : integer
+                 Number of regions
+    patches    : integer
+                 Number of patches the days are spread over, up to 47, rates
+                 shift at each patch boundary
+    start_date : string
+                 Start of the newest patch as 'YYYY-MM-DD', older patches
+                 are placed before it
+    seed       : integer
+                 Seed for the random number generator
+
+    Returns
+    -------
+    region_names : list
+                   Contains the name of each region written
+    """
+
+    rng = np.random.default_rng(seed)
+
+    # Patches covered by the data, ending with the newest known patch
+    patch_names = PATCHES[0:max(patches, 1)][::-1]
+    days_per_patch = max(days // len(patch_names), 1)
+    first_offset = datetime.timedelta(days=days_per_patch
+                                      * (len(patch_names) - 1))
+    start = datetime.date.fromisoformat(start_date) - first_offset
+    patch_of_day = [patch_names[min(day // days_per_patch,
+                                    len(patch_names) - 1)]
+                    for day in range(days)]
+
+    if not path.exists(folder):
+        makedirs(folder)
+    patch_dates = pd.DataFrame({'patch': patch_names,
+                                'start_date': [(start + datetime.timedelta(
+                                    days=idx * days_per_patch)).isoformat()
+                                    for idx in range(len(patch_names))]})
+    patch_dates.to_csv(path.join(folder, 'patch_dates.csv'), index=False)
+
+    # Static champion data, one snapshot per patch shared by all regions
+    names = pd.Series([f'Champion{idx:04d}' for idx in range(champs)])
+    release = (pd.Timestamp('2009-02-21')
+               + pd.to_timedelta(rng.integers(0, 3800, champs), unit='D'))
+    release_dates = pd.Series(release.strftime('%Y-%m-%d'))
+    num_skins = pd.Series(rng.integers(1, 20, champs))
+    num_skins_by_patch = {}
+    for idx, patch in enumerate(patch_names):
+        # Skins only ever get added, and changes are to this or older patches
+        num_skins = num_skins + rng.binomial(1, 0.05, champs)
+        num_skins_by_patch[patch] = num_skins
+        older = PATCHES[PATCHES.index(patch):PATCHES.index(patch) + 20]
+        last_patch = pd.Series(rng.choice(older, champs))
+
+        static_folder = path.join(folder, 'static', patch)
+        if not path.exists(static_folder):
+            makedirs(static_folder)
+        names.to_csv(path.join(static_folder, 'champion_names.csv'),
+                     index=False, header=False)
+        release_dates.to_csv(path.join(static_folder,
+                                       'champion_release_dates.csv'),
+                             index=False, header=False)
+        num_skins.to_csv(path.join(static_folder, 'num_skins.csv'),
+                         index=False, header=False)
+        last_patch.to_csv(path.join(static_folder, 'last_patch.csv'),
+                          index=False, header=False)
+
+    region_names = [REGIONS[idx] if idx < len(REGIONS) else f'region{idx}'
+                    for idx in range(regions)]
+
+    # Daily rate data for each region, with a new baseline for each patch
+    for region in region_names:
+        for day in range(days):
+            patch = patch_of_day[day]
+            if day == 0 or patch != patch_of_day[day - 1]:
+                base_win = rng.normal(0.5, 0.02, champs)
+                base_ban = rng.beta(1.2, 12.0, champs)
+            winrate = np.clip(base_win + rng.normal(0, 0.005, champs), 0, 1)
+            banrate = np.clip(base_ban + rng.normal(0, 0.005, champs), 0, 1)
+            pickrate = np.clip(0.05 + 0.8 * (winrate - 0.5) + 0.4 * banrate
+                               + 0.002 * num_skins_by_patch[patch].to_numpy()
+                               + rng.normal(0, 0.01, champs), 0, 1)
+
+            date = (start + datetime.timedelta(days=day)).isoformat()
+            stamp = date.replace('-', '')
+            for metric, rates in [('win', winrate),
+                                  ('ban', banrate),
+                                  ('pick', pickrate)]:
+                rate_folder = get_rate_folder(metric, region, patch=patch,
+                                              data_folder=folder)
+                if not path.exists(rate_folder):
+                    makedirs(rate_folder)
+                rate_df = pd.DataFrame({f'{metric}rate': np.round(rates, 4),
+                                        'date': date})
+                rate_df.to_csv(path.join(rate_folder,
+                                         f'{metric}_rates_{stamp}.csv'),
+                               index=False)
+
+    return region_names
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Write synthetic data shaped like the data folder')
+    parser.add_argument('folder')
+    parser.add_argument('--days', type=int, default=13)
+    parser.add_argument('--champs', type=int, default=145)
+    parser.add_argument('--regions', type=int, default=1)
+    parser.add_argument('--patches', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    make_synthetic_data(args.folder, args.days, args.champs, args.regions,
+                        args.patches, seed=args.seed)
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Fri Oct 25 14:12:36 2019
+
+@author: jeremy_lehner
+
+Local stand-in for a throttling host, to try the request pacer without
+hitting op.gg. The server answers up to --capacity requests per second and
+sends 429 with a Retry-After header beyond that. Every request records its
+user agent and session cookie. The same requests are then sent unpaced and
+through fetch_url from several threads.
+
+    python -m src.throttle_stand_in --capacity 20 --requests 300
+"""
+
+import json
+import time
+import argparse
+import threading
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from src.request_pacing import TokenBucket
+from src.request_pacing import RequestPacer
+from src.request_pacing import fetch_url
+
+
+class ThrottlingHandler(BaseHTTPRequestHandler):
+    """
+    Answers GET requests while the server's bucket has tokens, 429 otherwise
+    """
+
+    def do_GET(self):
+        server = self.server
+        allowed = server.bucket.try_acquire()
+        with server.lock:
+            server.counts['ok' if allowed else 'throttled'] += 1
+            server.user_agents.add(self.headers.get('User-Agent'))
+
+        if allowed:
+            # A fresh session gets a cookie, later requests send it back
+            self.send_response(200)
+            if 'Cookie' not in self.headers:
+                with server.lock:
+                    server.counts['sessions'] += 1
+                    session = server.counts['sessions']
+                self.send_header('Set-Cookie', f'session={session}')
+            body = b'ok'
+        else:
+            self.send_response(429)
+            self.send_header('Retry-After', '1')
+            body = b'slow down'
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        # Keep the output to the summary
+        return
+
+
+def start_stand_in(capacity=20, port=0):
+    """
+    Starts the throttling server in a background thread
+
+    Parameters
+    ----------
+    capacity : float
+               Requests per second answered before sending 429
+    port     : integer
+               Port to listen on, any free port by default
+
+    Returns
+    -------
+    server : ThreadingHTTPServer
+             Running server, with counts and user_agents of the requests
+    """
+
+    server = ThreadingHTTPServer(('127.0.0.1', port), ThrottlingHandler)
+    server.daemon_threads = True
+    server.bucket = TokenBucket(capacity, burst=max(int(capacity), 1))
+    server.lock = threading.Lock()
+    server.counts = {'ok': 0, 'throttled': 0, 'sessions': 0}
+    server.user_agents = set()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    return server
+
+
+def run_clients(send, urls, threads):
+    # Sends every url from threads workers, returns seconds and failures
+    remaining = list(urls)
+    lock = threading.Lock()
+    failures = []
+
+    def client():
+        while True:
+            with lock:
+                if not remaining:
+                    return
+                url = remaining.pop()
+            try:
+                send(url)
+            except (urllib.error.HTTPError, ConnectionError) as error:
+                with lock:
+                    failures.append(error)
+
+    workers = [threading.Thread(target=client) for _ in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    return time.perf_counter() - start, len(failures)
+
+
+def run_stand_in_test(capacity=20, requests=300, threads=8, rate=1.0):
+    """
+    Sends the same requests to a stand-in host unpaced and paced, and
+      prints what the host saw each time
+
+    Parameters
+    ----------
+    capacity : float
+               Requests per second the stand-in answers
+    requests : integer
+               Requests sent each time
+    threads  : integer
+               Concurrent client threads
+    rate     : float
+               Starting requests per second of the pacer
+
+    Returns
+    -------
+    summary : dictionary
+              Seconds, answered, throttled, failed requests and sessions of
+              the unpaced and paced runs, and the pacer's final state
+    """
+
+    summary = {}
+    for name in ['unpaced', 'paced']:
+        server = start_stand_in(capacity)
+        host, port = server.server_address
+        urls = [f'http://{host}:{port}/page/{idx}' for idx in range(requests)]
+
+        if name == 'unpaced':
+            def send(url):
+                with urllib.request.urlopen(url) as reply:
+                    reply.read()
+        else:
+            pacer = RequestPacer(rate=rate, max_rate=4 * capacity)
+
+            def send(url):
+                fetch_url(url, pacer)
+
+        seconds, failed = run_clients(send, urls, threads)
+        server.shutdown()
+        server.server_close()
+
+        summary[name] = {'seconds': round(seconds, 2),
+                         'answered': server.counts['ok'],
+                         'throttled': server.counts['throttled'],
+                         'failed': failed,
+                         'answered_per_second': round(
+                             server.counts['ok'] / seconds, 1),
+                         'sessions': server.counts['sessions'],
+                         'user_agents': len(server.user_agents)}
+    summary['pacer'] = pacer.stats()
+
+    print(json.dumps(summary, indent=2))
+
+    return summary
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Try the request pacer on a local throttling host')
+    parser.add_argument('--capacity', type=float, default=20)
+    parser.add_argument('--requests', type=int, default=300)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--rate', type=float, default=1.0)
+    args = parser.parse_args()
+
+    run_stand_in_test(args.capacity, args.requests, args.threads, args.rate)
@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Tue Oct 22 11:08:35 2019
+
+@author: jeremy_lehner
+
+Nearest neighbour index of champions by their daily win, ban and pick rate
+trajectories over one patch. Each day's rates are z-scored across the
+champions of that day, so a champion's vector is where it stood relative
+to the others on each day. Distances are the root mean squared difference
+of two vectors.
+
+At 150-odd champions every pairwise distance fits in a small matrix, so
+the index keeps the summed squared differences of every pair and a query
+is one partial sort of a row. New days add their own squared differences
+to the sums instead of recomputing the history. The index of each patch is
+saved under cache/, extended by every build and every query with the days
+it hasn't seen, and rebuilt when the data of its last day changed.
+
+    index = update_saved_index(league_df)
+    index.query('Ahri', k=5)
+"""
+
+import numpy as np
+import pandas as pd
+from os import path, makedirs, replace
+from src.profiling import profile_stage
+
+
+# Rates whose trajectories are compared
+TRAJECTORY_METRICS = ['winrate', 'banrate', 'pickrate']
+
+# Folder the index of each patch is saved in
+INDEX_FOLDER = './cache/'
+
+
+def get_day_vectors(day_df, champions, metrics=TRAJECTORY_METRICS):
+    """
+    Z-scores each day's rates across champions
+
+    Parameters
+    ----------
+    day_df    : pandas data frame
+                Contains champion, date and rate columns for some days
+    champions : list
+                Champion names giving the row order
+    metrics   : list
+                Rate columns to use
+
+    Returns
+    -------
+    vectors : numpy array
+              One row per champion, one column per day and metric, NaN
+              where a champion has no rate
+    """
+
+    wide = day_df.pivot_table(index='champion', columns='date',
+                              values=metrics, observed=True)
+    wide = wide.reindex(pd.Index(champions, name='champion'))
+    values = wide.to_numpy(dtype=np.float64)
+
+    spread = np.nanstd(values, axis=0)
+    spread[~(spread > 0)] = 1.0
+    vectors = (values - np.nanmean(values, axis=0)) / spread
+
+    return vectors
+
+
+def _pairwise_squares(vectors):
+    # Summed squared differences of every pair of rows, missing days count
+    # as the mean of the day
+    vectors = np.nan_to_num(vectors)
+    norms = np.einsum('ij,ij->i', vectors, vectors)
+    squares = norms[:, None] + norms[None, :] - 2 * vectors @ vectors.T
+    return np.maximum(squares, 0.0)
+
+
+class TrajectoryIndex:
+    """
+    Exact k nearest neighbour index of champion rate trajectories over one
+      patch, extended day by day
+
+    Parameters
+    ----------
+    patch   : string
+              Patch indexed, the latest patch in the data by default
+    metrics : list
+              Rate columns compared
+    """
+
+    def __init__(self, patch=None, metrics=TRAJECTORY_METRICS):
+        self.patch = patch
+        self.metrics = list(metrics)
+        self.indexed_patch = None
+        self.champions = []
+        self.dates = []
+        self.squares = np.zeros((0, 0))
+        self.num_columns = 0
+        self.last_day = np.zeros((0, 0))
+        self._positions = {}
+
+    def _build(self, patch_df, patch):
+        self.indexed_patch = patch
+        self.champions = sorted(patch_df['champion'].astype(str).unique())
+        self._positions = {champion: idx for idx, champion
+                           in enumerate(self.champions)}
+        self.dates = []
+        self.squares = np.zeros((len(self.champions), len(self.champions)))
+        self.num_columns = 0
+        self._add(patch_df)
+
+    def _add(self, new_df):
+        vectors = get_day_vectors(new_df, self.champions, self.metrics)
+        self.squares += _pairwise_squares(vectors)
+        self.num_columns += vectors.shape[1]
+        self.dates += sorted(new_df['date'].unique())
+        self.last_day = self._get_last_day(new_df)
+
+    def _get_last_day(self, patch_df):
+        # Rates of the newest indexed day, to tell if the data was replaced
+        last_df = patch_df[patch_df['date'] == self.dates[-1]]
+        return get_day_vectors(last_df, self.champions, self.metrics)
+
+    @profile_stage
+    def update(self, league_df):
+        """
+        Adds the days of the data that are newer than the index, rebuilding
+          only when the patch or the champions change
+
+        Parameters
+        ----------
+        league_df : pandas data frame
+                    Contains champion, date, patch and rate columns
+
+        Returns
+        -------
+        index : TrajectoryIndex
+                The updated index
+        """
+
+        patch = self.patch
+        if patch is None:
+            patch = league_df.loc[league_df['date'].idxmax(), 'patch']
+        patch_df = league_df.loc[league_df['patch'] == patch,
+                                 ['champion', 'date'] + self.metrics]
+        if patch_df.empty:
+            raise KeyError(f'No data for patch {patch} (._.)')
+
+        # Data of another region or tier, or rebuilt with revised rates,
+        # no longer matches the newest indexed day
+        new_df = patch_df
+        same_data = False
+        if self.dates and patch == self.indexed_patch:
+            last_day = self._get_last_day(patch_df)
+            same_data = (last_day.shape == self.last_day.shape
+                         and np.allclose(last_day, self.last_day,
+                                         equal_nan=True))
+        if same_data:
+            new_df = patch_df[patch_df['date'] > self.dates[-1]]
+            if new_df.empty:
+                return self
+
+        champions = set(new_df['champion'].astype(str))
+        if not same_data or champions != set(self.champions):
+            self._build(patch_df, patch)
+        else:
+            self._add(new_df)
+
+        return self
+
+    def save(self, index_path):
+        """
+        Writes the index to an npz file, replacing it in one step so a crash
+          never leaves half a file
+
+        Parameters
+        ----------
+        index_path : string
+                     Path to the npz file
+
+        Returns
+        -------
+        None
+        """
+
+        folder = path.dirname(index_path)
+        if folder and not path.exists(folder):
+            makedirs(folder)
+
+        temp_path = f'{index_path}.tmp.npz'
+        np.savez(temp_path,
+                 patch=np.array(self.indexed_patch),
+                 metrics=np.array(self.metrics),
+                 champions=np.array(self.champions),
+                 dates=np.array(self.dates, dtype='datetime64[ns]'),
+                 squares=self.squares,
+                 num_columns=np.array(self.num_columns),
+                 last_day=self.last_day)
+        replace(temp_path, index_path)
+
+        # Bye! <3
+        return
+
+    @classmethod
+    def load(cls, index_path, patch=None):
+        """
+        Loads an index saved by save, or starts an empty one
+
+        Parameters
+        ----------
+        index_path : string
+                     Path to the npz file
+        patch      : string
+                     Patch the index is for, the latest patch by default
+
+        Returns
+        -------
+        index : TrajectoryIndex
+                The saved index, empty if nothing was saved yet
+        """
+
+        if not path.exists(index_path):
+            return cls(patch)
+
+        with np.load(index_path) as saved:
+            index = cls(patch, saved['metrics'].tolist())
+            index.indexed_patch = str(saved['patch'])
+            index.champions = saved['champions'].tolist()
+            index.dates = list(saved['dates'])
+            index.squares = saved['squares']
+            index.num_columns = int(saved['num_columns'])
+            index.last_day = saved['last_day']
+        index._positions = {champion: idx for idx, champion
+                            in enumerate(index.champions)}
+
+        return index
+
+    def query(self, champion, k=5):
+        """
+        Finds the champions whose trajectories are closest to a champion's
+
+        Parameters
+        ----------
+        champion : string
+                   Champion name
+        k        : integer
+                   Number of neighbours
+
+        Returns
+        -------
+        neighbours : list
+                     Contains (champion, distance) of the k closest
+                     champions, closest first
+        """
+
+        if champion not in self._positions:
+            raise KeyError(f'{champion} is not in the index (._.)')
+
+        row = self.squares[self._positions[champion]].copy()
+        row[self._positions[champion]] = np.inf
+        k = min(k, len(row) - 1)
+        nearest = np.argpartition(row, k - 1)[:k] if k > 0 else []
+        nearest = sorted(nearest, key=row.__getitem__)
+
+        neighbours = [(self.champions[idx],
+                       float(np.sqrt(row[idx] / self.num_columns)))
+                      for idx in nearest]
+
+        return neighbours
+
+
+def get_index_path(patch, folder=INDEX_FOLDER):
+    return path.join(folder, f'trajectory_index_{patch}.npz')
+
+
+@profile_stage
+def update_saved_index(league_df, patch=None, folder=INDEX_FOLDER):
+    """
+    Loads the saved index of a patch, adds the days of the data it hasn't
+      seen, and saves it again if anything was added
+
+    Parameters
+    ----------
+    league_df : pandas data frame
+                Contains champion, date, patch and rate columns
+    patch     : string
+                Patch indexed, the latest patch in the data by default
+    folder    : string
+                Folder the index is saved in
+
+    Returns
+    -------
+    index : TrajectoryIndex
+            The updated index
+    """
+
+    if patch is None:
+        patch = league_df.loc[league_df['date'].idxmax(), 'patch']
+    index_path = get_index_path(patch, folder)
+
+    # Adding days or rebuilding replaces the rates of the newest day
+    index = TrajectoryIndex.load(index_path, patch)
+    last_day = index.last_day
+    index.update(league_df)
+    if index.last_day is not last_day:
+        index.save(index_path)
+
+    return index
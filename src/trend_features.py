@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Wed Oct  9 15:42:18 2019
+
+@author: jeremy_lehner
+
+Trend features of the daily rates: rolling means, day-over-day deltas,
+exponentially weighted means and lagged values for each champion. Columns
+are named like 'pickrate_mean3', 'pickrate_delta', 'pickrate_ewm5' and
+'pickrate_lag1'. Means, deltas and EWMAs include the current day, so only
+the lags are free of the same-day pick rate.
+"""
+
+import pandas as pd
+import numpy as np
+from src.profiling import profile_stage
+from src.league_schema import apply_schema
+
+
+# Rates that trend features are computed for
+TREND_METRICS = ['winrate', 'banrate', 'pickrate']
+
+# Default rolling windows in days, EWMA span in days, and lags in days
+TREND_WINDOWS = (3, 7)
+TREND_SPAN = 5
+TREND_LAGS = (1,)
+
+
+def get_trend_columns(windows=TREND_WINDOWS, span=TREND_SPAN,
+                      lags=TREND_LAGS):
+    """
+    Gets the names of the trend feature columns
+
+    Parameters
+    ----------
+    windows : list
+              Rolling mean windows in days
+    span    : integer
+              Span of the exponentially weighted mean in days
+    lags    : list
+              Lags in days
+
+    Returns
+    -------
+    columns : list
+              Contains the trend column names as strings
+    """
+
+    columns = []
+    for metric in TREND_METRICS:
+        columns += [f'{metric}_mean{window}' for window in windows]
+        columns += [f'{metric}_delta', f'{metric}_ewm{span}']
+        columns += [f'{metric}_lag{lag}' for lag in lags]
+
+    return columns
+
+
+def _add_window_features(df, windows, lags, keys):
+    # Rolling means, deltas and lags of a frame sorted by keys and date,
+    # each grouped op runs over all champions at once
+    # Rates are summed in float64, float32 running sums lose the last days
+    by_key = [df[key] for key in keys]
+    grouped = df[TREND_METRICS].astype(np.float64).groupby(by_key,
+                                                           sort=False,
+                                                           observed=True)
+    position = grouped.cumcount().to_numpy()[:, None]
+
+    # Rolling sums as differences of running sums, early days use what
+    # is there
+    sums = grouped.cumsum()
+    sums_grouped = sums.groupby(by_key, sort=False, observed=True)
+    for window in windows:
+        earlier = sums_grouped.shift(window).fillna(0)
+        means = (sums - earlier) / np.minimum(position + 1, window)
+        for metric in TREND_METRICS:
+            df[f'{metric}_mean{window}'] = means[metric]
+    deltas = grouped.diff()
+    for metric in TREND_METRICS:
+        df[f'{metric}_delta'] = deltas[metric]
+    for lag in lags:
+        lagged = grouped.shift(lag)
+        for metric in TREND_METRICS:
+            df[f'{metric}_lag{lag}'] = lagged[metric]
+
+    return df
+
+
+def _add_ewm_features(df, span, keys, last_ewm=None):
+    # Recursive EWMA of a frame sorted by keys and date, stepping through
+    # the days in order with each step vectorized over champions. Rows with
+    # _new False only seed the window features and are left as they are
+    alpha = 2 / (span + 1)
+    ewm_columns = [f'{metric}_ewm{span}' for metric in TREND_METRICS]
+    group_ids = df.groupby(keys, sort=False, observed=True).ngroup().to_numpy()
+    state = np.full((group_ids.max() + 1, len(TREND_METRICS)), np.nan)
+
+    # Continue each champion's EWMA from its last value, new champions
+    # start from their first rate
+    if last_ewm is not None:
+        row_keys = (pd.MultiIndex.from_frame(df[keys]) if len(keys) > 1
+                    else pd.Index(df[keys[0]]))
+        state[group_ids] = last_ewm.reindex(row_keys).to_numpy()
+
+    rates = df[TREND_METRICS].to_numpy(dtype=np.float64)
+    ewm = np.full(rates.shape, np.nan)
+    is_new = df['_new'].to_numpy()
+    dates = df['date'].to_numpy()
+    for date in sorted(set(dates[is_new])):
+        rows = (is_new & (dates == date)).nonzero()[0]
+        previous = state[group_ids[rows]]
+        current = np.where(np.isnan(previous), rates[rows],
+                           alpha * rates[rows] + (1 - alpha) * previous)
+        state[group_ids[rows]] = current
+        ewm[rows] = current
+
+    for idx, column in enumerate(ewm_columns):
+        df[column] = ewm[:, idx]
+
+    return df
+
+
+@profile_stage
+def add_trend_features(league_df, windows=TREND_WINDOWS, span=TREND_SPAN,
+                       lags=TREND_LAGS, keys=('champion',)):
+    """
+    Adds rolling means, day-over-day deltas, exponentially weighted means and
+      lagged values of the win, ban and pick rates of each champion
+
+    Parameters
+    ----------
+    league_df : pandas data frame
+                Contains champion, date and rate columns for each day
+    windows   : list
+                Rolling mean windows in days, early days use what is there
+    span      : integer
+                Span of the exponentially weighted mean in days
+    lags      : list
+                Lags in days, the first days of a champion are NaN
+    keys      : list
+                Columns identifying one trend, e.g. champion and region
+
+    Returns
+    -------
+    league_df : pandas data frame
+                Copy of the input with the trend columns added, rows in the
+                original order
+    """
+
+    keys = list(keys)
+
+    # Sort once into the (champion, date) cube, stable so ties keep order
+    trend_df = league_df.sort_values(keys + ['date'], kind='mergesort')
+    trend_df = trend_df.assign(_new=True)
+    trend_df = _add_window_features(trend_df, windows, lags, keys)
+    trend_df = _add_ewm_features(trend_df, span, keys)
+
+    columns = list(league_df.columns) + get_trend_columns(windows, span, lags)
+    league_df = apply_schema(trend_df.loc[league_df.index, columns])
+
+    return league_df
+
+
+@profile_stage
+def append_trend_day(league_df, new_day, windows=TREND_WINDOWS,
+                     span=TREND_SPAN, lags=TREND_LAGS, keys=('champion',)):
+    """
+    Computes the trend features of newly appended days from the tail of the
+      data that already has them, without recomputing the full history
+
+    Parameters
+    ----------
+    league_df : pandas data frame
+                Earlier days, already passed through add_trend_features
+    new_day   : pandas data frame
+                Contains champion, date and rate columns for the new days,
+                all later than the days in league_df
+    windows   : list
+                Rolling mean windows in days
+    span      : integer
+                Span of the exponentially weighted mean in days
+    lags      : list
+                Lags in days
+    keys      : list
+                Columns identifying one trend, e.g. champion and region
+
+    Returns
+    -------
+    new_day : pandas data frame
+              Copy of new_day with the trend columns added
+    """
+
+    keys = list(keys)
+
+    # Only the last few days of history affect the windows and lags
+    depth = max(list(windows) + list(lags) + [1])
+    dates = sorted(league_df['date'].unique())[-depth:]
+    tail = league_df.loc[league_df['date'].isin(dates),
+                         keys + ['date'] + TREND_METRICS]
+    combined = pd.concat([tail.assign(_new=False, _row=-1),
+                          new_day.assign(_new=True,
+                                         _row=np.arange(len(new_day)))],
+                         ignore_index=True)
+    combined = combined.sort_values(keys + ['date'], kind='mergesort')
+    combined = _add_window_features(combined, windows, lags, keys)
+
+    ewm_columns = [f'{metric}_ewm{span}' for metric in TREND_METRICS]
+    last_ewm = (league_df.sort_values('date', kind='mergesort')
+                .groupby(keys, observed=True)[ewm_columns].last())
+    combined = _add_ewm_features(combined, span, keys, last_ewm)
+
+    # Back to the rows and order of new_day
+    new_rows = combined[combined['_new']].sort_values('_row')
+    columns = list(new_day.columns) + get_trend_columns(windows, span, lags)
+    new_rows = new_rows[columns]
+    new_rows.index = new_day.index
+    new_day = apply_schema(new_rows)
+
+    return new_day
@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Thu Oct 10 09:27:51 2019
+
+@author: jeremy_lehner
+
+Checks on scraped data, run before each rate file is saved and when the data
+is loaded. Rows are aligned with champion_names.csv by alphabetical position,
+so one missing champion or a renamed op.gg column would otherwise shift or
+corrupt every later row without an error.
+"""
+
+import numpy as np
+import pandas as pd
+from src.profiling import profile_stage
+from src.process_league_data import get_patch_for_date
+
+
+# Number of bad rows or groups listed in a validation error
+MAX_EXAMPLES = 5
+
+
+def raise_problems(problems, source):
+    """
+    Raises one error listing every problem found, if any
+
+    Parameters
+    ----------
+    problems : list
+               Contains a description of each problem as strings
+    source   : string
+               What was validated, shown in the error
+
+    Returns
+    -------
+    None
+    """
+
+    if problems:
+        details = '\n  - '.join(problems)
+        raise ValueError(f'{source} failed validation:\n  - {details}')
+
+    # Bye! <3
+    return
+
+
+def _examples(values):
+    # First few offending values for an error message
+    values = list(values)
+    shown = ', '.join(str(value) for value in values[:MAX_EXAMPLES])
+    if len(values) > MAX_EXAMPLES:
+        shown += f', ... ({len(values)} total)'
+    return shown
+
+
+def get_rate_problems(rates, metric):
+    """
+    Checks the columns, rate ranges and dates of rate data
+
+    Parameters
+    ----------
+    rates  : pandas data frame
+             Contains '<metric>rate' and 'date' columns
+    metric : string
+             'win', 'ban', or 'pick'
+
+    Returns
+    -------
+    problems : list
+               Contains a description of each problem as strings
+    """
+
+    column = f'{metric}rate'
+    missing = [name for name in [column, 'date'] if name not in rates]
+    if missing:
+        return [f'missing columns {missing}, found {list(rates.columns)}']
+
+    problems = []
+
+    # Rates are fractions, NaN fails both comparisons
+    values = pd.to_numeric(rates[column], errors='coerce').to_numpy()
+    bad = ~((values >= 0) & (values <= 1))
+    if bad.any():
+        problems.append(f'{bad.sum()} {column} values outside [0, 1] or not '
+                        f'numbers: {_examples(rates[column][bad])}')
+
+    # Dates are 'YYYY-MM-DD', only the distinct days need parsing
+    days = pd.Series(rates['date'].unique())
+    parsed = pd.to_datetime(days, format='%Y-%m-%d', errors='coerce')
+    padded = days.astype(str).str.fullmatch(r'\d{4}-\d{2}-\d{2}')
+    bad = (parsed.isna() | ~padded).to_numpy()
+    if bad.any():
+        problems.append(f'{bad.sum()} dates are not YYYY-MM-DD: '
+                        f'{_examples(days[bad])}')
+
+    return problems
+
+
+@profile_stage
+def validate_scraped_table(table, column, num_champs,
+                           champs='Champion.1'):
+    """
+    Checks a rate table read from op.gg before its rates are used, failing
+      fast on renamed columns, partial pages and duplicated champions
+
+    Parameters
+    ----------
+    table      : pandas data frame
+                 Table read from the op.gg statistics page
+    column     : string
+                 Rate column of the table, e.g. 'Win rate'
+    num_champs : integer
+                 Number of champions in champion_names.csv
+    champs     : string
+                 Champion name column of the table
+
+    Returns
+    -------
+    None
+    """
+
+    missing = [name for name in [champs, column] if name not in table]
+    if missing:
+        raise_problems([f'missing columns {missing}, found '
+                        f'{list(table.columns)}'], 'op.gg rate table')
+
+    problems = []
+    duplicated = table[champs].duplicated(keep=False).to_numpy()
+    if duplicated.any():
+        problems.append('champions listed more than once: '
+                        f'{_examples(table[champs][duplicated].unique())}')
+    if len(table) != num_champs:
+        problems.append(f'{len(table)} champions, champion_names.csv has '
+                        f'{num_champs}')
+
+    raise_problems(problems, 'op.gg rate table')
+
+    # Bye! <3
+    return
+
+
+@profile_stage
+def validate_rate_file(rate_df, metric, num_champs):
+    """
+    Checks one day of rates before it is saved
+
+    Parameters
+    ----------
+    rate_df    : pandas data frame
+                 Contains the rates as floats and the date as strings
+    metric     : string
+                 'win', 'ban', or 'pick'
+    num_champs : integer
+                 Number of champions in champion_names.csv
+
+    Returns
+    -------
+    None
+    """
+
+    problems = get_rate_problems(rate_df, metric)
+    if len(rate_df) != num_champs:
+        problems.append(f'{len(rate_df)} rows, champion_names.csv has '
+                        f'{num_champs} champions')
+    if 'date' in rate_df and rate_df['date'].nunique() > 1:
+        problems.append(f'{rate_df["date"].nunique()} dates in one day of '
+                        'rates')
+
+    raise_problems(problems, f'{metric} rates')
+
+    # Bye! <3
+    return
+
+
+@profile_stage
+def validate_rate_data(win, ban, pick, champ_counts, patch_dates=None):
+    """
+    Checks loaded win, ban and pick rates: columns, rate ranges, dates,
+      one row per champion for each day, the patch of each day, and that
+      the three rates line up row by row
+
+    Parameters
+    ----------
+    win          : pandas data frame
+                   Contains win rates, dates, and region, tier and patch
+    ban          : pandas data frame
+                   Contains ban rates, dates, and region, tier and patch
+    pick         : pandas data frame
+                   Contains pick rates, dates, and region, tier and patch
+    champ_counts : dictionary
+                   Number of champions in the static snapshot of each patch
+    patch_dates  : pandas data frame
+                   Contains each patch and its start_date, skips the patch
+                   check if not given
+
+    Returns
+    -------
+    None
+    """
+
+    problems = []
+    keys = [key for key in ['region', 'tier', 'date', 'patch'] if key in win]
+
+    for metric, rates in [('win', win), ('ban', ban), ('pick', pick)]:
+        rate_problems = get_rate_problems(rates, metric)
+        if rate_problems or 'patch' not in rates:
+            problems += [f'{metric}: {problem}' for problem in rate_problems]
+            continue
+
+        # Each (region, tier, date) key has one row per champion, so
+        # a missing champion or a repeated day shows up in the group sizes
+        sizes = rates.groupby(keys, sort=False, observed=True).size()
+        expected = sizes.index.get_level_values('patch').map(champ_counts)
+        bad = sizes.to_numpy() != expected.to_numpy(dtype=float)
+        if bad.any():
+            problems.append(f'{metric}: days without one row per champion: '
+                            f'{_examples(sizes.index[bad])}')
+
+    # The three rates must describe the same rows in the same order
+    lengths = {len(win), len(ban), len(pick)}
+    if len(lengths) > 1:
+        problems.append(f'win, ban and pick have {len(win)}, {len(ban)} and '
+                        f'{len(pick)} rows')
+    else:
+        for key in keys:
+            if key not in ban or key not in pick:
+                continue
+            bad = ((win[key].to_numpy() != ban[key].to_numpy())
+                   | (win[key].to_numpy() != pick[key].to_numpy()))
+            if bad.any():
+                problems.append(f'win, ban and pick {key} differ in '
+                                f'{bad.sum()} rows, first at row '
+                                f'{np.flatnonzero(bad)[0]}')
+
+    # Each day belongs to the patch folder it was saved in
+    if patch_dates is not None and not problems and 'patch' in win:
+        days = win[['date', 'patch']].drop_duplicates()
+        live = get_patch_for_date(days['date'], patch_dates).to_numpy()
+        bad = live != days['patch'].to_numpy()
+        if bad.any():
+            problems.append('days saved under the wrong patch: '
+                            f'{_examples(days["date"][bad])}')
+
+    raise_problems(problems, 'Rate data')
+
+    # Bye! <3
+    return
+
+
+@profile_stage
+def validate_static_data(static):
+    """
+    Checks the static champion data of one snapshot
+
+    Parameters
+    ----------
+    static : pandas data frame
+             Contains champion, release_date, num_skins and
+             patches_since_change columns
+
+    Returns
+    -------
+    None
+    """
+
+    problems = []
+
+    champions = static['champion']
+    duplicated = champions.duplicated(keep=False).to_numpy()
+    if duplicated.any():
+        problems.append('champions listed more than once: '
+                        f'{_examples(champions[duplicated].unique())}')
+
+    # Static files of different lengths leave NaN after concatenating
+    empty = static.drop(columns='release_date').isna().any(
+        axis=1).to_numpy()
+    if empty.any():
+        problems.append(f'{empty.sum()} champions missing a static value, '
+                        'the static files have different lengths')
+
+    # Loaded release dates that couldn't be parsed are NaT
+    unparsed = static['release_date'].isna().to_numpy() & ~empty
+    if unparsed.any():
+        problems.append('release dates missing or not YYYY-MM-DD for '
+                        f'{_examples(champions[unparsed])}')
+
+    dates = pd.to_datetime(static['release_date'], format='%Y-%m-%d',
+                           errors='coerce')
+    padded = static['release_date'].astype(str).str.fullmatch(
+        r'\d{4}-\d{2}-\d{2}')
+    bad = (dates.isna() | ~padded).to_numpy() & ~empty & ~unparsed
+    if bad.any():
+        problems.append('release dates are not YYYY-MM-DD: '
+                        f'{_examples(static["release_date"][bad])}')
+
+    skins = pd.to_numeric(static['num_skins'], errors='coerce').to_numpy()
+    bad = ~(skins >= 0) & ~empty
+    if bad.any():
+        problems.append('skin counts are not counts: '
+                        f'{_examples(static["num_skins"][bad])}')
+
+    raise_problems(problems, 'Static data')
+
+    # Bye! <3
+    return
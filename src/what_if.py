@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 21 09:44:18 2019
+
+@author: jeremy_lehner
+
+What-if pick rate predictions: shift champions' win rates, ban rates, skin
+counts or patches since their last change on one day of data and predict
+the pick rates with a saved model artifact.
+
+    scenarios = make_scenario_grid(winrate=[-0.02, 0, 0.02],
+                                   num_skins=[0, 1])
+    results = simulate_scenarios(league_df, scenarios, ['Ahri', 'Zed'])
+
+Every champion is paired with every scenario by broadcasting, the features
+of all pairs are built with the same column operations as training, and
+their pick rates come from one matrix-vector product per chunk of pairs.
+"""
+
+import itertools
+import numpy as np
+import pandas as pd
+from os import path
+
+from src.pipeline import MODEL_DATA
+from src.pipeline import MODEL_FOLDER
+from src.pipeline import get_model_features
+from src.model_artifacts import predict_pick_rates
+from src.profiling import profile_stage
+
+
+# Inputs a scenario can shift, with the range they are clipped to
+SCENARIO_INPUTS = {'winrate': (0.0, 1.0),
+                   'banrate': (0.0, 1.0),
+                   'num_skins': (0, None),
+                   'patches_since_change': (1, None)}
+
+# Champion and scenario pairs predicted at a time, bounds the memory of
+# the feature matrix
+CHUNK_ROWS = 1000000
+
+
+def make_scenario_grid(**deltas):
+    """
+    Builds every combination of shifts of the scenario inputs
+
+    Parameters
+    ----------
+    **deltas : list
+               Shifts of each input in SCENARIO_INPUTS, e.g.
+               winrate=[-0.02, 0, 0.02] for a 2 point nerf or buff, inputs
+               left out are not shifted
+
+    Returns
+    -------
+    scenarios : pandas data frame
+                Contains one column of shifts per input and one row per
+                scenario
+    """
+
+    unknown = [name for name in deltas if name not in SCENARIO_INPUTS]
+    if unknown:
+        raise KeyError(f'Scenarios cannot shift {unknown}, only '
+                       f'{list(SCENARIO_INPUTS)}')
+
+    grids = [np.atleast_1d(deltas.get(name, 0)) for name in SCENARIO_INPUTS]
+    scenarios = pd.DataFrame(list(itertools.product(*grids)),
+                             columns=list(SCENARIO_INPUTS))
+    scenarios.index.name = 'scenario'
+
+    return scenarios
+
+
+def get_baseline_day(league_df, champions=None, date=None):
+    """
+    Selects the rows of the champions on one day of data
+
+    Parameters
+    ----------
+    league_df : pandas data frame
+                Contains static and daily data for each champion on each day
+    champions : list
+                Champion names, every champion of the day by default
+    date      : string
+                Day as 'YYYY-MM-DD', the latest day by default
+
+    Returns
+    -------
+    day_df : pandas data frame
+             Contains one row per champion
+    """
+
+    if date is None:
+        date = league_df['date'].max()
+    day_df = league_df[league_df['date'] == date]
+    if day_df.empty:
+        raise KeyError(f'No data on {date} (._.)')
+
+    if champions is not None:
+        missing = sorted(set(champions) - set(day_df['champion']))
+        if missing:
+            raise KeyError(f'Champions {missing} have no data on {date} '
+                           '(._.)')
+        day_df = day_df[day_df['champion'].isin(champions)]
+
+    return day_df.reset_index(drop=True)
+
+
+@profile_stage
+def simulate_scenarios(league_df, scenarios, champions=None, name='model1',
+                       date=None, model_folder=MODEL_FOLDER,
+                       chunk_rows=CHUNK_ROWS):
+    """
+    Predicts the pick rate of each champion under each scenario
+
+    Parameters
+    ----------
+    league_df    : pandas data frame
+                   Contains static and daily data for each champion on each day
+    scenarios    : pandas data frame
+                   Shifts of the scenario inputs, from make_scenario_grid
+    champions    : list
+                   Champion names, every champion of the day by default
+    name         : string
+                   Name of the model artifact to use
+    date         : string
+                   Day the shifts are applied to, the latest day by default
+    model_folder : string
+                   Folder containing the model artifacts
+    chunk_rows   : integer
+                   Champion and scenario pairs predicted at a time
+
+    Returns
+    -------
+    results : pandas data frame
+              Contains champion, scenario, the shifts, the observed pick
+              rate, the prediction without shifts, the prediction with
+              them and the change, one row per champion and scenario
+    """
+
+    day_df = get_baseline_day(league_df, champions, date)
+    artifact_path = path.join(model_folder, f'{name}.json')
+    baseline = predict_pick_rates(get_model_features(day_df, name),
+                                  artifact_path)
+
+    # Unshifted inputs as (champions, 1) and shifts as (1, scenarios)
+    base = {column: day_df[column].to_numpy(dtype=np.float64)[:, None]
+            for column in MODEL_DATA[0:5]}
+    shifts = {column: np.zeros((1, len(scenarios)))
+              for column in SCENARIO_INPUTS}
+    for column in scenarios.columns.intersection(list(SCENARIO_INPUTS)):
+        shifts[column] = scenarios[column].to_numpy(dtype=np.float64)[None]
+
+    num_champs, num_scenarios = len(day_df), len(scenarios)
+    predicted = np.empty(num_champs * num_scenarios)
+
+    # Whole champions per chunk, each chunk is one feature matrix
+    champs_per_chunk = max(chunk_rows // max(num_scenarios, 1), 1)
+    for start in range(0, num_champs, champs_per_chunk):
+        rows = slice(start, start + champs_per_chunk)
+        features = {}
+        for column, values in base.items():
+            values = values[rows]
+            if column in SCENARIO_INPUTS:
+                low, high = SCENARIO_INPUTS[column]
+                values = np.clip(values + shifts[column], low, high)
+            features[column] = np.broadcast_to(
+                values, (len(values), num_scenarios)).ravel()
+        X = get_model_features(pd.DataFrame(features), name)
+        first = start * num_scenarios
+        predicted[first:first + X.shape[0]] = predict_pick_rates(
+            X, artifact_path)
+
+    # Tidy result, champions repeat over scenarios as category codes
+    champs = pd.Categorical(day_df['champion'].astype(str))
+    results = pd.DataFrame({
+        'champion': pd.Categorical.from_codes(
+            np.repeat(champs.codes, num_scenarios), champs.categories),
+        'scenario': np.tile(scenarios.index.to_numpy(), num_champs)})
+    for column in scenarios.columns:
+        results[f'delta_{column}'] = np.tile(scenarios[column].to_numpy(),
+                                             num_champs)
+    results['pickrate'] = np.repeat(day_df['pickrate'].to_numpy(),
+                                    num_scenarios)
+    results['baseline_pickrate'] = np.repeat(baseline, num_scenarios)
+    results['predicted_pickrate'] = predicted
+    results['change'] = predicted - results['baseline_pickrate'].to_numpy()
+
+    return results
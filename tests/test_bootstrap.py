@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 28 10:12:40 2019
+
+@author: jeremy_lehner
+
+Checks of the batched bootstrap.
+"""
+
+import numpy as np
+import pandas as pd
+from src.bootstrap import bootstrap_models
+
+
+def make_rows(num_rows, seed=0):
+    rng = np.random.default_rng(seed)
+    X = pd.DataFrame(rng.normal(size=(num_rows, 3)), columns=['a', 'b', 'c'])
+    y = pd.Series(X.to_numpy() @ [0.5, -1.0, 2.0] + rng.normal(size=num_rows))
+    return X, y
+
+
+def test_more_jobs_than_batches():
+    X_train, y_train = make_rows(100)
+    X_test, y_test = make_rows(30, seed=1)
+
+    # One batch of 500 resamples split over 2 processes
+    samples = bootstrap_models(X_train, y_train, X_test, y_test, n_boot=500,
+                               n_jobs=2)
+    expected = bootstrap_models(X_train, y_train, X_test, y_test,
+                                n_boot=500, n_jobs=1)
+
+    assert samples.shape == (500, 6)
+    pd.testing.assert_frame_equal(samples, expected)
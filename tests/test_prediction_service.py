@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Tue Oct 29 09:48:15 2019
+
+@author: jeremy_lehner
+
+Checks of the request rows the prediction service accepts and of its
+micro-batcher.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+from src.prediction_service import rows_to_matrix
+from src.prediction_service import MicroBatcher
+from src.process_league_data import add_ratio_features
+from src.process_league_data import RATIO_FEATURES
+
+
+BASE_FEATURES = ['champion_age', 'patches_since_change', 'num_skins',
+                 'winrate', 'banrate']
+
+
+def test_rows_of_the_wrong_length():
+    # Seven values would otherwise be split into a row and a half
+    with pytest.raises(ValueError):
+        rows_to_matrix([[1, 2, 3, 4, 5, 6, 7], [1, 2, 3]], BASE_FEATURES)
+
+
+def test_ratio_features_added():
+    rows = [[3000, 2, 10, 0.52, 0.04], [400, 1, 3, 0.47, 0.12]]
+    features = BASE_FEATURES + RATIO_FEATURES
+    expected = add_ratio_features(pd.DataFrame(rows, columns=BASE_FEATURES))
+
+    X = rows_to_matrix(rows, features)
+
+    assert np.allclose(X, expected[features].to_numpy())
+
+
+def test_failed_batch_keeps_serving():
+    artifact = {'features': BASE_FEATURES,
+                'coefficients': np.ones(len(BASE_FEATURES)),
+                'intercept': 0.0}
+    batcher = MicroBatcher(artifact, timeout=5)
+
+    # Rows of the wrong width fail their batch, not the worker
+    with pytest.raises(RuntimeError):
+        batcher.predict(np.ones((1, 3)))
+    assert batcher.predict(np.ones((2, 5))).tolist() == [5.0, 5.0]
+    assert batcher.stats()['errors'] == 1